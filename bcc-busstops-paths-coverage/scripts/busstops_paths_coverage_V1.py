@@ -11,6 +11,8 @@ B) Load into PostGIS (schema: bcc_open)
    - raw_busstops (EPSG:4326) + GiST index
    - raw_paths    (EPSG:4326) + GiST index
    - Optional: sanity-check API count vs DB count
+   (with OUT_SR = 7856 the server projects the data: it loads straight into
+    busstops_7856 / paths_7856 and C1 is skipped)
 
 C) Derive & analyze (distance-safe in EPSG:7856)
    C1) Create projected copies:
@@ -22,20 +24,33 @@ C) Derive & analyze (distance-safe in EPSG:7856)
    C3) Served paths:
        - paths_served_400m (paths inside coverage)
    C4) KPI:
-       - served_km, total_km, served_percent
+       - served_km, total_km, served_percent (LGA-wide)
+       - kpi_suburb_coverage (same KPI per suburb, upserted)
+       (KPI_ENGINE = "raster": C2–C3 are skipped and the LGA-wide KPI is approximated
+        on a grid, with error bounds)
+
+D) Optional: vector tile pyramid (TILES_OUT) of paths_served_400m + busstops_400_cov
 
 Notes
 -----
 - `fetch_count()` is optional validation and may return None if the service returns an error JSON.
 - Distances (buffer/length) are done in EPSG:7856 (meters).
+- The per-suburb KPI only refreshes the suburbs listed in `KPI_SUBURBS` (None = all).
 """
 
+import sys
+from pathlib import Path
+
 import geopandas as gpd
 import requests
+from shapely.geometry import MultiLineString
 from sqlalchemy import create_engine, text
 from urllib.parse import quote_plus
 from db_config_local import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import dag, instrumentation as instr, mvt, spatial_order
+
 
 # ----------------------------
 # Config
@@ -53,24 +68,118 @@ PATHS_LAYER = (
     "Blacktown_Council_Data_Public/FeatureServer/1"
 )
 
+# Suburb polygons used for the per-suburb KPI breakdown (C4)
+SUBURBS_TABLE = "clip_cadastre.blacktown_suburbs"
+SUBURBS_NAME_COL = "suburbname"
+KPI_SUBURB_TABLE = "kpi_suburb_coverage"
+
+# Suburbs to refresh in C4 (None = all), e.g. ["MARSDEN PARK", "ROUSE HILL"]
+KPI_SUBURBS = None
+
+# C1–C3 incremental mode: only re-derive rows whose raw fid/hash changed since the
+# previous load. Falls back to a full rebuild when no previous state exists.
+INCREMENTAL_DERIVE = False
+
+# Server-side pushdown (ArcGIS query parameters)
+# Only request the attributes the pipeline uses ("*" = every field)
+BUSSTOPS_OUT_FIELDS = "fid,suburb"
+PATHS_OUT_FIELDS = "fid"
+# 7856 = the server projects to GDA2020 / MGA 56; B then loads straight into
+# busstops_7856 / paths_7856 and C1 is skipped. 4326 keeps raw_* + the C1 transform.
+OUT_SR = 4326
+# Decimal places returned by the server (None = 1 cm: 7 in degrees, 2 in metres)
+GEOMETRY_PRECISION = None
+# Optional generalisation tolerance in OUT_SR units (None = full detail)
+MAX_ALLOWABLE_OFFSET = None
+
+# Staged loads: build `<table>__staging` (no indexes), index + ANALYZE it once,
+# then swap it in with ALTER TABLE ... RENAME in one transaction (no reader downtime).
+STAGED_LOAD = False
+
+# DAG mode: run A–C4 as a task graph (gis_common/dag.py). Independent stages run
+# concurrently (bus stops and paths branches), and stages whose inputs did not change
+# since the last successful run (layer count + last edit date, config) are skipped.
+RUN_AS_DAG = False
+DAG_WORKERS = 4
+
+# Physical row order of the loaded / derived tables (gis_common/spatial_order.py):
+# None = as produced, "hilbert" = written in Hilbert order (sorted loads, ORDER BY geom
+# in CREATE TABLE AS), "cluster" = CLUSTER on the GiST index after indexing
+SPATIAL_ORDER = None
+
+# Vector tile export after C4 (gis_common/mvt.py): None = off, "<file>.mbtiles" or a
+# folder (→ {z}/{x}/{y}.pbf). With TILES_INCREMENTAL only the tiles touched by rows that
+# changed since the last export are rendered again.
+TILES_OUT = None
+TILES_WORKERS = 4
+TILES_INCREMENTAL = True
+TILE_LAYERS = [
+    mvt.Layer("paths_served_400m", f"{SCHEMA}.paths_served_400m", columns=("fid",), key="fid"),
+    mvt.Layer("busstops_400_cov", f"{SCHEMA}.busstops_400_cov"),  # one row: re-rendered on any change
+]
+
+# C4 KPI engine: "exact" = ST_Buffer + ST_UnaryUnion + ST_Intersection (C2–C3 tables).
+# "raster" = approximate LGA KPI from a distance transform of the bus stops on a
+# RASTER_CELL_M grid, reported with lower / upper bounds; C2–C3, the per-suburb KPI and
+# the tiles are skipped. Needs scipy. Smaller cells = tighter bounds, more memory.
+KPI_ENGINE = "exact"
+RASTER_CELL_M = 10
+RASTER_RADIUS_M = 400  # same radius as the C2 buffers
+# Grid size cap. distance_transform_edt holds the float64 distances plus an int32
+# (2, rows, cols) feature transform: ~17 bytes per cell, ~850 MB at the cap
+RASTER_MAX_CELLS = 50_000_000
+
+
+# ----------------------------
+# Settings derived from OUT_SR (read at call time, so Config overrides apply)
+# ----------------------------
+def server_projected() -> bool:
+    """True when the server returns EPSG:7856 (B loads *_7856 directly, C1 is skipped)."""
+    return OUT_SR == 7856
+
+
+def geometry_precision() -> int:
+    if GEOMETRY_PRECISION is not None:
+        return GEOMETRY_PRECISION
+    return 2 if server_projected() else 7
+
+
+def raw_table(kind: str) -> str:
+    """Table B loads `kind` ("busstops" / "paths") into: raw_<kind>, or <kind>_7856."""
+    return f"{kind}_7856" if server_projected() else f"raw_{kind}"
+
+
+def raw_tables() -> dict[str, str]:
+    return {kind: raw_table(kind) for kind in ("busstops", "paths")}
+
 
 # ----------------------------
 # ArcGIS REST fetching helpers
 # ----------------------------
 
-def fetch_page(layer_url: str, offset: int, page_size: int, where: str = WHERE_ALL):
-    """Fetch one page of features from an ArcGIS FeatureServer layer as GeoJSON."""
+def fetch_page(
+    layer_url: str, offset: int, page_size: int, where: str = WHERE_ALL, out_fields: str = "*"
+):
+    """
+    Fetch one page of features from an ArcGIS FeatureServer layer as GeoJSON.
+    Field list, output SR, precision and generalisation are pushed to the server.
+    """
     url = f"{layer_url}/query"
     params = {
         "where": where,
-        "outFields": "*",
+        "outFields": out_fields,
         "returnGeometry": "true",
+        "outSR": OUT_SR,
+        "geometryPrecision": geometry_precision(),
         "resultOffset": offset,
         "resultRecordCount": page_size,
         "f": "geojson",
     }
+    if MAX_ALLOWABLE_OFFSET is not None:
+        params["maxAllowableOffset"] = MAX_ALLOWABLE_OFFSET
 
     r = requests.get(url, params=params, timeout=60)
+    instr.record_http(r)
     r.raise_for_status()
     data = r.json()
 
@@ -81,13 +190,17 @@ def fetch_page(layer_url: str, offset: int, page_size: int, where: str = WHERE_A
     return data["features"]
 
 
-def fetch_all(layer_url: str, page_size: int = PAGE_SIZE, where: str = WHERE_ALL):
+def fetch_all(
+    layer_url: str, page_size: int = PAGE_SIZE, where: str = WHERE_ALL, out_fields: str = "*"
+):
     """Fetch all features (paged) and return a list of GeoJSON Features."""
     all_features = []
     offset = 0
 
     while True:
-        features_per_page = fetch_page(layer_url, offset=offset, page_size=page_size, where=where)
+        features_per_page = fetch_page(
+            layer_url, offset=offset, page_size=page_size, where=where, out_fields=out_fields
+        )
         all_features.extend(features_per_page)
 
         # stop conditions
@@ -111,6 +224,7 @@ def fetch_count(layer_url: str, where: str = WHERE_ALL) -> int | None:
     }
 
     r = requests.get(url, params=params, timeout=60)
+    instr.record_http(r)
     r.raise_for_status()
     data = r.json()
 
@@ -122,9 +236,54 @@ def fetch_count(layer_url: str, where: str = WHERE_ALL) -> int | None:
     return int(data["count"])
 
 
+def layer_fingerprint(layer_url: str, out_fields: str, where: str = WHERE_ALL) -> str:
+    """
+    Cheap change probe for DAG mode: feature count + the layer's last edit date, plus
+    the query settings that shape the fetched data.
+    """
+    r = requests.get(layer_url, params={"f": "json"}, timeout=60)
+    instr.record_http(r)
+    r.raise_for_status()
+    edit = (r.json().get("editingInfo") or {})
+    last_edit = edit.get("dataLastEditDate") or edit.get("lastEditDate")
+    if last_edit is None:
+        raise ValueError(f"No editingInfo.lastEditDate for {layer_url}")
+
+    count = fetch_count(layer_url, where)
+    return f"{count}|{last_edit}|{where}|{out_fields}|{OUT_SR}|{geometry_precision()}|{MAX_ALLOWABLE_OFFSET}"
+
+
+def features_to_gdf(features: list, multi_lines: bool = False) -> gpd.GeoDataFrame:
+    """
+    Build the load-ready GeoDataFrame (geometry column "geom", CRS = OUT_SR).
+    With a server-side projection, lines are promoted to MultiLineString here because
+    C1 (which used to apply ST_Multi) is skipped.
+    """
+    gdf = gpd.GeoDataFrame.from_features(features, crs=f"EPSG:{OUT_SR}").rename_geometry("geom")
+
+    if server_projected() and not gdf.empty:
+        # a server that ignores outSR still returns lon/lat → refuse to label it 7856
+        minx, miny, maxx, maxy = gdf.total_bounds
+        if max(abs(minx), abs(maxx)) <= 180 and max(abs(miny), abs(maxy)) <= 90:
+            raise ValueError("Server returned lon/lat coordinates although outSR=7856 was requested.")
+        if multi_lines:
+            gdf["geom"] = gdf["geom"].apply(
+                lambda g: MultiLineString([g]) if g is not None and g.geom_type == "LineString" else g
+            )
+
+    return gdf
+
+
 # ----------------------------
 # DB helpers
 # ----------------------------
+def make_engine():
+    password = quote_plus(DB_PASSWORD)
+    return instr.instrument_engine(create_engine(
+        f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ))
+
+
 def exec_sql(engine, sql: str) -> None:
     """Execute SQL (DDL/DML). No result returned."""
     with engine.begin() as conn:
@@ -138,6 +297,25 @@ def table_count(engine, schema: str, table: str) -> int:
         return int(conn.execute(sql).scalar())
 
 
+def relation_exists(conn, schema: str, table: str) -> bool:
+    """True if schema.table exists."""
+    sql = text("SELECT to_regclass(:name) IS NOT NULL;")
+    return bool(conn.execute(sql, {"name": f"{schema}.{table}"}).scalar())
+
+
+def column_names(conn, schema: str, table: str) -> list[str]:
+    """Return the column names of schema.table in table order."""
+    sql = text(
+        """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = :schema AND table_name = :table
+        ORDER BY ordinal_position;
+        """
+    )
+    return [str(c) for c in conn.execute(sql, {"schema": schema, "table": table}).scalars().all()]
+
+
 def report_count(name: str, api_count: int | None, db_count: int) -> None:
     """Print a quick sanity-check line comparing API count vs DB count."""
     if api_count is None:
@@ -147,170 +325,626 @@ def report_count(name: str, api_count: int | None, db_count: int) -> None:
 
 
 # ----------------------------
-# Main pipeline
+# Table build helpers (direct or staged swap)
 # ----------------------------
-def main():
-    # ============================================================
-    # A) Download data (ArcGIS FeatureServer → GeoJSON)
-    # ============================================================
+def staging_name(table: str) -> str:
+    """Name of the staging copy of a table (or index)."""
+    return f"{table}__staging"
+
+
+def begin_table(engine, table: str) -> str:
+    """
+    Prepare a CREATE TABLE AS build for `table` and return the qualified name to build:
+      - direct mode: drop the live table and build it in place
+      - staged mode: build `<table>__staging` while readers keep the live table
+    """
+    if not STAGED_LOAD:
+        exec_sql(engine, f"DROP TABLE IF EXISTS {SCHEMA}.{table};")
+        return f"{SCHEMA}.{table}"
+
+    exec_sql(engine, f"DROP TABLE IF EXISTS {SCHEMA}.{staging_name(table)};")
+    return f"{SCHEMA}.{staging_name(table)}"
+
+
+def load_gdf(engine, gdf: gpd.GeoDataFrame, table: str, indexes: dict[str, str]) -> None:
+    """Write a GeoDataFrame to SCHEMA.table (direct replace or staged swap) and index it."""
+    gdf = spatial_order.sorted_for_write(gdf, SPATIAL_ORDER)
+    if not STAGED_LOAD:
+        gdf.to_postgis(table, engine, schema=SCHEMA, if_exists="replace", index=False)
+    else:
+        gdf.to_postgis(staging_name(table), engine, schema=SCHEMA, if_exists="replace", index=False)
+    instr.record_rows(len(gdf))
 
-    # A1) Bus stops
-    data_bus = fetch_all(BUSSTOPS_LAYER, PAGE_SIZE, WHERE_ALL)
-    print(f"{len(data_bus)} bus stop features fetched!")
+    finish_table(engine, table, indexes)
 
-    # A2) Paths
-    data_paths = fetch_all(PATHS_LAYER, PAGE_SIZE, WHERE_ALL)
-    print(f"{len(data_paths)} path features fetched!")
 
+def finish_table(engine, table: str, indexes: dict[str, str]) -> None:
+    """
+    Index + ANALYZE a freshly built table. `indexes` maps index name → "method (cols)".
 
-    # ============================================================
-    # B) Load into PostGIS (schema: bcc_open)
-    # ============================================================
+    In staged mode the indexes are built once on the complete staging table, which is
+    then swapped in with renames inside one transaction. Readers see the old table until
+    COMMIT. The staging table is a normal (logged) table: an UNLOGGED one would need
+    SET LOGGED before the swap, which rewrites it and writes all of it to WAL again.
+    Note: views that depend on the live table block the final DROP of the old copy.
 
-    # B0) Connect
-    password = quote_plus(DB_PASSWORD)
-    engine = create_engine(
-        f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    )
-    print("engine object created")
+    SPATIAL_ORDER = "cluster" rewrites the table in the order of its (first) GiST index
+    before ANALYZE.
+    """
+    gist_index = next((name for name, spec in indexes.items() if spec.lower().startswith("gist")), None)
 
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        print("DB connection OK")
-    except Exception as e:
-        print("DB connection FAILED:")
-        print(e)
+    if not STAGED_LOAD:
+        for index_name, spec in indexes.items():
+            exec_sql(engine, f"CREATE INDEX IF NOT EXISTS {index_name} ON {SCHEMA}.{table} USING {spec};")
+        if gist_index and SPATIAL_ORDER == "cluster":
+            exec_sql(engine, spatial_order.cluster_sql(SPATIAL_ORDER, f"{SCHEMA}.{table}", gist_index))
+        exec_sql(engine, f"ANALYZE {SCHEMA}.{table};")
         return
 
-    # B1) Ensure schema exists
-    exec_sql(engine, f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};")
+    staging = staging_name(table)
+    for index_name, spec in indexes.items():
+        exec_sql(engine, f"CREATE INDEX {staging_name(index_name)} ON {SCHEMA}.{staging} USING {spec};")
+    if gist_index and SPATIAL_ORDER == "cluster":
+        exec_sql(engine, spatial_order.cluster_sql(SPATIAL_ORDER, f"{SCHEMA}.{staging}", staging_name(gist_index)))
+    exec_sql(engine, f"ANALYZE {SCHEMA}.{staging};")
 
-    # B2) Load raw_busstops (EPSG:4326) + index
-    gdf_bus = gpd.GeoDataFrame.from_features(data_bus, crs="EPSG:4326").rename_geometry("geom")
-    gdf_bus.to_postgis("raw_busstops", engine, schema=SCHEMA, if_exists="replace", index=False)
+    with engine.begin() as conn:
+        live_exists = relation_exists(conn, SCHEMA, table)
+        if live_exists:
+            conn.execute(text(f"ALTER TABLE {SCHEMA}.{table} RENAME TO {table}__old;"))
+            for index_name in indexes:
+                conn.execute(text(f"ALTER INDEX IF EXISTS {SCHEMA}.{index_name} RENAME TO {index_name}__old;"))
+        conn.execute(text(f"ALTER TABLE {SCHEMA}.{staging} RENAME TO {table};"))
+        for index_name in indexes:
+            conn.execute(text(f"ALTER INDEX {SCHEMA}.{staging_name(index_name)} RENAME TO {index_name};"))
+        if live_exists:
+            conn.execute(text(f"DROP TABLE {SCHEMA}.{table}__old;"))
 
-    exec_sql(
-        engine,
+
+# ----------------------------
+# KPI helpers
+# ----------------------------
+def lga_kpi(engine) -> tuple:
+    """Return (served_km, total_km) for the whole LGA in a single round trip."""
+    sql = text(
         f"""
-        CREATE INDEX IF NOT EXISTS raw_busstops_geom_gix
-            ON {SCHEMA}.raw_busstops
-            USING gist(geom);
-        """,
+        SELECT
+          (SELECT ROUND((SUM(ST_Length(geom))/1000.0)::numeric, 3)
+             FROM {SCHEMA}.paths_served_400m) AS served_km,
+          (SELECT ROUND((SUM(ST_Length(geom))/1000.0)::numeric, 3)
+             FROM {SCHEMA}.paths_7856) AS total_km;
+        """
     )
+    with engine.begin() as conn:
+        row = conn.execute(sql).one()
+    return row.served_km, row.total_km
 
-    # B3) Load raw_paths (EPSG:4326) + index
-    gdf_paths = gpd.GeoDataFrame.from_features(data_paths, crs="EPSG:4326").rename_geometry("geom")
-    gdf_paths.to_postgis("raw_paths", engine, schema=SCHEMA, if_exists="replace", index=False)
 
+def refresh_suburb_kpi(engine, suburbs: list[str] | None = None) -> int:
+    """
+    Upsert served_km / total_km / served_percent per suburb into KPI_SUBURB_TABLE.
+
+    Paths are clipped to each suburb polygon so a path crossing a boundary is split
+    between suburbs. The suburb polygon drives the join, so the GiST indexes on
+    paths_7856 / paths_served_400m are used. Only `suburbs` are recomputed (None = all).
+    Returns the number of suburb rows written.
+    """
     exec_sql(
         engine,
         f"""
-        CREATE INDEX IF NOT EXISTS raw_paths_geom_gix
-            ON {SCHEMA}.raw_paths
-            USING gist(geom);
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.{KPI_SUBURB_TABLE} (
+          suburb         text PRIMARY KEY,
+          served_km      numeric,
+          total_km       numeric,
+          served_percent numeric,
+          updated_at     timestamptz NOT NULL DEFAULT now()
+        );
         """,
     )
 
-    # B4) Optional sanity check: API count vs DB count
-    count_buses_api = fetch_count(BUSSTOPS_LAYER, WHERE_ALL)
-    count_paths_api = fetch_count(PATHS_LAYER, WHERE_ALL)
+    where = ""
+    params = {}
+    if suburbs:
+        where = f"WHERE upper(s.{SUBURBS_NAME_COL}) = ANY(:suburbs)"
+        params["suburbs"] = [s.strip().upper() for s in suburbs]
+
+    sql = text(
+        f"""
+        WITH sub AS (
+          SELECT
+            upper(s.{SUBURBS_NAME_COL}) AS suburb,
+            ST_Transform(ST_Union(s.geom), 7856) AS geom
+          FROM {SUBURBS_TABLE} AS s
+          {where}
+          GROUP BY 1
+        ),
+        total AS (
+          SELECT
+            sub.suburb,
+            SUM(ST_Length(
+              CASE WHEN ST_Within(p.geom, sub.geom) THEN p.geom
+                   ELSE ST_Intersection(p.geom, sub.geom) END
+            )) AS len_m
+          FROM sub
+          JOIN {SCHEMA}.paths_7856 AS p
+            ON ST_Intersects(p.geom, sub.geom)
+          GROUP BY sub.suburb
+        ),
+        served AS (
+          SELECT
+            sub.suburb,
+            SUM(ST_Length(
+              CASE WHEN ST_Within(p.geom, sub.geom) THEN p.geom
+                   ELSE ST_Intersection(p.geom, sub.geom) END
+            )) AS len_m
+          FROM sub
+          JOIN {SCHEMA}.paths_served_400m AS p
+            ON ST_Intersects(p.geom, sub.geom)
+          GROUP BY sub.suburb
+        )
+        INSERT INTO {SCHEMA}.{KPI_SUBURB_TABLE}
+          (suburb, served_km, total_km, served_percent, updated_at)
+        SELECT
+          sub.suburb,
+          ROUND((COALESCE(sv.len_m, 0)/1000.0)::numeric, 3),
+          ROUND((COALESCE(t.len_m, 0)/1000.0)::numeric, 3),
+          CASE WHEN t.len_m > 0
+               THEN ROUND((100 * COALESCE(sv.len_m, 0) / t.len_m)::numeric, 2)
+          END,
+          now()
+        FROM sub
+        LEFT JOIN total AS t ON t.suburb = sub.suburb
+        LEFT JOIN served AS sv ON sv.suburb = sub.suburb
+        ON CONFLICT (suburb) DO UPDATE
+        SET
+          served_km = EXCLUDED.served_km,
+          total_km = EXCLUDED.total_km,
+          served_percent = EXCLUDED.served_percent,
+          updated_at = EXCLUDED.updated_at;
+        """
+    )
+    with engine.begin() as conn:
+        return conn.execute(sql, params).rowcount
 
-    count_bus_db = table_count(engine, SCHEMA, "raw_busstops")
-    count_path_db = table_count(engine, SCHEMA, "raw_paths")
 
-    report_count("busstops", count_buses_api, count_bus_db)
-    report_count("paths", count_paths_api, count_path_db)
+# ----------------------------
+# Approximate KPI (KPI_ENGINE = "raster")
+# ----------------------------
+def stop_distance_grid(stop_xy, bounds, cell: float, pad: float):
+    """
+    Distance (m) from each cell centre to the nearest cell holding a bus stop.
 
+    The grid covers `bounds` (minx, miny, maxx, maxy) plus `pad` on every side; stops
+    outside it are dropped (they are further than `pad` from anything inside `bounds`).
+    Returns (dist, x0, y1): dist[row, col] with row 0 at the top edge y1, col 0 at x0.
+    """
+    import numpy as np
 
-    # ============================================================
-    # C) Derive & analyze (distance-safe in EPSG:7856)
-    # ============================================================
+    try:
+        from scipy import ndimage
+    except ImportError as e:
+        raise ImportError('KPI_ENGINE = "raster" needs scipy (pip install scipy)') from e
+
+    minx, miny, maxx, maxy = bounds
+    x0, y1 = minx - pad, maxy + pad
+    ncols = int(np.ceil((maxx + pad - x0) / cell))
+    nrows = int(np.ceil((y1 - (miny - pad)) / cell))
+    if nrows * ncols > RASTER_MAX_CELLS:
+        raise ValueError(
+            f"{nrows} x {ncols} grid exceeds RASTER_MAX_CELLS ({RASTER_MAX_CELLS}); it would need "
+            f"~{nrows * ncols * 17 / 1e6:.0f} MB for the distance transform. Raise RASTER_CELL_M (now {cell})"
+        )
+
+    rows, cols = grid_cells(stop_xy, x0, y1, cell)
+    inside = (rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols)
+
+    # distance_transform_edt measures the distance to the nearest zero → stops are 0
+    free = np.ones((nrows, ncols), dtype=bool)
+    free[rows[inside], cols[inside]] = False
+    if free.all():
+        return np.full((nrows, ncols), np.inf), x0, y1
+    return ndimage.distance_transform_edt(free, sampling=cell), x0, y1
+
+
+def grid_cells(xy, x0: float, y1: float, cell: float):
+    """(rows, cols) of the grid cells holding the (n, 2) coordinates `xy`."""
+    import numpy as np
+
+    rows = np.floor((y1 - xy[:, 1]) / cell).astype(np.int64)
+    cols = np.floor((xy[:, 0] - x0) / cell).astype(np.int64)
+    return rows, cols
+
+
+def raster_lga_kpi(engine) -> dict:
+    """
+    Approximate served_km / total_km for the whole LGA from busstops_7856 + paths_7856,
+    without the C2–C3 buffer / union / intersection.
+
+    1. Bus stops are burnt into a RASTER_CELL_M grid around the paths and a Euclidean
+       distance transform gives each cell its distance to the nearest stop cell.
+    2. Every path is cut into pieces of at most half a cell; each piece is counted as
+       served when the grid distance at its midpoint is <= RASTER_RADIUS_M.
+
+    Bounds: snapping the stop and the midpoint to cell centres moves a distance by at
+    most cell * sqrt(2), and a piece reaches at most half its length past its midpoint.
+    Pieces within that margin of the radius are the only ones that can be misclassified,
+    so served_km_low counts the pieces inside radius - margin and served_km_high those
+    inside radius + margin. total_km is exact.
+    (The exact engine's ST_Buffer circles are 32-gons, up to ~2% of the radius inside
+    the true circle, so its result can sit slightly below served_km_low.)
+    """
+    import numpy as np
+    import shapely
+
+    with engine.connect() as conn:
+        stops = gpd.read_postgis(
+            text(f"SELECT geom FROM {SCHEMA}.busstops_7856 WHERE geom IS NOT NULL"), conn, geom_col="geom"
+        )
+        paths = gpd.read_postgis(
+            text(f"SELECT geom FROM {SCHEMA}.paths_7856 WHERE geom IS NOT NULL"), conn, geom_col="geom"
+        )
+
+    lines = np.asarray(paths.geometry.values)
+    lengths = shapely.length(lines)
+    lines, lengths = lines[lengths > 0], lengths[lengths > 0]  # no empty pieces to sample
+    total_m = float(lengths.sum())
+
+    cell = float(RASTER_CELL_M)
+    radius = float(RASTER_RADIUS_M)
+    step = cell / 2
+    margin = cell * np.sqrt(2) + step / 2
+
+    if total_m == 0 or len(stops) == 0:
+        served = low = high = 0.0
+    else:
+        dist, x0, y1 = stop_distance_grid(
+            shapely.get_coordinates(np.asarray(stops.geometry.values)),
+            shapely.total_bounds(lines),
+            cell,
+            pad=radius + margin + cell,
+        )
+
+        # Midpoints of equal pieces (<= step long) along every path
+        n = np.maximum(np.ceil(lengths / step).astype(np.int64), 1)
+        owner = np.repeat(np.arange(len(lines)), n)
+        first = np.repeat(np.cumsum(n) - n, n)
+        frac = (np.arange(n.sum()) - first + 0.5) / n[owner]
+        midpoints = shapely.line_interpolate_point(lines[owner], frac, normalized=True)
+        piece_m = lengths[owner] / n[owner]
+
+        rows, cols = grid_cells(shapely.get_coordinates(midpoints), x0, y1, cell)
+        d = dist[rows, cols]
+        served = float(piece_m[d <= radius].sum())
+        low = float(piece_m[d <= radius - margin].sum())
+        high = float(piece_m[d <= radius + margin].sum())
+
+    def km(m):
+        return round(m / 1000.0, 3)
+
+    def pct(m):
+        return round(100 * m / total_m, 2) if total_m > 0 else None
+
+    return {
+        "served_km": km(served),
+        "served_km_low": km(low),
+        "served_km_high": km(high),
+        "total_km": km(total_m),
+        "served_percent": pct(served),
+        "served_percent_low": pct(low),
+        "served_percent_high": pct(high),
+    }
 
-    # ----------------------------
-    # C1) Create projected copies
-    # ----------------------------
+
+def check_kpi_engine() -> None:
+    if KPI_ENGINE not in ("exact", "raster"):
+        raise ValueError(f'KPI_ENGINE must be "exact" or "raster", got {KPI_ENGINE!r}')
+
+
+# ----------------------------
+# Derive helpers (C1–C3)
+# ----------------------------
+# Tables the incremental path patches in place (plus the raw_*_state snapshots).
+DERIVED_TABLES = [
+    "busstops_7856",
+    "paths_7856",
+    "busstops_buffer_400",
+    "busstops_400_cov",
+    "paths_served_400m",
+]
+
+
+def snapshot_raw_state(engine) -> None:
+    """
+    Store (fid, row_hash) for each raw table as <raw>_state (raw_busstops_state, ...).
+    row_hash is md5 over the whole row (geometry EWKB + attributes); the next
+    incremental run diffs the freshly loaded raw tables against this snapshot.
+    """
+    for raw in raw_tables().values():
+        exec_sql(
+            engine,
+            f"""
+            DROP TABLE IF EXISTS {SCHEMA}.{raw}_state;
+
+            CREATE TABLE {SCHEMA}.{raw}_state AS
+            SELECT r.fid, md5(r::text) AS row_hash
+            FROM {SCHEMA}.{raw} AS r;
+
+            ALTER TABLE {SCHEMA}.{raw}_state ADD PRIMARY KEY (fid);
+            """,
+        )
+
+
+def incremental_ready(engine) -> bool:
+    """
+    True if derived tables and raw_*_state snapshots exist and the raw columns still
+    match the projected copies (a changed API schema needs a full rebuild).
+    """
+    required = DERIVED_TABLES + [f"{raw}_state" for raw in raw_tables().values()]
+    with engine.begin() as conn:
+        if not all(relation_exists(conn, SCHEMA, t) for t in required):
+            return False
+        return (
+            column_names(conn, SCHEMA, raw_table("busstops")) == column_names(conn, SCHEMA, "busstops_7856")
+            and column_names(conn, SCHEMA, raw_table("paths")) == column_names(conn, SCHEMA, "paths_7856")
+        )
+
+
+def derive_incremental(engine) -> tuple[int, int]:
+    """
+    C1–C3 for changed rows only. Returns (changed bus stops, changed paths).
+
+    1. Diff raw_* against raw_*_state by fid + row_hash (new, modified, deleted fids).
+    2. Dirty area = old buffers of changed stops ∪ new buffers of changed stops.
+    3. Patch busstops_7856 / paths_7856 / busstops_buffer_400 for changed fids only.
+    4. Coverage: keep the old polygon outside the dirty area and re-union the
+       buffers inside it.
+    5. Served paths: recompute only for changed paths and paths touching the dirty area.
+
+    Everything runs in one transaction, so a failure leaves the previous state intact.
+    """
+    with engine.begin() as conn:
+        # 1) Changed fids per raw table (deleted = present in the snapshot only)
+        for kind, raw in raw_tables().items():
+            conn.execute(
+                text(
+                    f"""
+                    CREATE TEMP TABLE chg_{kind} ON COMMIT DROP AS
+                    SELECT COALESCE(r.fid, s.fid) AS fid
+                    FROM (
+                      SELECT t.fid, md5(t::text) AS row_hash
+                      FROM {SCHEMA}.{raw} AS t
+                    ) AS r
+                    FULL JOIN {SCHEMA}.{raw}_state AS s
+                      ON s.fid = r.fid
+                    WHERE r.row_hash IS DISTINCT FROM s.row_hash;
+
+                    CREATE INDEX ON chg_{kind} (fid);
+                    ANALYZE chg_{kind};
+                    """
+                )
+            )
+
+        n_bus = int(conn.execute(text("SELECT COUNT(*) FROM chg_busstops;")).scalar())
+        n_paths = int(conn.execute(text("SELECT COUNT(*) FROM chg_paths;")).scalar())
+        if n_bus == 0 and n_paths == 0:
+            return 0, 0
+
+        # 2) Dirty area (must read the OLD buffers before they are replaced)
+        conn.execute(
+            text(
+                f"""
+                CREATE TEMP TABLE dirty ON COMMIT DROP AS
+                SELECT ST_Union(d.geom) AS geom
+                FROM (
+                  SELECT b.geom
+                  FROM {SCHEMA}.busstops_buffer_400 AS b
+                  JOIN chg_busstops AS c ON c.fid = b.fid
+                  UNION ALL
+                  SELECT ST_Buffer(ST_Transform(r.geom, 7856), 400)
+                  FROM {SCHEMA}.{raw_table("busstops")} AS r
+                  JOIN chg_busstops AS c ON c.fid = r.fid
+                ) AS d;
+                """
+            )
+        )
+
+        # 3) C1 projected copies: replace changed fids only
+        #    (server-projected loads already wrote busstops_7856 / paths_7856)
+        if not server_projected():
+            for kind, target, geom_expr in (
+                ("busstops", "busstops_7856", "ST_Transform(r.geom, 7856)"),
+                ("paths", "paths_7856", "ST_Multi(ST_Transform(r.geom, 7856))"),
+            ):
+                raw = raw_table(kind)
+                cols = [c for c in column_names(conn, SCHEMA, raw) if c != "geom"]
+                col_list = ", ".join(f'"{c}"' for c in cols)
+                r_col_list = ", ".join(f'r."{c}"' for c in cols)
+                conn.execute(
+                    text(
+                        f"""
+                        DELETE FROM {SCHEMA}.{target} AS t
+                        USING chg_{kind} AS c
+                        WHERE t.fid = c.fid;
+
+                        INSERT INTO {SCHEMA}.{target} ({col_list}, geom)
+                        SELECT {r_col_list}, {geom_expr}
+                        FROM {SCHEMA}.{raw} AS r
+                        JOIN chg_{kind} AS c ON c.fid = r.fid;
+                        """
+                    )
+                )
+
+        # 3b) C2 buffers for changed stops
+        conn.execute(
+            text(
+                f"""
+                DELETE FROM {SCHEMA}.busstops_buffer_400 AS b
+                USING chg_busstops AS c
+                WHERE b.fid = c.fid;
+
+                INSERT INTO {SCHEMA}.busstops_buffer_400 (fid, suburb, geom)
+                SELECT s.fid, s.suburb, ST_Buffer(s.geom, 400)
+                FROM {SCHEMA}.busstops_7856 AS s
+                JOIN chg_busstops AS c ON c.fid = s.fid;
+                """
+            )
+        )
+
+        # 4) C2 coverage: old polygon outside dirty area + fresh union inside it
+        conn.execute(
+            text(
+                f"""
+                UPDATE {SCHEMA}.busstops_400_cov AS cov
+                SET geom = ST_CollectionExtract(
+                  ST_UnaryUnion(ST_Collect(
+                    ST_Difference(cov.geom, d.geom),
+                    COALESCE(
+                      (
+                        SELECT ST_Intersection(ST_UnaryUnion(ST_Collect(b.geom)), d.geom)
+                        FROM {SCHEMA}.busstops_buffer_400 AS b
+                        WHERE ST_Intersects(b.geom, d.geom)
+                      ),
+                      ST_SetSRID('POLYGON EMPTY'::geometry, 7856)
+                    )
+                  )),
+                  3
+                )
+                FROM dirty AS d
+                WHERE d.geom IS NOT NULL;
+                """
+            )
+        )
+
+        # 5) C3 served paths for changed paths + paths inside the dirty area
+        conn.execute(
+            text(
+                f"""
+                CREATE TEMP TABLE affected_paths ON COMMIT DROP AS
+                SELECT fid FROM chg_paths
+                UNION
+                SELECT p.fid
+                FROM {SCHEMA}.paths_7856 AS p
+                JOIN dirty AS d
+                  ON ST_Intersects(p.geom, d.geom);
+
+                DELETE FROM {SCHEMA}.paths_served_400m AS t
+                USING affected_paths AS a
+                WHERE t.fid = a.fid;
+
+                INSERT INTO {SCHEMA}.paths_served_400m (fid, geom)
+                SELECT
+                  p.fid,
+                  ST_Multi(
+                    ST_CollectionExtract(
+                      ST_Intersection(p.geom, c.geom),
+                      2
+                    )
+                  ) AS geom
+                FROM {SCHEMA}.paths_7856 AS p
+                JOIN affected_paths AS a
+                  ON a.fid = p.fid
+                JOIN {SCHEMA}.busstops_400_cov AS c
+                  ON ST_Intersects(p.geom, c.geom)
+                WHERE NOT ST_IsEmpty(ST_Intersection(p.geom, c.geom));
+                """
+            )
+        )
+
+        # 6) Move the snapshot forward for the changed fids
+        for kind, raw in raw_tables().items():
+            conn.execute(
+                text(
+                    f"""
+                    DELETE FROM {SCHEMA}.{raw}_state AS s
+                    USING chg_{kind} AS c
+                    WHERE s.fid = c.fid;
+
+                    INSERT INTO {SCHEMA}.{raw}_state (fid, row_hash)
+                    SELECT r.fid, md5(r::text)
+                    FROM {SCHEMA}.{raw} AS r
+                    JOIN chg_{kind} AS c ON c.fid = r.fid;
+                    """
+                )
+            )
+
+    return n_bus, n_paths
+
+
+def derive_busstops_7856(engine) -> None:
+    """C1) Projected copy of the bus stops."""
+    target = begin_table(engine, "busstops_7856")
     exec_sql(
         engine,
         f"""
-        DROP TABLE IF EXISTS {SCHEMA}.busstops_7856;
+        CREATE TABLE {target} AS
+        SELECT * FROM {SCHEMA}.{raw_table("busstops")}
+        {spatial_order.order_by(SPATIAL_ORDER)};
 
-        CREATE TABLE {SCHEMA}.busstops_7856 AS
-        SELECT * FROM {SCHEMA}.raw_busstops;
-
-        ALTER TABLE {SCHEMA}.busstops_7856
+        ALTER TABLE {target}
           ALTER COLUMN geom TYPE geometry(Point, 7856)
           USING ST_Transform(geom, 7856);
-
-        CREATE INDEX IF NOT EXISTS busstops_7856_geom_gix
-          ON {SCHEMA}.busstops_7856
-          USING gist (geom);
         """,
     )
+    finish_table(engine, "busstops_7856", {"busstops_7856_geom_gix": "gist (geom)"})
 
+
+def derive_paths_7856(engine) -> None:
+    """C1) Projected copy of the paths."""
+    target = begin_table(engine, "paths_7856")
     exec_sql(
         engine,
         f"""
-        DROP TABLE IF EXISTS {SCHEMA}.paths_7856;
-
-        CREATE TABLE {SCHEMA}.paths_7856 AS
-        SELECT * FROM {SCHEMA}.raw_paths;
+        CREATE TABLE {target} AS
+        SELECT * FROM {SCHEMA}.{raw_table("paths")}
+        {spatial_order.order_by(SPATIAL_ORDER)};
 
-        ALTER TABLE {SCHEMA}.paths_7856
+        ALTER TABLE {target}
           ALTER COLUMN geom TYPE geometry(MultiLinestring, 7856)
           USING ST_Multi(ST_Transform(geom, 7856));
-
-        CREATE INDEX IF NOT EXISTS paths_7856_geom_gix
-          ON {SCHEMA}.paths_7856
-          USING gist (geom);
         """,
     )
+    finish_table(engine, "paths_7856", {"paths_7856_geom_gix": "gist (geom)"})
 
-    # ----------------------------
-    # C2) Bus stop coverage area
-    # ----------------------------
+
+def derive_buffers(engine) -> None:
+    """C2) 400 m buffer per bus stop."""
+    target = begin_table(engine, "busstops_buffer_400")
     exec_sql(
         engine,
         f"""
-        DROP TABLE IF EXISTS {SCHEMA}.busstops_buffer_400;
-
-        CREATE TABLE {SCHEMA}.busstops_buffer_400 AS
+        CREATE TABLE {target} AS
         SELECT
           fid,
           suburb,
           ST_Buffer(geom, 400) AS geom
-        FROM {SCHEMA}.busstops_7856;
-
-        CREATE INDEX IF NOT EXISTS busstops_buffer_400_gix
-          ON {SCHEMA}.busstops_buffer_400
-          USING gist (geom);
+        FROM {SCHEMA}.busstops_7856
+        {spatial_order.order_by(SPATIAL_ORDER)};
         """,
     )
+    finish_table(engine, "busstops_buffer_400", {"busstops_buffer_400_gix": "gist (geom)"})
 
+
+def derive_coverage(engine) -> None:
+    """C2) Dissolved coverage polygon."""
+    target = begin_table(engine, "busstops_400_cov")
     exec_sql(
         engine,
         f"""
-        DROP TABLE IF EXISTS {SCHEMA}.busstops_400_cov;
-
-        CREATE TABLE {SCHEMA}.busstops_400_cov AS
+        CREATE TABLE {target} AS
         SELECT ST_UnaryUnion(ST_Collect(geom)) AS geom
         FROM {SCHEMA}.busstops_buffer_400;
-
-        CREATE INDEX IF NOT EXISTS busstops_400_cov_gix
-          ON {SCHEMA}.busstops_400_cov
-          USING gist(geom);
         """,
     )
+    finish_table(engine, "busstops_400_cov", {"busstops_400_cov_gix": "gist (geom)"})
 
-    # ----------------------------
-    # C3) Served paths (inside coverage)
-    # ----------------------------
+
+def derive_served(engine) -> None:
+    """C3) Served paths (inside coverage)."""
+    target = begin_table(engine, "paths_served_400m")
     exec_sql(
         engine,
         f"""
-        DROP TABLE IF EXISTS {SCHEMA}.paths_served_400m;
-
-        CREATE TABLE {SCHEMA}.paths_served_400m AS
+        CREATE TABLE {target} AS
         SELECT
           p.fid,
           ST_Multi(
@@ -322,35 +956,54 @@ def main():
         FROM {SCHEMA}.paths_7856 AS p
         JOIN {SCHEMA}.busstops_400_cov AS c
           ON ST_Intersects(p.geom, c.geom)
-        WHERE NOT ST_IsEmpty(ST_Intersection(p.geom, c.geom));
-
-        CREATE INDEX IF NOT EXISTS paths_served_400m_gix
-          ON {SCHEMA}.paths_served_400m
-          USING gist (geom);
+        WHERE NOT ST_IsEmpty(ST_Intersection(p.geom, c.geom))
+        {spatial_order.order_by(SPATIAL_ORDER, "p.geom")};
         """
     )
+    finish_table(engine, "paths_served_400m", {"paths_served_400m_gix": "gist (geom)"})
 
-    # ----------------------------
-    # C4) KPI (served_km / total_km / served_percent)
-    # ----------------------------
-    with engine.begin() as conn:
-        served_km = conn.execute(
-            text(
-                f"""
-                SELECT ROUND((SUM(ST_Length(geom))/1000.0)::numeric, 3)
-                FROM {SCHEMA}.paths_served_400m;
-                """
-            )
-        ).scalar()
 
-        total_km = conn.execute(
-            text(
-                f"""
-                SELECT ROUND((SUM(ST_Length(geom))/1000.0)::numeric, 3)
-                FROM {SCHEMA}.paths_7856;
-                """
-            )
-        ).scalar()
+def derive_full(engine) -> None:
+    """C1–C3 from scratch: rebuild every derived table, then snapshot the raw row hashes."""
+    # C1) projected copies (skipped when the server already returned EPSG:7856
+    # into busstops_7856 / paths_7856)
+    if not server_projected():
+        with instr.stage("busstops_7856", "derive"):
+            derive_busstops_7856(engine)
+        with instr.stage("paths_7856", "derive"):
+            derive_paths_7856(engine)
+
+    # C2) bus stop coverage area
+    with instr.stage("busstops_buffer_400", "derive"):
+        derive_buffers(engine)
+    with instr.stage("busstops_400_cov", "derive"):
+        derive_coverage(engine)
+
+    # C3) served paths
+    with instr.stage("paths_served_400m", "derive"):
+        derive_served(engine)
+
+    snapshot_raw_state(engine)
+
+
+# ----------------------------
+# Reporting steps (shared by main() and the DAG)
+# ----------------------------
+def validate_counts(engine) -> None:
+    """B4) API count vs DB count for both raw tables."""
+    count_buses_api = fetch_count(BUSSTOPS_LAYER, WHERE_ALL)
+    count_paths_api = fetch_count(PATHS_LAYER, WHERE_ALL)
+
+    count_bus_db = table_count(engine, SCHEMA, raw_table("busstops"))
+    count_path_db = table_count(engine, SCHEMA, raw_table("paths"))
+
+    report_count("busstops", count_buses_api, count_bus_db)
+    report_count("paths", count_paths_api, count_path_db)
+
+
+def report_lga_kpi(engine) -> float | None:
+    """C4) LGA-wide KPI; prints and returns served_percent."""
+    served_km, total_km = lga_kpi(engine)
 
     print("served_km:", served_km)
     print("total_km:", total_km)
@@ -361,7 +1014,241 @@ def main():
         served_percent = round(100 * float(served_km) / float(total_km), 2)
 
     print("served_percent:", served_percent)
+    return served_percent
+
+
+def report_suburb_kpi(engine) -> int:
+    """C4b) Per-suburb KPI upsert (only KPI_SUBURBS when set)."""
+    n_suburbs = refresh_suburb_kpi(engine, KPI_SUBURBS)
+    print(f"{n_suburbs} suburb KPI rows refreshed in {SCHEMA}.{KPI_SUBURB_TABLE}")
+    return n_suburbs
+
+
+def report_lga_kpi_raster(engine) -> float | None:
+    """C4) Approximate LGA-wide KPI (KPI_ENGINE = "raster"); prints and returns served_percent."""
+    kpi = raster_lga_kpi(engine)
+
+    print(f"served_km: {kpi['served_km']} (bounds {kpi['served_km_low']} – {kpi['served_km_high']})")
+    print("total_km:", kpi["total_km"])
+    print(
+        f"served_percent: {kpi['served_percent']} "
+        f"(bounds {kpi['served_percent_low']} – {kpi['served_percent_high']}, "
+        f"{RASTER_CELL_M} m cells)"
+    )
+    return kpi["served_percent"]
+
+
+def derive_changed(engine) -> None:
+    """
+    C1–C3 in the DAG's derive_incremental task. Falls back to a full rebuild when this
+    run's load made incremental_ready() False (e.g. the API columns changed).
+    """
+    if incremental_ready(engine):
+        n_bus, n_paths = derive_incremental(engine)
+        print(f"Incremental derive: {n_bus} changed bus stops, {n_paths} changed paths")
+    else:
+        derive_full(engine)
+        print("Full derive: projected, buffered and served tables rebuilt")
+
+
+def export_tiles(engine) -> dict:
+    """D) Vector tile pyramid of the served paths + coverage polygon (TILES_OUT)."""
+    return mvt.export_postgis(
+        engine, TILE_LAYERS, TILES_OUT, workers=TILES_WORKERS, incremental=TILES_INCREMENTAL,
+        name="busstops_paths_coverage",
+    )
+
+
+# ----------------------------
+# DAG mode (RUN_AS_DAG)
+# ----------------------------
+def build_tasks(engine) -> list[dag.Task]:
+    """
+    A–C4 as a task graph. The bus stop and path branches run side by side; each load
+    starts as soon as its own fetch is done. Fetches are skipped when the layer's count
+    and last edit date are unchanged, and everything downstream follows.
+
+    With INCREMENTAL_DERIVE and a previous state to diff against, C1–C3 are one
+    derive_incremental task after both loads instead of the full-rebuild tasks.
+    """
+    def load(table, multi_lines=False):
+        def _load(features):
+            gdf = features_to_gdf(features, multi_lines=multi_lines)
+            load_gdf(engine, gdf, table, {f"{table}_geom_gix": "gist (geom)"})
+            print(f"{len(gdf)} rows loaded into {SCHEMA}.{table}")
+        return _load
+
+    def on_engine(fn):
+        return lambda *_: fn(engine)
+
+    bus_in, paths_in = "load_raw_busstops", "load_raw_paths"
+    tasks = [
+        dag.Task(
+            "fetch_busstops", lambda: fetch_all(BUSSTOPS_LAYER, PAGE_SIZE, WHERE_ALL, BUSSTOPS_OUT_FIELDS),
+            kind="fetch", fingerprint=lambda: layer_fingerprint(BUSSTOPS_LAYER, BUSSTOPS_OUT_FIELDS),
+        ),
+        dag.Task(
+            "fetch_paths", lambda: fetch_all(PATHS_LAYER, PAGE_SIZE, WHERE_ALL, PATHS_OUT_FIELDS),
+            kind="fetch", fingerprint=lambda: layer_fingerprint(PATHS_LAYER, PATHS_OUT_FIELDS),
+        ),
+        dag.Task(bus_in, load(raw_table("busstops")), ("fetch_busstops",), "load", uses_results=True),
+        dag.Task(paths_in, load(raw_table("paths"), multi_lines=True), ("fetch_paths",), "load", uses_results=True),
+        dag.Task("validate_counts", on_engine(validate_counts), (bus_in, paths_in), "fetch", always_run=True),
+    ]
+
+    if KPI_ENGINE != "raster" and INCREMENTAL_DERIVE and incremental_ready(engine):
+        tasks.append(dag.Task("derive_incremental", on_engine(derive_changed), (bus_in, paths_in), "derive"))
+        served = "derive_incremental"
+    else:
+        if not server_projected():
+            tasks += [
+                dag.Task("busstops_7856", on_engine(derive_busstops_7856), (bus_in,), "derive"),
+                dag.Task("paths_7856", on_engine(derive_paths_7856), (paths_in,), "derive"),
+            ]
+            bus_in, paths_in = "busstops_7856", "paths_7856"
+
+        if KPI_ENGINE == "raster":
+            tasks.append(dag.Task(
+                "kpi_lga_raster", on_engine(report_lga_kpi_raster), (bus_in, paths_in), "kpi",
+                fingerprint=lambda: f"{RASTER_CELL_M}|{RASTER_RADIUS_M}",
+            ))
+            return tasks
+
+        tasks += [
+            dag.Task("busstops_buffer_400", on_engine(derive_buffers), (bus_in,), "derive"),
+            dag.Task("busstops_400_cov", on_engine(derive_coverage), ("busstops_buffer_400",), "derive"),
+            dag.Task("paths_served_400m", on_engine(derive_served), ("busstops_400_cov", paths_in), "derive"),
+            dag.Task("snapshot_raw_state", on_engine(snapshot_raw_state), ("paths_served_400m",), "derive"),
+        ]
+        served = "paths_served_400m"
+
+    tasks += [
+        dag.Task("kpi_lga", on_engine(report_lga_kpi), (served,), "kpi"),
+        dag.Task(
+            "kpi_suburb", on_engine(report_suburb_kpi), (served,), "kpi",
+            fingerprint=lambda: repr(KPI_SUBURBS),
+        ),
+    ]
+
+    if TILES_OUT:
+        tasks.append(dag.Task(
+            "export_tiles", on_engine(export_tiles), (served,), "write",
+            fingerprint=lambda: f"{TILES_OUT}|{Path(TILES_OUT).exists()}",
+        ))
+    return tasks
+
+
+def main_dag(force: bool = False):
+    check_kpi_engine()
+    engine = make_engine()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    print("DB connection OK")
+
+    exec_sql(engine, f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};")
+    dag.run_dag("busstops_paths_coverage", build_tasks(engine), max_workers=DAG_WORKERS, force=force)
+
+
+# ----------------------------
+# Main pipeline
+# ----------------------------
+def main():
+    check_kpi_engine()
+
+    # ============================================================
+    # A) Download data (ArcGIS FeatureServer → GeoJSON)
+    # ============================================================
+
+    # A1) Bus stops
+    with instr.stage("fetch_busstops", "fetch"):
+        data_bus = fetch_all(BUSSTOPS_LAYER, PAGE_SIZE, WHERE_ALL, BUSSTOPS_OUT_FIELDS)
+    print(f"{len(data_bus)} bus stop features fetched!")
+
+    # A2) Paths
+    with instr.stage("fetch_paths", "fetch"):
+        data_paths = fetch_all(PATHS_LAYER, PAGE_SIZE, WHERE_ALL, PATHS_OUT_FIELDS)
+    print(f"{len(data_paths)} path features fetched!")
+
+
+    # ============================================================
+    # B) Load into PostGIS (schema: bcc_open)
+    # ============================================================
+
+    # B0) Connect
+    engine = make_engine()
+    print("engine object created")
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        print("DB connection OK")
+    except Exception as e:
+        print("DB connection FAILED:")
+        print(e)
+        return
+
+    # B1) Ensure schema exists
+    exec_sql(engine, f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};")
+
+    # B2) Load raw_busstops (EPSG:4326, or busstops_7856 when server-projected) + index
+    with instr.stage("load_raw_busstops", "load"):
+        gdf_bus = features_to_gdf(data_bus)
+        raw_bus = raw_table("busstops")
+        load_gdf(engine, gdf_bus, raw_bus, {f"{raw_bus}_geom_gix": "gist (geom)"})
+
+    # B3) Load raw_paths (EPSG:4326, or paths_7856 when server-projected) + index
+    with instr.stage("load_raw_paths", "load"):
+        gdf_paths = features_to_gdf(data_paths, multi_lines=True)
+        raw_paths = raw_table("paths")
+        load_gdf(engine, gdf_paths, raw_paths, {f"{raw_paths}_geom_gix": "gist (geom)"})
+
+    # B4) Optional sanity check: API count vs DB count
+    with instr.stage("validate_counts", "fetch"):
+        validate_counts(engine)
+
+
+    # ============================================================
+    # C) Derive & analyze (distance-safe in EPSG:7856)
+    # ============================================================
+
+    if KPI_ENGINE == "raster":
+        # C1 only, then the approximate LGA KPI (no C2–C3 tables, suburb KPI or tiles)
+        if not server_projected():
+            with instr.stage("busstops_7856", "derive"):
+                derive_busstops_7856(engine)
+            with instr.stage("paths_7856", "derive"):
+                derive_paths_7856(engine)
+        with instr.stage("kpi_lga_raster", "kpi"):
+            report_lga_kpi_raster(engine)
+        return
+
+    if INCREMENTAL_DERIVE and incremental_ready(engine):
+        with instr.stage("derive_incremental", "derive"):
+            n_bus, n_paths = derive_incremental(engine)
+        print(f"Incremental derive: {n_bus} changed bus stops, {n_paths} changed paths")
+    else:
+        with instr.stage("derive_full", "derive"):
+            derive_full(engine)
+        print("Full derive: projected, buffered and served tables rebuilt")
+
+    # ----------------------------
+    # C4) KPI (served_km / total_km / served_percent)
+    # ----------------------------
+    with instr.stage("kpi_lga", "kpi"):
+        report_lga_kpi(engine)
+
+    # C4b) Per-suburb breakdown (upsert; only KPI_SUBURBS when set)
+    with instr.stage("kpi_suburb", "kpi"):
+        report_suburb_kpi(engine)
+
+    # ============================================================
+    # D) Vector tiles (optional)
+    # ============================================================
+    if TILES_OUT:
+        with instr.stage("export_tiles", "write"):
+            export_tiles(engine)
 
 
 if __name__ == "__main__":
-    main()
+    with instr.run("busstops_paths_coverage"):
+        main_dag() if RUN_AS_DAG else main()
@@ -0,0 +1,138 @@
+"""
+BCC Traffic Counts → Step 1 + Step 2 as one task graph (V1)
+
+What this script does
+---------------------
+Runs both steps through gis_common/dag.py instead of one after the other:
+
+    station_reference:<LGA 1>  →  yearly_summary:<LGA 1>
+    station_reference:<LGA 2>  →  yearly_summary:<LGA 2>
+    ...
+    then: summaries (stations touched in this run)
+
+- Step 2 for an LGA starts as soon as Step 1 for that LGA is loaded (it does not wait
+  for the other LGAs), up to MAX_WORKERS LGAs at a time under the steps' shared rate limit.
+- An LGA is skipped when its inputs are unchanged since its last successful run:
+  - Step 1: CKAN row count for the LGA + the resource's last_modified
+  - Step 2: the yearly resource's last_modified + the Step 1 key of that LGA
+- summaries refreshes station_year_summary / station_direction_split for the stations
+  touched in this run (see step_2_yearly_summary_V1.py, C). Like Step 2 it also runs
+  after a partial failure, so whatever loaded is summarised; with every LGA skipped it
+  finds no touched rows and returns at once.
+
+Notes
+-----
+- LGAS, MAX_WORKERS and the CKAN settings come from the step scripts.
+- Both steps share Step 1's RATE_LIMIT (MAX_REQUESTS_PER_SEC of step 1).
+- FORCE = True runs every task regardless of stored keys.
+"""
+
+from __future__ import annotations
+
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import requests
+
+import step_1_station_reference_V1 as step1
+import step_2_yearly_summary_V1 as step2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import dag, instrumentation as instr
+
+
+# ----------------------------
+# Config
+# ----------------------------
+RESOURCE_SHOW = step1.ENDPOINT.replace("datastore_search", "resource_show")
+FORCE = False
+
+# One request budget for both steps: Step 1 and Step 2 tasks run side by side, and two
+# limiters would let up to 2 × MAX_REQUESTS_PER_SEC through (step1's setting applies)
+step2.RATE_LIMIT = step1.RATE_LIMIT
+
+
+# ----------------------------
+# Fingerprints (cheap change probes)
+# ----------------------------
+@lru_cache(maxsize=None)
+def resource_last_modified(resource_id: str) -> str:
+    """CKAN resource last_modified (falls back to metadata_modified); asked once per run."""
+    step1.RATE_LIMIT.wait()
+    resp = requests.get(RESOURCE_SHOW, params={"id": resource_id}, timeout=step1.REQUEST_TIMEOUT)
+    instr.record_http(resp)
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("success") is not True:
+        raise RuntimeError(f"CKAN resource_show success=false for {resource_id}")
+
+    result = data["result"]
+    modified = result.get("last_modified") or result.get("metadata_modified")
+    if not modified:
+        raise ValueError(f"No last_modified for resource {resource_id}")
+    return str(modified)
+
+
+def lga_row_count(lga: str) -> int:
+    """Station reference rows for one LGA (limit 0 → only the total)."""
+    result = step1.ckan_post({"resource_id": step1.RESOURCE_ID, "limit": 0, "filters": {"lga": lga}})
+    return int(result["total"])
+
+
+# ----------------------------
+# Task graph
+# ----------------------------
+def build_tasks(engine, lgas: list[str]) -> list[dag.Task]:
+    tasks: list[dag.Task] = []
+
+    for lga in lgas:
+        ref_task = f"station_reference:{lga}"
+
+        def load_reference(lga=lga):
+            n = step1.load_lga(engine, lga)
+            print(f"{lga}: {n} station records fetched + upserted")
+
+        def load_yearly(*_, lga=lga):
+            keys = step2.fetch_station_keys(engine, [lga]).get(lga, [])
+            fetched, upserted = step2.load_lga(engine, lga, keys)
+            print(f"{lga}: {len(keys)} stations, fetched={fetched}, upserted={upserted}")
+
+        tasks += [
+            dag.Task(
+                ref_task, load_reference, kind="load",
+                fingerprint=lambda lga=lga: f"{lga_row_count(lga)}|{resource_last_modified(step1.RESOURCE_ID)}",
+            ),
+            dag.Task(
+                f"yearly_summary:{lga}", load_yearly, (ref_task,), "load",
+                fingerprint=lambda: resource_last_modified(step2.YEARLY_RESOURCE_ID),
+            ),
+        ]
+
+    return tasks
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main():
+    lgas = step1.fetch_lga_names(step1.RESOURCE_ID) if step1.LGAS == "all" else list(step1.LGAS)
+    print(f"LGAs: {len(lgas)}")
+
+    engine = step2.make_engine()
+    with instr.stage("ensure_yearly_table", "load"):
+        step2.ensure_yearly_table(engine)
+    run_started = step2.db_now(engine)
+
+    try:
+        dag.run_dag("traffic_pipeline", build_tasks(engine, lgas), max_workers=step1.MAX_WORKERS, force=FORCE)
+    finally:
+        if step2.REFRESH_SUMMARIES:
+            with instr.stage("refresh_summaries", "derive"):
+                since = None if step2.REBUILD_SUMMARIES else run_started
+                print("summary_stations_refreshed:", step2.refresh_summaries(engine, since))
+
+
+if __name__ == "__main__":
+    with instr.run("traffic_pipeline"):
+        main()
@@ -2,48 +2,73 @@
 BCC Traffic Counts → Station Reference (V1)
 
 A) Fetch station reference records from Data.NSW (CKAN datastore_search)
-   - filter: lga = Blacktown
+   - filter: lga, for each LGA in LGAS (a list, or "all" = every LGA in the resource)
+   - LGAs are fetched concurrently (MAX_WORKERS) under one shared MAX_REQUESTS_PER_SEC
    - handle paging via limit/offset
+   - only the upserted columns (`fields=`), in RECORDS_FORMAT, parsed into typed columns
 
 B) Upsert into PostGIS (schema: bcc_traffic)
    - table: station_reference
    - geometry: Point (EPSG:4326)
+   - each LGA goes through its own temp staging table in its own transaction, so a
+     failed LGA does not roll back the others (failures are listed at the end)
 """
 
 from __future__ import annotations
 
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import requests
 from sqlalchemy import create_engine, text
 from urllib.parse import quote_plus
 
 from db_config_local import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import ckan, instrumentation as instr
+
 
 # ----------------------------
 # Config
 # ----------------------------
 ENDPOINT = "https://data.nsw.gov.au/data/api/action/datastore_search"
 RESOURCE_ID = "f4092c24-87d8-44dc-b23d-83f2ff2a414f"
-LGA_FILTER = "Blacktown"
 PAGE_SIZE = 1000
+REQUEST_TIMEOUT = 60
+
+# LGAs to load: a list of names as they appear in the resource, or "all"
+LGAS: list[str] | str = ["Blacktown"]
+
+# Concurrency: LGAs in flight at once, and one request budget shared by all of them
+MAX_WORKERS = 4
+MAX_REQUESTS_PER_SEC = 8
+
+# CKAN columns to request (= the upserted columns) and how to type them
+FIELDS = ["station_key", "station_id", "lga", "suburb", "road_name", "wgs84_latitude", "wgs84_longitude"]
+COLUMN_TYPES = {"wgs84_latitude": float, "wgs84_longitude": float}  # others: str
+REQUIRED_FIELDS = ("station_key", "station_id", "wgs84_latitude", "wgs84_longitude")
+
+# "objects" (CKAN default, dict per record), "lists" or "csv" (smallest payload)
+RECORDS_FORMAT = "csv"
 
 SCHEMA = "bcc_traffic"
 TABLE = "station_reference"
 
 
+# Reads MAX_REQUESTS_PER_SEC per request, so overriding the setting after import works
+RATE_LIMIT = ckan.RateLimiter(lambda: MAX_REQUESTS_PER_SEC)
+
+
 # ----------------------------
 # CKAN helpers
 # ----------------------------
-def ckan_fetch_page(resource_id: str, limit: int, offset: int, lga: str) -> tuple[list[dict], int]:
-    """Fetch one page from CKAN datastore_search. Returns (records, total)."""
-    payload = {
-        "resource_id": resource_id,
-        "limit": limit,
-        "offset": offset,
-        "filters": {"lga": lga},
-    }
-
-    resp = requests.post(ENDPOINT, json=payload, timeout=60)
+def ckan_post(payload: dict) -> dict:
+    """POST to CKAN datastore_search (rate limited) with validation. Returns result."""
+    RATE_LIMIT.wait()
+    resp = requests.post(ENDPOINT, json=payload, timeout=REQUEST_TIMEOUT)
+    instr.record_http(resp)
     resp.raise_for_status()
     data = resp.json()
 
@@ -54,36 +79,69 @@ def ckan_fetch_page(resource_id: str, limit: int, offset: int, lga: str) -> tupl
     if not isinstance(result, dict) or "records" not in result or "total" not in result:
         raise ValueError(f"Unexpected CKAN result structure. Keys={list(result.keys()) if isinstance(result, dict) else type(result)}")
 
-    records = result["records"]
-    total = int(result["total"])
+    return result
+
+
+def fetch_lga_names(resource_id: str) -> list[str]:
+    """Every distinct lga value in the station reference resource."""
+    result = ckan_post({
+        "resource_id": resource_id,
+        "fields": "lga",
+        "distinct": True,
+        "sort": "lga",
+        "limit": 32000,
+    })
+    return [r["lga"] for r in result["records"] if r.get("lga")]
+
 
-    if not isinstance(records, list):
-        raise ValueError("CKAN result['records'] is not a list.")
+def parse_page(result: dict, records_format: str | None = None) -> dict[str, list]:
+    """
+    One CKAN result page → typed columns (raises ValueError on bad values).
+    records_format defaults to the current RECORDS_FORMAT, the one the request used.
+    """
+    rows = ckan.page_rows(result, FIELDS, records_format or RECORDS_FORMAT)
+    return ckan.to_columns(rows, FIELDS, COLUMN_TYPES, required=REQUIRED_FIELDS)
+
+
+def ckan_fetch_page(resource_id: str, limit: int, offset: int, lga: str) -> tuple[dict[str, list], int]:
+    """Fetch one page from CKAN datastore_search. Returns (typed columns, total)."""
+    payload = {
+        "resource_id": resource_id,
+        "limit": limit,
+        "offset": offset,
+        "filters": {"lga": lga},
+        **ckan.search_params(FIELDS, RECORDS_FORMAT),
+    }
 
-    return records, total
+    result = ckan_post(payload)
+    total = int(result["total"])
+    return parse_page(result), total
 
 
-def ckan_fetch_all(resource_id: str, page_size: int, lga: str) -> list[dict]:
-    """Fetch all records with paging."""
-    all_records: list[dict] = []
+def ckan_fetch_all(resource_id: str, page_size: int, lga: str) -> dict[str, list]:
+    """Fetch all records with paging. Returns typed columns."""
+    columns: dict[str, list] = {f: [] for f in FIELDS}
+    fetched = 0
     offset = 0
     total = None
 
     while True:
-        records, total_now = ckan_fetch_page(resource_id, page_size, offset, lga)
+        page, total_now = ckan_fetch_page(resource_id, page_size, offset, lga)
         if total is None:
             total = total_now
 
-        all_records.extend(records)
+        n = len(page["station_key"])
+        ckan.extend_columns(columns, page)
+        fetched += n
 
-        if not records:
+        if not n:
             break
-        if len(all_records) >= total:
+        if fetched >= total:
             break
 
         offset += page_size
 
-    return all_records
+    return columns
 
 
 # ----------------------------
@@ -91,9 +149,9 @@ def ckan_fetch_all(resource_id: str, page_size: int, lga: str) -> list[dict]:
 # ----------------------------
 def make_engine():
     password = quote_plus(DB_PASSWORD)
-    return create_engine(
+    return instr.instrument_engine(create_engine(
         f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    )
+    ))
 
 
 def table_count(engine, schema: str, table: str) -> int:
@@ -101,61 +159,70 @@ def table_count(engine, schema: str, table: str) -> int:
         return int(conn.execute(text(f"SELECT COUNT(*) FROM {schema}.{table};")).scalar())
 
 
-def upsert_station_reference(engine, schema: str, table: str, records: list[dict]) -> int:
+def upsert_station_reference(engine, schema: str, table: str, columns: dict[str, list]) -> int:
     """
-    Bulk upsert station reference records into PostGIS.
-    Returns final row count.
+    Bulk upsert station reference columns (from parse_page) into PostGIS.
+    The batch goes into a temp staging table first and is merged in one statement,
+    all in one transaction (one call = one LGA). Returns final row count.
     """
-    sql = text(f"""
-    INSERT INTO {schema}.{table}
-      (station_key, station_id, lga, suburb, road_name, wgs84_latitude, wgs84_longitude, geom)
-    VALUES
-      (:station_key, :station_id, :lga, :suburb, :road_name, :lat, :lon,
-       ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)
-      )
-    ON CONFLICT (station_key) DO UPDATE
-    SET
-      station_id = EXCLUDED.station_id,
-      lga = EXCLUDED.lga,
-      suburb = EXCLUDED.suburb,
-      road_name = EXCLUDED.road_name,
-      wgs84_latitude = EXCLUDED.wgs84_latitude,
-      wgs84_longitude = EXCLUDED.wgs84_longitude,
-      geom = EXCLUDED.geom;
-    """)
+    params = ckan.column_params(columns)
 
     with engine.begin() as conn:
-        for rec in records:
-            # Defensive parsing
-            try:
-                params = {
-                    "station_key": str(rec["station_key"]),
-                    "station_id": str(rec["station_id"]),
-                    "lga": rec.get("lga"),
-                    "suburb": rec.get("suburb"),
-                    "road_name": rec.get("road_name"),
-                    "lat": float(rec["wgs84_latitude"]),
-                    "lon": float(rec["wgs84_longitude"]),
-                }
-            except Exception as e:
-                raise ValueError(f"Bad record encountered. Keys={list(rec.keys())}") from e
-
-            conn.execute(sql, params)
+        if params:
+            conn.execute(text("""
+            CREATE TEMP TABLE stg_station_reference (
+              station_key text, station_id text, lga text, suburb text, road_name text,
+              wgs84_latitude double precision, wgs84_longitude double precision
+            ) ON COMMIT DROP;
+            """))
+            conn.execute(text("""
+            INSERT INTO stg_station_reference
+              (station_key, station_id, lga, suburb, road_name, wgs84_latitude, wgs84_longitude)
+            VALUES
+              (:station_key, :station_id, :lga, :suburb, :road_name, :wgs84_latitude, :wgs84_longitude);
+            """), params)
+
+            # DISTINCT ON: a station listed twice in one batch cannot hit ON CONFLICT twice
+            conn.execute(text(f"""
+            INSERT INTO {schema}.{table}
+              (station_key, station_id, lga, suburb, road_name, wgs84_latitude, wgs84_longitude, geom)
+            SELECT DISTINCT ON (station_key)
+              station_key, station_id, lga, suburb, road_name, wgs84_latitude, wgs84_longitude,
+              ST_SetSRID(ST_MakePoint(wgs84_longitude, wgs84_latitude), 4326)
+            FROM stg_station_reference
+            ORDER BY station_key
+            ON CONFLICT (station_key) DO UPDATE
+            SET
+              station_id = EXCLUDED.station_id,
+              lga = EXCLUDED.lga,
+              suburb = EXCLUDED.suburb,
+              road_name = EXCLUDED.road_name,
+              wgs84_latitude = EXCLUDED.wgs84_latitude,
+              wgs84_longitude = EXCLUDED.wgs84_longitude,
+              geom = EXCLUDED.geom;
+            """))
 
         n = conn.execute(text(f"SELECT COUNT(*) FROM {schema}.{table};")).scalar_one()
 
     return int(n)
 
 
+def load_lga(engine, lga: str) -> int:
+    """Fetch + upsert one LGA (runs on a worker thread). Returns fetched record count."""
+    with instr.stage("fetch_station_reference", "fetch", lga=lga):
+        columns = ckan_fetch_all(RESOURCE_ID, PAGE_SIZE, lga)
+    with instr.stage("upsert_station_reference", "load", lga=lga):
+        upsert_station_reference(engine, SCHEMA, TABLE, columns)
+    return len(columns["station_key"])
+
+
 # ----------------------------
 # Main
 # ----------------------------
 def main():
-    # A) Fetch all
-    records = ckan_fetch_all(RESOURCE_ID, PAGE_SIZE, LGA_FILTER)
-    print(f"Fetched records: {len(records)}")
-    if records:
-        print("Last station_key:", records[-1].get("station_key"))
+    # A) LGAs to load
+    lgas = fetch_lga_names(RESOURCE_ID) if LGAS == "all" else list(LGAS)
+    print(f"LGAs: {len(lgas)} ({', '.join(lgas[:5])}{', ...' if len(lgas) > 5 else ''})")
 
     # B) DB connect
     engine = make_engine()
@@ -168,10 +235,23 @@ def main():
     except Exception:
         print("Could not count existing rows (table may not exist yet).")
 
-    # C) Upsert
-    after = upsert_station_reference(engine, SCHEMA, TABLE, records)
-    print("Rows after:", after)
+    # C) Fetch + upsert, one LGA per worker
+    failed: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {lga: pool.submit(load_lga, engine, lga) for lga in lgas}
+        for lga, fut in futures.items():
+            try:
+                print(f"{lga}: fetched={fut.result()}")
+            except Exception as e:
+                failed[lga] = repr(e)
+                print(f"{lga}: FAILED ({e!r})")
+
+    print("Rows after:", table_count(engine, SCHEMA, TABLE))
+
+    if failed:
+        raise RuntimeError(f"{len(failed)}/{len(lgas)} LGA(s) failed (others were loaded): {sorted(failed)}")
 
 
 if __name__ == "__main__":
-    main()
+    with instr.run("traffic_step_1_station_reference"):
+        main()
@@ -6,27 +6,51 @@ What this script does
 A) Fetch yearly summary records from Data.NSW (CKAN datastore_search)
    - dataset: yearly summary (RESOURCE_ID)
    - per station_key (paged with limit/offset)
+   - stations grouped by LGA (LGAS: a list, or "all" = every LGA in station_reference);
+     LGAs run concurrently (MAX_WORKERS) under one shared MAX_REQUESTS_PER_SEC
 
 B) Upsert into PostGIS (schema: bcc_traffic)
-   - table: yearly_summary
+   - table: yearly_summary, range-partitioned by year (YEARS_PER_PARTITION years each)
    - unique key: (station_key, year, period, count_type, traffic_direction_seq, cardinal_direction_seq)
-   - updates: classification_type, traffic_count
+   - updates: classification_type, traffic_count (+ updated_at, only when a value changed)
+   - partitions are created as new years arrive; rows are written straight into their partition
+   - BRIN index on updated_at (cheap; updated_at follows load order); the year itself
+     is handled by partition pruning
+   - an existing flat (non-partitioned) yearly_summary is migrated on first run
+
+C) Refresh summary tables for the stations touched in this run (REFRESH_SUMMARIES)
+   - station_year_summary   : totals per station/year/period (+ year-over-year growth)
+   - station_direction_split: each direction's share of the station/year/period total
+   - station_year_summary_geo (view): station_year_summary + station_reference geometry
+   - "touched" = rows whose updated_at moved during this run; only those stations are
+     deleted + re-inserted, in one transaction (REBUILD_SUMMARIES = True → all stations)
 
 Notes
 -----
-- Uses station keys from bcc_traffic.station_reference
+- Uses station keys (and their lga) from bcc_traffic.station_reference
+- Each station commits in its own transaction; a failed LGA stops at its failing station
+  and does not roll back the other LGAs (failures are listed at the end)
 - CKAN responses are validated (HTTP + success flag + structure)
+- Only the upserted columns are requested (`fields=`), in RECORDS_FORMAT ("csv" by default);
+  each page is parsed into typed columns and upserted with one executemany
 """
 
 from __future__ import annotations
 
-import time
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import requests
 from sqlalchemy import create_engine, text
 from urllib.parse import quote_plus
 
 from db_config_local import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import ckan, instrumentation as instr
+
 
 # ----------------------------
 # Config
@@ -41,31 +65,78 @@ YEARLY_TABLE = "yearly_summary"
 PAGE_SIZE = 1000
 REQUEST_TIMEOUT = 60
 
-# Optional: slow down a tiny bit to be nice to the API
-SLEEP_BETWEEN_STATIONS_SEC = 0.05
+# yearly_summary partitions: one per YEARS_PER_PARTITION years (1 → yearly_summary_y2024, ...)
+YEARS_PER_PARTITION = 1
+
+# CKAN columns to request (= the upserted columns) and how to type them
+FIELDS = [
+    "station_key", "year", "period", "count_type", "classification_type",
+    "traffic_direction_seq", "cardinal_direction_seq", "traffic_count",
+]
+COLUMN_TYPES = {
+    "station_key": str,
+    "year": int,
+    "period": str,
+    "count_type": str,
+    "classification_type": str,
+    "traffic_direction_seq": int,
+    "cardinal_direction_seq": int,
+    "traffic_count": int,
+}
+REQUIRED_FIELDS = tuple(f for f in FIELDS if f != "classification_type")
+
+# "objects" (CKAN default, dict per record), "lists" or "csv" (smallest payload)
+RECORDS_FORMAT = "csv"
+
+# LGAs to load: a list of names as stored in station_reference.lga, or "all"
+LGAS: list[str] | str = ["Blacktown"]
+
+# Concurrency: LGAs in flight at once, and one request budget shared by all of them
+# (also keeps us nice to the API)
+MAX_WORKERS = 4
+MAX_REQUESTS_PER_SEC = 8
+
+# Summary tables (C): refresh touched stations after the load; or rebuild them all
+REFRESH_SUMMARIES = True
+REBUILD_SUMMARIES = False
+SUMMARY_TABLE = "station_year_summary"
+SPLIT_TABLE = "station_direction_split"
+SUMMARY_GEO_VIEW = "station_year_summary_geo"
 
 # Optional: quick smoke test (set to a station key string or None)
 SMOKE_TEST_STATION_KEY = None  # e.g. "57299"
 
 
+# Reads MAX_REQUESTS_PER_SEC per request, so overriding the setting after import works
+RATE_LIMIT = ckan.RateLimiter(lambda: MAX_REQUESTS_PER_SEC)
+
+
 # ----------------------------
 # DB helpers
 # ----------------------------
 def make_engine():
     password = quote_plus(DB_PASSWORD)
-    return create_engine(
+    return instr.instrument_engine(create_engine(
         f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    )
+    ))
 
 
-def fetch_station_keys(engine) -> list[str]:
+def fetch_station_keys(engine, lgas: list[str] | str = "all") -> dict[str, list[str]]:
+    """Station keys grouped by lga (all LGAs, or only those in `lgas`)."""
+    where = "" if lgas == "all" else "WHERE lga = ANY(:lgas)"
     sql = text(f"""
-        SELECT station_key
+        SELECT COALESCE(lga, '(none)') AS lga, station_key
         FROM {SCHEMA}.{STATION_TABLE}
-        ORDER BY station_key;
+        {where}
+        ORDER BY lga, station_key;
     """)
+    params = {} if lgas == "all" else {"lgas": list(lgas)}
+
+    by_lga: dict[str, list[str]] = {}
     with engine.begin() as conn:
-        return [str(x) for x in conn.execute(sql).scalars().all()]
+        for lga, station_key in conn.execute(sql, params):
+            by_lga.setdefault(lga, []).append(str(station_key))
+    return by_lga
 
 
 def table_count(engine, schema: str, table: str) -> int:
@@ -73,12 +144,113 @@ def table_count(engine, schema: str, table: str) -> int:
         return int(conn.execute(text(f"SELECT COUNT(*) FROM {schema}.{table};")).scalar())
 
 
+# ----------------------------
+# Partitioned yearly_summary
+# ----------------------------
+YEARLY_KEY = "station_key, year, period, count_type, traffic_direction_seq, cardinal_direction_seq"
+
+# partitions known to exist (shared by the LGA workers)
+_known_partitions: set[str] = set()
+_partition_lock = threading.Lock()
+
+
+def partition_for(year: int) -> tuple[str, int, int]:
+    """(partition table name, first year, end year exclusive) holding `year`."""
+    start = year - year % YEARS_PER_PARTITION
+    end = start + YEARS_PER_PARTITION
+    suffix = f"y{start}" if YEARS_PER_PARTITION == 1 else f"y{start}_{end - 1}"
+    return f"{YEARLY_TABLE}_{suffix}", start, end
+
+
+def create_partitions(conn, years) -> None:
+    """Create missing partitions for `years` (serialised across processes by an advisory lock)."""
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key));"), {"key": f"{SCHEMA}.{YEARLY_TABLE}"})
+    for name, start, end in sorted({partition_for(y) for y in years}):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA}.{name}
+            PARTITION OF {SCHEMA}.{YEARLY_TABLE}
+            FOR VALUES FROM ({start}) TO ({end});
+        """))
+
+
+def ensure_year_partitions(engine, years) -> None:
+    """Make sure every year in `years` has a partition (cheap when they already exist)."""
+    with _partition_lock:
+        missing = {y for y in years if partition_for(y)[0] not in _known_partitions}
+        if not missing:
+            return
+        with engine.begin() as conn:
+            create_partitions(conn, missing)
+        _known_partitions.update(partition_for(y)[0] for y in missing)
+
+
+def ensure_yearly_table(engine) -> None:
+    """
+    Create yearly_summary as a table partitioned by year (BRIN index on updated_at) if needed.
+    A flat yearly_summary from earlier runs is copied into the partitioned table and
+    dropped, all in one transaction.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};"))
+        relkind = conn.execute(text("""
+            SELECT c.relkind
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = :table;
+        """), {"schema": SCHEMA, "table": YEARLY_TABLE}).scalar()
+
+        if relkind == "p":
+            # Tables from earlier runs: a year BRIN inside one-year partitions prunes nothing
+            conn.execute(text(f"DROP INDEX IF EXISTS {SCHEMA}.{YEARLY_TABLE}_year_brin;"))
+            return
+
+        flat = f"{YEARLY_TABLE}__flat"
+        if relkind == "r":
+            print(f"Migrating flat {SCHEMA}.{YEARLY_TABLE} to a partitioned table ...")
+            conn.execute(text(f"ALTER TABLE {SCHEMA}.{YEARLY_TABLE} RENAME TO {flat};"))
+
+        conn.execute(text(f"""
+            CREATE TABLE {SCHEMA}.{YEARLY_TABLE} (
+              station_key text NOT NULL,
+              year integer NOT NULL,
+              period text NOT NULL,
+              count_type text NOT NULL,
+              classification_type text,
+              traffic_direction_seq integer NOT NULL,
+              cardinal_direction_seq integer NOT NULL,
+              traffic_count integer,
+              updated_at timestamptz NOT NULL DEFAULT now(),
+              CONSTRAINT {YEARLY_TABLE}_uq UNIQUE ({YEARLY_KEY})
+            ) PARTITION BY RANGE (year);
+
+            CREATE INDEX {YEARLY_TABLE}_updated_at_brin ON {SCHEMA}.{YEARLY_TABLE} USING brin (updated_at);
+        """))
+
+        if relkind == "r":
+            years = conn.execute(text(f"SELECT DISTINCT year FROM {SCHEMA}.{flat};")).scalars().all()
+            create_partitions(conn, [int(y) for y in years])
+            conn.execute(text(f"""
+                INSERT INTO {SCHEMA}.{YEARLY_TABLE}
+                  (station_key, year, period, count_type, classification_type,
+                   traffic_direction_seq, cardinal_direction_seq, traffic_count)
+                SELECT station_key, year, period, count_type, classification_type,
+                       traffic_direction_seq, cardinal_direction_seq, traffic_count
+                FROM {SCHEMA}.{flat};
+
+                DROP TABLE {SCHEMA}.{flat};
+            """))
+
+    with _partition_lock:
+        _known_partitions.clear()
+
+
 # ----------------------------
 # CKAN helpers
 # ----------------------------
 def ckan_post(payload: dict) -> dict:
-    """POST to CKAN datastore_search with validation."""
+    """POST to CKAN datastore_search (rate limited) with validation."""
+    RATE_LIMIT.wait()
     resp = requests.post(ENDPOINT, json=payload, timeout=REQUEST_TIMEOUT)
+    instr.record_http(resp)
     resp.raise_for_status()
     data = resp.json()
 
@@ -92,9 +264,19 @@ def ckan_post(payload: dict) -> dict:
     return result
 
 
-def fetch_yearly_for_station(station_key: str, page_size: int = PAGE_SIZE) -> list[dict]:
-    """Fetch ALL yearly-summary rows for one station_key (paged)."""
-    all_records: list[dict] = []
+def parse_page(result: dict, records_format: str | None = None) -> dict[str, list]:
+    """
+    One CKAN result page → typed columns (raises ValueError on bad values).
+    records_format defaults to the current RECORDS_FORMAT, the one the request used.
+    """
+    rows = ckan.page_rows(result, FIELDS, records_format or RECORDS_FORMAT)
+    return ckan.to_columns(rows, FIELDS, COLUMN_TYPES, required=REQUIRED_FIELDS)
+
+
+def fetch_yearly_for_station(station_key: str, page_size: int = PAGE_SIZE) -> dict[str, list]:
+    """Fetch ALL yearly-summary rows for one station_key (paged). Returns typed columns."""
+    columns: dict[str, list] = {f: [] for f in FIELDS}
+    fetched = 0
     offset = 0
     total = None
 
@@ -104,6 +286,7 @@ def fetch_yearly_for_station(station_key: str, page_size: int = PAGE_SIZE) -> li
             "limit": page_size,
             "offset": offset,
             "filters": {"station_key": station_key},
+            **ckan.search_params(FIELDS, RECORDS_FORMAT),
         }
 
         result = ckan_post(payload)
@@ -111,67 +294,205 @@ def fetch_yearly_for_station(station_key: str, page_size: int = PAGE_SIZE) -> li
         if total is None:
             total = int(result["total"])
 
-        records = result["records"]
-        if not records:
+        page = parse_page(result)
+        n = len(page["station_key"])
+        if not n:
             break
 
-        all_records.extend(records)
+        ckan.extend_columns(columns, page)
+        fetched += n
 
-        if len(all_records) >= total:
+        if fetched >= total:
             break
 
         offset += page_size
 
-    return all_records
+    return columns
 
 
 # ----------------------------
 # Upsert
 # ----------------------------
-UPSERT_SQL = text(f"""
-INSERT INTO {SCHEMA}.{YEARLY_TABLE}
-  (station_key, year, period, count_type, classification_type,
-   traffic_direction_seq, cardinal_direction_seq, traffic_count)
-VALUES
-  (:station_key, :year, :period, :count_type, :classification_type,
-   :traffic_direction_seq, :cardinal_direction_seq, :traffic_count)
-ON CONFLICT (station_key, year, period, count_type, traffic_direction_seq, cardinal_direction_seq)
-DO UPDATE SET
-  classification_type = EXCLUDED.classification_type,
-  traffic_count = EXCLUDED.traffic_count;
-""")
-
-
-def normalize_row(rec: dict) -> dict:
+def upsert_sql(partition: str):
+    """Upsert into one partition; unchanged rows are left alone (updated_at stays put)."""
+    return text(f"""
+    INSERT INTO {SCHEMA}.{partition} AS y
+      (station_key, year, period, count_type, classification_type,
+       traffic_direction_seq, cardinal_direction_seq, traffic_count)
+    VALUES
+      (:station_key, :year, :period, :count_type, :classification_type,
+       :traffic_direction_seq, :cardinal_direction_seq, :traffic_count)
+    ON CONFLICT ({YEARLY_KEY})
+    DO UPDATE SET
+      classification_type = EXCLUDED.classification_type,
+      traffic_count = EXCLUDED.traffic_count,
+      updated_at = now()
+    WHERE (y.classification_type, y.traffic_count)
+          IS DISTINCT FROM (EXCLUDED.classification_type, EXCLUDED.traffic_count);
+    """)
+
+
+def upsert_yearly_rows(engine, columns: dict[str, list]) -> int:
     """
-    Convert CKAN record types safely and return SQL params.
-    Raises a helpful error if required fields are missing.
+    Upsert typed yearly columns (from parse_page): one executemany per partition, in one
+    transaction. Returns row count.
     """
-    try:
-        return {
-            "station_key": str(rec["station_key"]),
-            "year": int(rec["year"]),
-            "period": str(rec["period"]),
-            "count_type": str(rec["count_type"]),
-            "classification_type": rec.get("classification_type"),
-            "traffic_direction_seq": int(rec["traffic_direction_seq"]),
-            "cardinal_direction_seq": int(rec["cardinal_direction_seq"]),
-            "traffic_count": int(rec["traffic_count"]),
-        }
-    except Exception as e:
-        raise ValueError(f"Bad yearly summary record. Keys={list(rec.keys())}") from e
+    params = ckan.column_params(columns)
+    if not params:
+        return 0
 
+    ensure_year_partitions(engine, set(columns["year"]))
 
-def upsert_yearly_rows(engine, rows: list[dict]) -> int:
-    """Upsert a list of yearly rows. Returns number of executed rows."""
-    if not rows:
-        return 0
+    by_partition: dict[str, list[dict]] = {}
+    for row in params:
+        by_partition.setdefault(partition_for(row["year"])[0], []).append(row)
 
     with engine.begin() as conn:
-        for rec in rows:
-            conn.execute(UPSERT_SQL, normalize_row(rec))
+        for partition, rows in by_partition.items():
+            conn.execute(upsert_sql(partition), rows)
+
+    return len(params)
+
+
+def load_lga(engine, lga: str, station_keys: list[str]) -> tuple[int, int]:
+    """Fetch + upsert every station of one LGA (runs on a worker thread). Returns (fetched, upserted)."""
+    fetched = upserted = 0
+    for i, station_key in enumerate(station_keys, start=1):
+        with instr.stage("fetch_yearly", "fetch", lga=lga, station_key=station_key):
+            columns = fetch_yearly_for_station(station_key, PAGE_SIZE)
+        with instr.stage("upsert_yearly", "load", lga=lga, station_key=station_key):
+            n_up = upsert_yearly_rows(engine, columns)
+
+        n_fetched = len(columns["station_key"])
+        fetched += n_fetched
+        upserted += n_up
+
+        print(f"{lga} [{i}/{len(station_keys)}] station_key={station_key} | fetched={n_fetched} | upserted={n_up}")
 
-    return len(rows)
+    return fetched, upserted
+
+
+# ----------------------------
+# Summary tables
+# ----------------------------
+def db_now(engine):
+    """Database clock (updated_at is set from it, so compare against it, not Python's)."""
+    with engine.begin() as conn:
+        return conn.execute(text("SELECT now();")).scalar_one()
+
+
+def ensure_summary_tables(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA}.{SUMMARY_TABLE} (
+              station_key text NOT NULL,
+              year integer NOT NULL,
+              period text NOT NULL,
+              count_type text NOT NULL,
+              classification_type text,
+              total_count bigint,
+              n_directions integer,
+              prev_year_total bigint,
+              yoy_growth_pct numeric  -- unbounded: a tiny previous year can give huge growth
+            );
+            -- tables created with numeric(9, 2) overflowed on such rows; widen them once
+            DO $$
+            BEGIN
+              IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = '{SCHEMA}' AND table_name = '{SUMMARY_TABLE}'
+                  AND column_name = 'yoy_growth_pct' AND numeric_precision IS NOT NULL
+              ) THEN
+                ALTER TABLE {SCHEMA}.{SUMMARY_TABLE} ALTER COLUMN yoy_growth_pct TYPE numeric;
+              END IF;
+            END $$;
+            CREATE INDEX IF NOT EXISTS {SUMMARY_TABLE}_station_year_idx
+              ON {SCHEMA}.{SUMMARY_TABLE} (station_key, year);
+
+            CREATE TABLE IF NOT EXISTS {SCHEMA}.{SPLIT_TABLE} (
+              station_key text NOT NULL,
+              year integer NOT NULL,
+              period text NOT NULL,
+              count_type text NOT NULL,
+              classification_type text,
+              traffic_direction_seq integer NOT NULL,
+              cardinal_direction_seq integer NOT NULL,
+              traffic_count integer,
+              share_pct numeric(5, 2)
+            );
+            CREATE INDEX IF NOT EXISTS {SPLIT_TABLE}_station_year_idx
+              ON {SCHEMA}.{SPLIT_TABLE} (station_key, year);
+
+            CREATE OR REPLACE VIEW {SCHEMA}.{SUMMARY_GEO_VIEW} AS
+            SELECT s.*, r.lga, r.suburb, r.road_name, r.geom
+            FROM {SCHEMA}.{SUMMARY_TABLE} s
+            JOIN {SCHEMA}.{STATION_TABLE} r USING (station_key);
+        """))
+
+
+def refresh_summaries(engine, since=None) -> int:
+    """
+    Re-derive the summary rows of every station with yearly_summary rows updated at or
+    after `since` (None → all stations). Returns the number of stations refreshed.
+    """
+    ensure_summary_tables(engine)
+
+    touched_where = "" if since is None else "WHERE updated_at >= :since"
+    params = {} if since is None else {"since": since}
+
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TEMP TABLE touched ON COMMIT DROP AS
+            SELECT DISTINCT station_key FROM {SCHEMA}.{YEARLY_TABLE} {touched_where};
+        """), params)
+        n = conn.execute(text("SELECT COUNT(*) FROM touched;")).scalar_one()
+        if not n:
+            return 0
+
+        conn.execute(text(f"""
+            DELETE FROM {SCHEMA}.{SUMMARY_TABLE} s USING touched t WHERE s.station_key = t.station_key;
+            DELETE FROM {SCHEMA}.{SPLIT_TABLE} s USING touched t WHERE s.station_key = t.station_key;
+
+            -- whole stations are re-derived, so LAG() sees every year of the station
+            INSERT INTO {SCHEMA}.{SUMMARY_TABLE}
+            SELECT
+              station_key, year, period, count_type, classification_type,
+              total_count, n_directions,
+              CASE WHEN prev_year = year - 1 THEN prev_total END,
+              CASE WHEN prev_year = year - 1
+                   THEN round(100.0 * (total_count - prev_total) / NULLIF(prev_total, 0), 2) END
+            FROM (
+              SELECT
+                g.*,
+                LAG(year) OVER w AS prev_year,
+                LAG(total_count) OVER w AS prev_total
+              FROM (
+                SELECT
+                  y.station_key, y.year, y.period, y.count_type, y.classification_type,
+                  SUM(y.traffic_count) AS total_count,
+                  COUNT(*)::int AS n_directions
+                FROM {SCHEMA}.{YEARLY_TABLE} y
+                JOIN touched t USING (station_key)
+                GROUP BY 1, 2, 3, 4, 5
+              ) g
+              WINDOW w AS (PARTITION BY station_key, period, count_type, classification_type ORDER BY year)
+            ) x;
+
+            INSERT INTO {SCHEMA}.{SPLIT_TABLE}
+            SELECT
+              y.station_key, y.year, y.period, y.count_type, y.classification_type,
+              y.traffic_direction_seq, y.cardinal_direction_seq, y.traffic_count,
+              round(100.0 * y.traffic_count / NULLIF(SUM(y.traffic_count) OVER (
+                PARTITION BY y.station_key, y.year, y.period, y.count_type, y.classification_type
+              ), 0), 2)
+            FROM {SCHEMA}.{YEARLY_TABLE} y
+            JOIN touched t USING (station_key);
+        """))
+
+        conn.execute(text(f"ANALYZE {SCHEMA}.{SUMMARY_TABLE};"))
+        conn.execute(text(f"ANALYZE {SCHEMA}.{SPLIT_TABLE};"))
+
+    return int(n)
 
 
 # ----------------------------
@@ -181,14 +502,22 @@ def main():
     engine = make_engine()
     print("DB engine created")
 
-    # station list
+    with instr.stage("ensure_yearly_table", "load"):
+        ensure_yearly_table(engine)
+    run_started = db_now(engine)
+
+    # station list (grouped by LGA)
     if SMOKE_TEST_STATION_KEY:
-        station_keys = [SMOKE_TEST_STATION_KEY]
+        stations_by_lga = {"(smoke test)": [SMOKE_TEST_STATION_KEY]}
         print(f"SMOKE TEST mode: only station_key={SMOKE_TEST_STATION_KEY}")
     else:
-        station_keys = fetch_station_keys(engine)
-        print(f"Stations found: {len(station_keys)}")
-        print("First 3:", station_keys[:3])
+        stations_by_lga = fetch_station_keys(engine, LGAS)
+        n_stations = sum(len(v) for v in stations_by_lga.values())
+        print(f"Stations found: {n_stations} in {len(stations_by_lga)} LGA(s)")
+        if LGAS != "all":
+            missing = sorted(set(LGAS) - set(stations_by_lga))
+            if missing:
+                print("No stations for (run step 1 for these first):", missing)
 
     # optional pre-count
     try:
@@ -199,18 +528,19 @@ def main():
 
     total_fetched = 0
     total_upserted = 0
-
-    for i, station_key in enumerate(station_keys, start=1):
-        rows = fetch_yearly_for_station(station_key, PAGE_SIZE)
-        n_up = upsert_yearly_rows(engine, rows)
-
-        total_fetched += len(rows)
-        total_upserted += n_up
-
-        print(f"[{i}/{len(station_keys)}] station_key={station_key} | fetched={len(rows)} | upserted={n_up}")
-
-        if SLEEP_BETWEEN_STATIONS_SEC:
-            time.sleep(SLEEP_BETWEEN_STATIONS_SEC)
+    failed: dict[str, str] = {}
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {lga: pool.submit(load_lga, engine, lga, keys) for lga, keys in stations_by_lga.items()}
+        for lga, fut in futures.items():
+            try:
+                n_fetched, n_up = fut.result()
+            except Exception as e:
+                failed[lga] = repr(e)
+                print(f"{lga}: FAILED ({e!r})")
+                continue
+            total_fetched += n_fetched
+            total_upserted += n_up
 
     # final count
     try:
@@ -225,6 +555,16 @@ def main():
     if after is not None:
         print("db_total_rows:", after)
 
+    # C) summaries for touched stations (also after partial failures: what loaded is current)
+    if REFRESH_SUMMARIES:
+        with instr.stage("refresh_summaries", "derive"):
+            n_refreshed = refresh_summaries(engine, None if REBUILD_SUMMARIES else run_started)
+        print("summary_stations_refreshed:", n_refreshed)
+
+    if failed:
+        raise RuntimeError(f"{len(failed)}/{len(stations_by_lga)} LGA(s) failed (others were loaded): {sorted(failed)}")
+
 
 if __name__ == "__main__":
-    main()
+    with instr.run("traffic_step_2_yearly_summary"):
+        main()
@@ -0,0 +1,72 @@
+"""
+parse_page() must parse pages in the RECORDS_FORMAT that is set when it runs (the one the
+request asked for), not the value the module started with.
+
+    python -m pytest bcc-traffic-pipeline/tests -q
+"""
+
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("sqlalchemy")
+
+SCRIPTS = Path(__file__).resolve().parents[1] / "scripts"
+
+STATION = {
+    "station_key": "100001", "station_id": "S000001", "lga": "Blacktown", "suburb": "DOONSIDE",
+    "road_name": "Synthetic Rd 1", "wgs84_latitude": "-33.760000", "wgs84_longitude": "150.870000",
+}
+YEARLY = {
+    "station_key": "100001", "year": "2024", "period": "ALL DAYS", "count_type": "AADT",
+    "classification_type": "ALL VEHICLES", "traffic_direction_seq": "0",
+    "cardinal_direction_seq": "1", "traffic_count": "12345",
+}
+
+
+def load_step(filename: str) -> types.ModuleType:
+    """Import a step script with a stand-in db_config_local (no database is used)."""
+    db_config = types.ModuleType("db_config_local")
+    db_config.__dict__.update(DB_USER="u", DB_PASSWORD="p", DB_HOST="localhost", DB_PORT="5432", DB_NAME="n")
+    sys.modules["db_config_local"] = db_config
+
+    path = SCRIPTS / filename
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def page(record: dict, fields: list[str], records_format: str) -> dict:
+    """A datastore_search result for one record, shaped as CKAN returns it."""
+    values = [record[f] for f in fields]
+    if records_format == "objects":
+        records = [dict(record)]
+    elif records_format == "lists":
+        records = [values]
+    else:
+        records = ",".join(values) + "\n"
+    return {"fields": [{"id": f} for f in fields], "records": records, "total": 1}
+
+
+@pytest.mark.parametrize("records_format", ["objects", "lists", "csv"])
+@pytest.mark.parametrize(
+    "filename, record, typed",
+    [
+        ("step_1_station_reference_V1.py", STATION, {"wgs84_latitude": -33.76}),
+        ("step_2_yearly_summary_V1.py", YEARLY, {"year": 2024, "traffic_count": 12345}),
+    ],
+)
+def test_parse_page_follows_records_format_override(filename, record, typed, records_format):
+    step = load_step(filename)
+    step.RECORDS_FORMAT = records_format
+
+    columns = step.parse_page(page(record, step.FIELDS, records_format))
+
+    assert columns["station_key"] == ["100001"]
+    for name, value in typed.items():
+        assert columns[name] == [value]
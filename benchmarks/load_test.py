@@ -0,0 +1,272 @@
+"""
+Offline load test of the fetchers against local ArcGIS + CKAN stand-ins
+
+What this script does
+---------------------
+A) Start mock_servers.MockServer on 127.0.0.1 with synthetic data (synthetic_data.py):
+   - ArcGIS FeatureServer layer 0 = bus stops, layer 1 = paths (EPSG:4326 GeoJSON)
+   - CKAN station reference (stations round-robin over --lgas LGAs) and yearly summary
+     (144 rows per station), under the resource ids of the traffic step scripts
+
+B) Point the pipeline scripts at it and run each target at every --concurrency level N:
+   - fetch_all       : busstops_paths_coverage fetch_all() on the paths layer, split into
+                       N fid ranges (where = "fid >= a AND fid < b"), N calls at once
+   - ckan_fetch_all  : step 1 ckan_fetch_all(), one call per LGA, N LGAs at a time
+   - yearly          : step 2 fetch_yearly_for_station(), N stations at a time
+
+C) Print features/s, requests, failed calls and completeness per (target, N); optionally
+   append one JSON line per run to --out.
+
+Usage
+-----
+    python benchmarks/load_test.py --concurrency 1 2 4 8
+    python benchmarks/load_test.py --target yearly --latency-ms 80 --jitter-ms 40 --concurrency 1 4 16
+    python benchmarks/load_test.py --target fetch_all --arcgis-max-records 500 --page-size 1000
+    python benchmarks/load_test.py --error-rate 0.02 --error-status 429 --rps 8
+    python benchmarks/load_test.py --serve        # only run the mock; prints the URLs
+
+Notes
+-----
+- Both steps' RATE_LIMIT is replaced with one shared RateLimiter(--rps) (default: none),
+  so the numbers show what the fetchers and the server path reach; --rps 8 = production.
+- "complete" compares what the fetcher returned with what the mock holds for that call.
+  A page cap below the page size shows up here: fetch_all() stops on the first short page.
+- A fetcher that raises (injected error, bad page) loses that call; it is counted under
+  `failed` and its features are missing from the total. When every call of a level fails
+  the run stops with exit code 1 (a broken setup, not a throughput figure).
+- No database is touched: the scripts' db_config_local is stubbed as in run_benchmarks.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path[:0] = [str(BENCH_DIR), str(BENCH_DIR.parent)]  # mock_servers / run_benchmarks, gis_common
+from gis_common import ckan
+from mock_servers import ArcGISLayer, CkanResource, MockConfig, MockServer
+from run_benchmarks import load_script
+
+
+# ----------------------------
+# Config
+# ----------------------------
+TARGETS = ["fetch_all", "ckan_fetch_all", "yearly"]
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+
+LGA_NAMES = [
+    "Blacktown", "The Hills Shire", "Parramatta", "Penrith", "Cumberland", "Hawkesbury",
+    "Liverpool", "Fairfield", "Campbelltown", "Camden", "Hornsby", "Ryde",
+    "Canterbury-Bankstown", "Inner West", "Sutherland Shire", "Northern Beaches",
+]
+YEARLY_ROWS_PER_STATION = 144  # synthetic_data.make_yearly_records
+
+
+# ----------------------------
+# Synthetic data
+# ----------------------------
+def geojson_features(gdf) -> list[dict]:
+    """GeoDataFrame → GeoJSON features in EPSG:4326 (plain Python values)."""
+    return json.loads(gdf.to_crs(4326).to_json(drop_id=True))["features"]
+
+
+def build_datasets(args, step1, step2) -> tuple[dict, dict, dict]:
+    """(ArcGIS layers, CKAN resources, expected counts) for the mock."""
+    import synthetic_data as sd
+
+    paths = sd.make_paths(args.features, args.features, args.seed)
+    stops = sd.make_busstops(max(1, args.features // 10), args.features, args.seed)
+    layers = {
+        0: ArcGISLayer("Bus stops", geojson_features(stops)),
+        1: ArcGISLayer("Paths", geojson_features(paths)),
+    }
+
+    lgas = tuple(LGA_NAMES[:args.lgas])
+    stations = sd.make_station_records(args.stations, args.seed, lgas=lgas)
+    yearly = sd.make_yearly_records(args.stations * YEARLY_ROWS_PER_STATION, args.seed)
+    resources = {
+        step1.RESOURCE_ID: CkanResource(list(stations[0]), stations),
+        step2.YEARLY_RESOURCE_ID: CkanResource(list(yearly[0]), yearly),
+    }
+
+    expected = {
+        "paths": len(paths),
+        "lgas": {lga: sum(s["lga"] == lga for s in stations) for lga in lgas},
+        "station_keys": [s["station_key"] for s in stations],
+    }
+    return layers, resources, expected
+
+
+# ----------------------------
+# Targets (each returns a list of (fn, expected features) calls)
+# ----------------------------
+def fetch_all_calls(cov, srv: MockServer, expected: dict, n: int, page_size: int) -> list:
+    total = expected["paths"]
+    bounds = [1 + total * i // n for i in range(n + 1)]
+    return [
+        (
+            lambda lo=lo, hi=hi: len(cov.fetch_all(srv.arcgis_url(1), page_size, f"fid >= {lo} AND fid < {hi}", "fid")),
+            hi - lo,
+        )
+        for lo, hi in zip(bounds, bounds[1:])
+    ]
+
+
+def ckan_fetch_all_calls(step1, expected: dict, page_size: int) -> list:
+    return [
+        (lambda lga=lga: len(step1.ckan_fetch_all(step1.RESOURCE_ID, page_size, lga)["station_key"]), count)
+        for lga, count in expected["lgas"].items()
+    ]
+
+
+def yearly_calls(step2, expected: dict, page_size: int) -> list:
+    return [
+        (lambda key=key: len(step2.fetch_yearly_for_station(key, page_size)["station_key"]), YEARLY_ROWS_PER_STATION)
+        for key in expected["station_keys"]
+    ]
+
+
+def run_level(target: str, calls: list, concurrency: int, srv: MockServer) -> dict:
+    """Run every call on `concurrency` threads; return the measurements."""
+    def attempt(call):
+        fn, want = call
+        try:
+            return fn(), want, None
+        except Exception as e:  # one failed call must not stop the load test
+            return 0, want, repr(e)
+
+    srv.stats.reset()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(attempt, calls))
+    wall_s = time.perf_counter() - t0
+
+    features = sum(got for got, _, _ in outcomes)
+    expected = sum(want for _, want, _ in outcomes)
+    errors = [err for _, _, err in outcomes if err]
+    short = sum(1 for got, want, err in outcomes if not err and got < want)
+    server = srv.stats.snapshot()
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "calls": len(calls),
+        "failed": len(errors),
+        "short_calls": short,
+        "features": features,
+        "expected": expected,
+        "complete": features == expected,
+        "wall_s": round(wall_s, 4),
+        "features_per_s": round(features / wall_s, 1) if wall_s else None,
+        "requests": server["requests"],
+        "requests_per_s": round(server["requests"] / wall_s, 1) if wall_s else None,
+        "injected_errors": server["injected"],
+        "mb_sent": round(server["bytes"] / 1e6, 2),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the fetchers against local ArcGIS / CKAN stand-ins.")
+    parser.add_argument("--target", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--features", type=int, default=20_000, help="paths on layer 1 (bus stops = features / 10)")
+    parser.add_argument("--stations", type=int, default=400, help=f"stations ({YEARLY_ROWS_PER_STATION} yearly rows each)")
+    parser.add_argument("--lgas", type=int, default=8, choices=range(1, len(LGA_NAMES) + 1), metavar="N",
+                        help="LGAs the stations are spread over (= ckan_fetch_all calls)")
+    parser.add_argument("--page-size", type=int, help="fetchers' page size (default: the scripts' PAGE_SIZE)")
+    parser.add_argument("--records-format", choices=ckan.RECORDS_FORMATS, help="override the steps' RECORDS_FORMAT")
+    parser.add_argument("--rps", type=float, help="shared CKAN request budget per second (default: unlimited)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--arcgis-max-records", type=int, default=2000, help="ArcGIS maxRecordCount (page cap)")
+    parser.add_argument("--ckan-rows-max", type=int, default=32000, help="CKAN rows_max (limit cap)")
+    parser.add_argument("--port", type=int, default=0, help="mock port (default: any free port)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="append one JSON line per run to this file")
+    parser.add_argument("--serve", action="store_true", help="only run the mock until Ctrl+C")
+    args = parser.parse_args()
+
+    cov = load_script("bcc-busstops-paths-coverage", "busstops_paths_coverage_V1.py")
+    step1 = load_script("bcc-traffic-pipeline", "step_1_station_reference_V1.py")
+    step2 = load_script("bcc-traffic-pipeline", "step_2_yearly_summary_V1.py")
+
+    print("Generating synthetic data ...")
+    layers, resources, expected = build_datasets(args, step1, step2)
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        arcgis_max_records=args.arcgis_max_records,
+        ckan_rows_max=args.ckan_rows_max,
+        seed=args.seed,
+    )
+
+    with MockServer(layers, resources, config, port=args.port) as srv:
+        if args.serve:
+            print(f"BUSSTOPS_LAYER = {srv.arcgis_url(0)!r}")
+            print(f"PATHS_LAYER    = {srv.arcgis_url(1)!r}")
+            print(f"ENDPOINT       = {srv.ckan_endpoint!r}")
+            print(f"CKAN resources : {', '.join(resources)}")
+            print("Serving; Ctrl+C to stop")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return 0
+
+        limiter = ckan.RateLimiter(args.rps)  # one budget for both steps, as in run_pipeline_V1
+        for step in (step1, step2):
+            step.ENDPOINT = srv.ckan_endpoint
+            step.RATE_LIMIT = limiter
+            if args.records_format:
+                step.RECORDS_FORMAT = args.records_format
+
+        for target in args.target:
+            for n in args.concurrency:
+                if target == "fetch_all":
+                    calls = fetch_all_calls(cov, srv, expected, n, args.page_size or cov.PAGE_SIZE)
+                elif target == "ckan_fetch_all":
+                    calls = ckan_fetch_all_calls(step1, expected, args.page_size or step1.PAGE_SIZE)
+                else:
+                    calls = yearly_calls(step2, expected, args.page_size or step2.PAGE_SIZE)
+
+                result = run_level(target, calls, n, srv)
+                if result["calls"] and result["failed"] == result["calls"]:
+                    # not a throughput figure: the setup is broken (or --error-rate is 1)
+                    print(f"{target} N={n}: all {result['calls']} calls failed, aborting")
+                    print(f"  first error: {result['first_error']}")
+                    return 1
+                print(
+                    f"{target:<15} N={n:<3} features={result['features']:<8} wall={result['wall_s']:.2f}s "
+                    f"{result['features_per_s']} f/s requests={result['requests']} "
+                    f"failed={result['failed']}/{result['calls']}"
+                    + ("" if result["complete"] else f"  INCOMPLETE ({result['expected']} expected)")
+                )
+                if result["first_error"]:
+                    print(f"  first error: {result['first_error']}")
+
+                if args.out:
+                    result.update(
+                        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                        rps=args.rps, arcgis_max_records=args.arcgis_max_records,
+                        ckan_rows_max=args.ckan_rows_max,
+                    )
+                    with open(args.out, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(result) + "\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,487 @@
+"""
+Local stand-ins for the ArcGIS FeatureServer and CKAN datastore APIs (load tests, no network)
+
+What this module does
+---------------------
+`MockServer(layers, resources, config)` serves, on a background thread:
+
+    GET  /arcgis/rest/services/Mock/FeatureServer/<id>?f=json     layer info (maxRecordCount,
+                                                                   editingInfo.lastEditDate)
+    GET  /arcgis/rest/services/Mock/FeatureServer/<id>/query       where, objectIds, outFields,
+         (or POST, form-encoded)                                   returnGeometry, resultOffset,
+                                                                   resultRecordCount,
+                                                                   returnCountOnly, returnIdsOnly,
+                                                                   f = geojson | json
+    GET|POST /api/action/datastore_search                          resource_id, filters, fields,
+                                                                   distinct, sort, limit, offset,
+                                                                   records_format, include_total
+    GET  /api/action/resource_show?id=...                          last_modified
+
+    with MockServer(layers, resources, MockConfig(latency_ms=50)) as srv:
+        fetch_all(srv.arcgis_url(0), ...)
+        requests.post(srv.ckan_endpoint, json={...})
+
+Faults (MockConfig)
+-------------------
+- latency_ms ± jitter_ms per request (handled on threads, so concurrent calls overlap)
+- error_rate: that share of requests fails with HTTP error_status (429 adds Retry-After)
+- arcgis_max_records: page cap; a larger resultRecordCount returns this many features and
+  sets exceededTransferLimit, like a real layer's maxRecordCount
+- ckan_rows_max: CKAN's ckan.datastore.search.rows_max; larger limits are silently capped
+
+Notes
+-----
+- Standard library only; the data comes from the caller (see load_test.py).
+- ArcGIS `where` understands "1=1" and <field> <op> <number | 'text'> clauses joined by AND
+  (op: = <> > >= < <=); anything else gets ArcGIS's HTTP 200 {"error": ...} reply.
+- Geometries are served as given (EPSG:4326); other outSR values get an error reply.
+- Features are paged in list order; give them in object id order for stable paging.
+- Listens on 127.0.0.1 with a free port by default.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ARCGIS_PREFIX = "/arcgis/rest/services/Mock/FeatureServer/"
+CKAN_PREFIX = "/api/action/"
+
+
+# ----------------------------
+# Data + config
+# ----------------------------
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    arcgis_max_records: int = 2000
+    ckan_rows_max: int = 32000
+    seed: int = 0
+
+
+@dataclass
+class ArcGISLayer:
+    """GeoJSON features (object id in the properties) behind one FeatureServer layer."""
+    name: str
+    features: list[dict]
+    object_id_field: str = "fid"
+    last_edit_ms: int = field(default_factory=lambda: int(time.time() * 1000))
+
+
+@dataclass
+class CkanResource:
+    """Records (dicts, values as CKAN returns them) behind one datastore resource."""
+    fields: list[str]
+    records: list[dict]
+    last_modified: str = "2026-01-01T00:00:00"
+
+
+class RequestStats:
+    """Per-route request, injected-error, byte and record counters (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.routes: dict[str, dict] = {}
+
+    def record(self, route: str, status: int, n_bytes: int, records: int, injected: bool) -> None:
+        with self._lock:
+            r = self.routes.setdefault(route, {"requests": 0, "errors": 0, "injected": 0, "bytes": 0, "records": 0})
+            r["requests"] += 1
+            r["errors"] += status >= 400
+            r["injected"] += injected
+            r["bytes"] += n_bytes
+            r["records"] += records
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = {k: dict(v) for k, v in self.routes.items()}
+        totals = {key: sum(r[key] for r in routes.values()) for key in ("requests", "errors", "injected", "bytes", "records")}
+        return {"routes": routes, **totals}
+
+
+# ----------------------------
+# ArcGIS query contract
+# ----------------------------
+_CLAUSE = re.compile(r"^\s*(\w+)\s*(=|<>|>=|<=|>|<)\s*('(?:[^']|'')*'|-?\d+(?:\.\d+)?)\s*$")
+_OPS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+def parse_where(where: str) -> list[tuple]:
+    """[(field, op, value), ...] for the supported where subset ([] = every feature)."""
+    clauses = []
+    for part in re.split(r"\s+AND\s+", (where or "1=1").strip(), flags=re.IGNORECASE):
+        if part.replace(" ", "") == "1=1":
+            continue
+        m = _CLAUSE.match(part)
+        if not m:
+            raise ValueError(f"Unsupported where clause: {part!r}")
+        name, op, raw = m.groups()
+        value = raw[1:-1].replace("''", "'") if raw.startswith("'") else float(raw)
+        clauses.append((name, op, value))
+    return clauses
+
+
+def _matches(props: dict, clauses: list[tuple]) -> bool:
+    for name, op, value in clauses:
+        v = props.get(name)
+        if v is None:
+            return False
+        try:
+            v = float(v) if isinstance(value, float) else str(v)
+        except (TypeError, ValueError):
+            return False
+        if not _OPS[op](v, value):
+            return False
+    return True
+
+
+def esri_geometry(geom: dict | None) -> dict | None:
+    """GeoJSON geometry → Esri JSON geometry (points, lines, polygons)."""
+    if geom is None:
+        return None
+    kind, coords = geom["type"], geom["coordinates"]
+    if kind == "Point":
+        return {"x": coords[0], "y": coords[1]}
+    if kind == "MultiPoint":
+        return {"points": coords}
+    if kind == "LineString":
+        return {"paths": [coords]}
+    if kind == "MultiLineString":
+        return {"paths": coords}
+    if kind == "Polygon":
+        return {"rings": coords}
+    if kind == "MultiPolygon":
+        return {"rings": [ring for poly in coords for ring in poly]}
+    raise ValueError(f"Unsupported geometry type {kind}")
+
+
+def arcgis_query(layer: ArcGISLayer, params: dict, max_records: int) -> tuple[dict, int]:
+    """One /query reply (ArcGIS semantics) and the number of features in it."""
+    try:
+        if str(params.get("outSR", "4326")) not in ("4326", ""):
+            raise ValueError("The mock serves EPSG:4326 only (outSR)")
+        clauses = parse_where(params.get("where", "1=1"))
+        offset = int(params.get("resultOffset") or 0)
+        count = int(params.get("resultRecordCount") or max_records)
+    except ValueError as e:
+        return {"error": {"code": 400, "message": "Unable to complete operation.", "details": [str(e)]}}, 0
+
+    oid = layer.object_id_field
+    selected = [f for f in layer.features if _matches(f["properties"], clauses)]
+    if params.get("objectIds"):
+        wanted = {s.strip() for s in params["objectIds"].split(",")}
+        selected = [f for f in selected if str(f["properties"].get(oid)) in wanted]
+
+    if str(params.get("returnCountOnly", "")).lower() == "true":
+        return {"count": len(selected)}, 0
+    if str(params.get("returnIdsOnly", "")).lower() == "true":
+        return {"objectIdFieldName": oid, "objectIds": [f["properties"][oid] for f in selected]}, 0
+
+    page = selected[offset:offset + min(count, max_records)]
+    exceeded = offset + len(page) < len(selected)
+
+    out_fields = params.get("outFields", "*")
+    keep = None if out_fields.strip() == "*" else [s.strip() for s in out_fields.split(",")]
+    with_geometry = str(params.get("returnGeometry", "true")).lower() != "false"
+
+    def props(f):
+        p = f["properties"]
+        return dict(p) if keep is None else {k: p.get(k) for k in keep}
+
+    if params.get("f", "json") == "geojson":
+        body = {
+            "type": "FeatureCollection",
+            "features": [
+                {"type": "Feature", "id": f["properties"].get(oid), "properties": props(f),
+                 "geometry": f["geometry"] if with_geometry else None}
+                for f in page
+            ],
+        }
+        if exceeded:
+            body["properties"] = {"exceededTransferLimit": True}
+    else:
+        body = {
+            "objectIdFieldName": oid,
+            "spatialReference": {"wkid": 4326},
+            "features": [
+                {"attributes": props(f), **({"geometry": esri_geometry(f["geometry"])} if with_geometry else {})}
+                for f in page
+            ],
+            "exceededTransferLimit": exceeded,
+        }
+    return body, len(page)
+
+
+# ----------------------------
+# CKAN datastore_search contract
+# ----------------------------
+class CkanError(Exception):
+    def __init__(self, status: int, error: dict):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def _as_list(value) -> list[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [s.strip() for s in value.split(",") if s.strip()]
+    return list(value)
+
+
+def _as_bool(value) -> bool:
+    return value is True or str(value).lower() in ("true", "1", "yes")
+
+
+def datastore_search(resources: dict[str, CkanResource], params: dict, rows_max: int) -> tuple[dict, int]:
+    """One datastore_search `result` (CKAN semantics) and the number of records in it."""
+    resource_id = params.get("resource_id")
+    if not resource_id:
+        raise CkanError(409, {"resource_id": ["Missing value"], "__type": "Validation Error"})
+    resource = resources.get(resource_id)
+    if resource is None:
+        raise CkanError(404, {"message": f'Not found: Resource "{resource_id}" was not found.', "__type": "Not Found Error"})
+
+    filters = params.get("filters") or {}
+    if isinstance(filters, str):
+        filters = json.loads(filters)
+    fields = _as_list(params.get("fields")) or ["_id"] + resource.fields
+    unknown = [f for f in list(filters) + fields if f != "_id" and f not in resource.fields]
+    if unknown:
+        raise CkanError(409, {"fields": [f'field "{f}" not in resource' for f in unknown], "__type": "Validation Error"})
+
+    try:
+        limit = min(int(params.get("limit", 100)), rows_max)
+        offset = int(params.get("offset", 0))
+    except (TypeError, ValueError):
+        raise CkanError(409, {"limit": ["Invalid integer"], "__type": "Validation Error"}) from None
+    records_format = params.get("records_format", "objects")
+    if records_format not in ("objects", "lists", "csv"):
+        raise CkanError(409, {"records_format": ["Invalid value"], "__type": "Validation Error"})
+
+    wanted = {k: {str(x) for x in (v if isinstance(v, list) else [v])} for k, v in filters.items()}
+    rows = [
+        [i + 1 if f == "_id" else rec.get(f) for f in fields]
+        for i, rec in enumerate(resource.records)
+        if all(str(rec.get(k)) in values for k, values in wanted.items())
+    ]
+
+    if _as_bool(params.get("distinct")):
+        seen = set()
+        rows = [r for r in rows if not (tuple(r) in seen or seen.add(tuple(r)))]
+
+    for key in reversed(_as_list(params.get("sort"))):
+        name, _, direction = key.partition(" ")
+        if name in fields:
+            pos = fields.index(name)
+            rows.sort(key=lambda r: (r[pos] is None, r[pos]), reverse=direction.strip().lower() == "desc")
+
+    page = rows[offset:offset + limit]
+    if records_format == "objects":
+        records = [dict(zip(fields, r)) for r in page]
+    elif records_format == "lists":
+        records = page
+    else:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(["" if v is None else v for v in r] for r in page)
+        records = buf.getvalue()
+
+    result = {
+        "resource_id": resource_id,
+        "fields": [{"id": f, "type": "int" if f == "_id" else "text"} for f in fields],
+        "records": records,
+        "limit": limit,
+        "offset": offset,
+        "records_format": records_format,
+    }
+    if params.get("include_total", True) not in (False, "false", "False"):
+        result["total"] = len(rows)
+        result["total_was_estimated"] = False
+    return result, len(page)
+
+
+# ----------------------------
+# HTTP server
+# ----------------------------
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128  # load tests open many connections at once
+    mock: "MockServer"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):  # one line per request would drown the load test
+        pass
+
+    def _handle(self, method: str) -> None:
+        mock = self.server.mock
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == "POST":
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body or b"{}"))
+            else:
+                params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+
+        mock.delay()
+        route = self._route_name(url.path)
+        if mock.inject_error():
+            headers = {"Retry-After": "1"} if mock.config.error_status == 429 else {}
+            body = self._encode({"error": "injected failure"})
+            # counted before the reply goes out, so a client never sees uncounted requests
+            mock.stats.record(route, mock.config.error_status, len(body), 0, injected=True)
+            self._send(mock.config.error_status, body, headers)
+            return
+
+        status, payload, records = self._dispatch(mock, url.path, params)
+        body = self._encode(payload)
+        mock.stats.record(route, status, len(body), records, injected=False)
+        self._send(status, body)
+
+    @staticmethod
+    def _route_name(path: str) -> str:
+        if path.startswith(ARCGIS_PREFIX):
+            return "arcgis/query" if path.endswith("/query") else "arcgis/layer"
+        return path.removeprefix(CKAN_PREFIX) if path.startswith(CKAN_PREFIX) else "unknown"
+
+    def _dispatch(self, mock: "MockServer", path: str, params: dict) -> tuple[int, dict, int]:
+        if path.startswith(ARCGIS_PREFIX):
+            layer_id, _, op = path[len(ARCGIS_PREFIX):].partition("/")
+            layer = mock.layers.get(int(layer_id)) if layer_id.isdigit() else None
+            if layer is None:
+                return 200, {"error": {"code": 400, "message": "Invalid URL", "details": []}}, 0
+            if op == "query":
+                payload, n = arcgis_query(layer, params, mock.config.arcgis_max_records)
+                return 200, payload, n
+            if op == "":
+                return 200, {
+                    "id": int(layer_id),
+                    "name": layer.name,
+                    "type": "Feature Layer",
+                    "objectIdField": layer.object_id_field,
+                    "maxRecordCount": mock.config.arcgis_max_records,
+                    "editingInfo": {"lastEditDate": layer.last_edit_ms, "dataLastEditDate": layer.last_edit_ms},
+                }, 0
+            return 200, {"error": {"code": 400, "message": "Invalid URL", "details": []}}, 0
+
+        action = path.removeprefix(CKAN_PREFIX)
+        try:
+            if action == "datastore_search":
+                result, n = datastore_search(mock.resources, params, mock.config.ckan_rows_max)
+                return 200, {"help": path, "success": True, "result": result}, n
+            if action == "resource_show":
+                resource = mock.resources.get(params.get("id", ""))
+                if resource is None:
+                    raise CkanError(404, {"message": "Not found", "__type": "Not Found Error"})
+                return 200, {"success": True, "result": {"id": params["id"], "last_modified": resource.last_modified}}, 0
+        except CkanError as e:
+            return e.status, {"help": path, "success": False, "error": e.error}, 0
+        return 404, {"success": False, "error": {"message": f"Unknown route {path}"}}, 0
+
+    @staticmethod
+    def _encode(payload: dict) -> bytes:
+        return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+    def _send(self, status: int, body: bytes, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockServer:
+    """ArcGIS + CKAN stand-in on a daemon thread. Use as a context manager or start()/stop()."""
+
+    def __init__(
+        self,
+        layers: dict[int, ArcGISLayer],
+        resources: dict[str, CkanResource],
+        config: MockConfig | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.layers = layers
+        self.resources = resources
+        self.config = config or MockConfig()
+        self.stats = RequestStats()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._httpd = _Server((host, port), MockHandler)
+        self._httpd.mock = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def arcgis_url(self, layer_id: int) -> str:
+        return f"{self.url}{ARCGIS_PREFIX}{layer_id}"
+
+    @property
+    def ckan_endpoint(self) -> str:
+        return f"{self.url}{CKAN_PREFIX}datastore_search"
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def delay(self) -> None:
+        cfg = self.config
+        if cfg.latency_ms or cfg.jitter_ms:
+            ms = cfg.latency_ms + (2 * self._random() - 1) * cfg.jitter_ms
+            time.sleep(max(ms, 0.0) / 1000.0)
+
+    def inject_error(self) -> bool:
+        return self.config.error_rate > 0 and self._random() < self.config.error_rate
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,375 @@
+"""
+Benchmark harness for the pipelines (synthetic data, JSON history)
+
+What this script does
+---------------------
+A) Generate synthetic inputs in EPSG:7856 at the requested scale(s)
+   (see synthetic_data.py; polygon layers are cached under benchmarks/data/)
+
+B) Run each benchmark in a fresh subprocess (so peak RSS belongs to that run):
+   - zone_review : get_multi_zone_slices()      (file-based, GeoPandas)
+   - clip        : clip_cadastre_to_suburb()    (file-based, GeoPandas)
+   - coverage    : bus stop pipeline B2–C4      (local PostGIS)
+   - coverage_staged : the same with STAGED_LOAD = True (staging tables + rename swap)
+   - traffic     : station_reference + yearly_summary upserts (local PostGIS)
+
+C) Append results to benchmarks/history.json and compare with the previous run of the
+   same (bench, scale) on this host: throughput (features/s) and peak RSS.
+
+Usage
+-----
+    python benchmarks/run_benchmarks.py --bench zone_review clip --scale 10000 100000
+    python benchmarks/run_benchmarks.py --bench coverage traffic --scale 10000 --fail-on-regression
+    python benchmarks/run_benchmarks.py --bench coverage coverage_staged --scale 100000
+
+Notes
+-----
+- PostGIS benchmarks need a THROWAWAY database (they create/replace bcc_open,
+  bcc_traffic and clip_cadastre tables). Connection comes from BENCH_DB_* env vars and
+  the database name must contain "bench". See benchmarks/README.md for the container.
+- Scale = number of features in the main layer (lots, paths or yearly rows).
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import types
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_ROOT))
+from gis_common import instrumentation as instr
+
+
+# ----------------------------
+# Config
+# ----------------------------
+HISTORY_PATH = BENCH_DIR / "history.json"
+BENCHES = ["zone_review", "clip", "coverage", "coverage_staged", "traffic"]
+DEFAULT_SCALES = [10_000]
+
+# A run is flagged when throughput drops or peak RSS grows by more than this fraction
+REGRESSION_TOLERANCE = 0.10
+
+# Local PostGIS container (throwaway DB)
+BENCH_DB = {
+    "DB_USER": os.environ.get("BENCH_DB_USER", "postgres"),
+    "DB_PASSWORD": os.environ.get("BENCH_DB_PASSWORD", "bench"),
+    "DB_HOST": os.environ.get("BENCH_DB_HOST", "localhost"),
+    "DB_PORT": os.environ.get("BENCH_DB_PORT", "55432"),
+    "DB_NAME": os.environ.get("BENCH_DB_NAME", "gis_bench"),
+}
+
+RESULT_MARKER = "BENCH_RESULT "
+
+
+# ----------------------------
+# Script loading
+# ----------------------------
+def load_script(project: str, filename: str) -> types.ModuleType:
+    """
+    Import a pipeline script by path. The scripts import `db_config_local`; here it is
+    provided from BENCH_DB so they talk to the benchmark database.
+    """
+    db_config = types.ModuleType("db_config_local")
+    db_config.__dict__.update(BENCH_DB)
+    sys.modules["db_config_local"] = db_config
+
+    path = REPO_ROOT / project / "scripts" / filename
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_engine():
+    """SQLAlchemy engine for the benchmark database (refuses non-bench databases)."""
+    from urllib.parse import quote_plus
+    from sqlalchemy import create_engine, text
+
+    if "bench" not in BENCH_DB["DB_NAME"]:
+        raise RuntimeError(f"Refusing to benchmark against '{BENCH_DB['DB_NAME']}' (name must contain 'bench').")
+
+    password = quote_plus(BENCH_DB["DB_PASSWORD"])
+    engine = instr.instrument_engine(create_engine(
+        f"postgresql+psycopg2://{BENCH_DB['DB_USER']}:{password}@"
+        f"{BENCH_DB['DB_HOST']}:{BENCH_DB['DB_PORT']}/{BENCH_DB['DB_NAME']}"
+    ))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
+    return engine
+
+
+# ----------------------------
+# Benchmarks (each returns the feature count it processed)
+# ----------------------------
+def bench_zone_review(scale: int, seed: int, workdir: Path) -> int:
+    import synthetic_data as sd
+
+    cadastre_path = sd.cached_file("cadastre", scale, seed)
+    zone_path = sd.cached_file("zoning", scale, seed)
+    mod = load_script("zone_review", "extract_slices_V1.py")
+    mod.USE_CACHE = False  # measure the work, not the GeoParquet cache
+
+    with instr.stage("get_multi_zone_slices", "bench"):
+        mod.get_multi_zone_slices(cadastre_path, zone_path, workdir, "bench_slices", "gpkg")
+    return scale
+
+
+def bench_clip(scale: int, seed: int, workdir: Path) -> int:
+    import synthetic_data as sd
+
+    cadastre_path = sd.cached_file("cadastre", scale, seed)
+    suburbs_path = sd.cached_file("suburbs", scale, seed)
+    mod = load_script("clip_cadastre_by_suburb", "clip_cadastre_by_suburb_V1.py")
+    mod.USE_CACHE = False  # measure the work, not the GeoParquet cache
+
+    with instr.stage("clip_cadastre_to_suburb", "bench"):
+        mod.clip_cadastre_to_suburb(cadastre_path, suburbs_path, "BLACKTOWN", workdir, "bench_clip", "gpkg")
+    return scale
+
+
+def bench_coverage(scale: int, seed: int, workdir: Path, staged: bool = False) -> int:
+    """scale = number of paths; bus stops = scale / 10 over the same extent."""
+    import synthetic_data as sd
+
+    engine = bench_engine()
+    mod = load_script("bcc-busstops-paths-coverage", "busstops_paths_coverage_V1.py")
+    mod.STAGED_LOAD = staged
+    schema, suburbs_table = mod.SUBURBS_TABLE.split(".")
+
+    mod.exec_sql(engine, f"CREATE SCHEMA IF NOT EXISTS {mod.SCHEMA}; CREATE SCHEMA IF NOT EXISTS {schema};")
+    sd.make_suburbs(scale).to_crs(4326).rename_geometry("geom").to_postgis(
+        suburbs_table, engine, schema=schema, if_exists="replace", index=False
+    )
+    stops = sd.make_busstops(max(1, scale // 10), scale, seed).to_crs(4326).rename_geometry("geom")
+    paths = sd.make_paths(scale, scale, seed).to_crs(4326).rename_geometry("geom")
+
+    with instr.stage("coverage_pipeline", "bench"):
+        with instr.stage("load_raw", "load"):
+            mod.load_gdf(engine, stops, "raw_busstops", {"raw_busstops_geom_gix": "gist (geom)"})
+            mod.load_gdf(engine, paths, "raw_paths", {"raw_paths_geom_gix": "gist (geom)"})
+        with instr.stage("derive_full", "derive"):
+            mod.derive_full(engine)
+        with instr.stage("kpi", "kpi"):
+            mod.lga_kpi(engine)
+            mod.refresh_suburb_kpi(engine)
+    return scale
+
+
+def bench_coverage_staged(scale: int, seed: int, workdir: Path) -> int:
+    """bench_coverage with STAGED_LOAD = True (compare with `coverage` at the same scale)."""
+    return bench_coverage(scale, seed, workdir, staged=True)
+
+
+def bench_traffic(scale: int, seed: int, workdir: Path) -> int:
+    """scale = number of yearly_summary rows; stations = scale / 144."""
+    import synthetic_data as sd
+    from sqlalchemy import text
+
+    engine = bench_engine()
+    step1 = load_script("bcc-traffic-pipeline", "step_1_station_reference_V1.py")
+    step2 = load_script("bcc-traffic-pipeline", "step_2_yearly_summary_V1.py")
+
+    ddl = f"""
+    CREATE SCHEMA IF NOT EXISTS {step2.SCHEMA};
+
+    DROP TABLE IF EXISTS {step1.SCHEMA}.{step1.TABLE} CASCADE;
+    CREATE TABLE {step1.SCHEMA}.{step1.TABLE} (
+      station_key text PRIMARY KEY,
+      station_id text, lga text, suburb text, road_name text,
+      wgs84_latitude double precision, wgs84_longitude double precision,
+      geom geometry(Point, 4326)
+    );
+
+    DROP TABLE IF EXISTS {step2.SCHEMA}.{step2.YEARLY_TABLE} CASCADE;
+    DROP TABLE IF EXISTS {step2.SCHEMA}.{step2.SUMMARY_TABLE}, {step2.SCHEMA}.{step2.SPLIT_TABLE} CASCADE;
+    """
+    with engine.begin() as conn:
+        conn.execute(text(ddl))
+    step2.ensure_yearly_table(engine)  # partitioned by year, as the pipeline creates it
+
+    # synthetic records are CKAN "objects" pages; parse them the way the steps do
+    stations = step1.parse_page({"records": sd.make_station_records(max(1, scale // 144), seed)}, "objects")
+    yearly = step2.parse_page({"records": sd.make_yearly_records(scale, seed)}, "objects")
+
+    with instr.stage("traffic_upserts", "bench"):
+        with instr.stage("upsert_station_reference", "load"):
+            step1.upsert_station_reference(engine, step1.SCHEMA, step1.TABLE, stations)
+        with instr.stage("upsert_yearly_rows", "load"):
+            step2.upsert_yearly_rows(engine, yearly)
+        with instr.stage("refresh_summaries", "derive"):
+            step2.refresh_summaries(engine)
+    return scale
+
+
+BENCH_FUNCS = {
+    "zone_review": bench_zone_review,
+    "clip": bench_clip,
+    "coverage": bench_coverage,
+    "coverage_staged": bench_coverage_staged,
+    "traffic": bench_traffic,
+}
+
+
+# ----------------------------
+# Single run (child process)
+# ----------------------------
+def run_single(bench: str, scale: int, seed: int) -> dict:
+    """Run one benchmark in this process and return its result dict."""
+    sys.path.insert(0, str(BENCH_DIR))
+    with tempfile.TemporaryDirectory(prefix=f"bench_{bench}_") as tmp:
+        with instr.run(f"bench_{bench}") as rec:
+            features = BENCH_FUNCS[bench](scale, seed, Path(tmp))
+
+    timed = [s for s in rec.stages if s.kind == "bench"]
+    wall_s = sum(s.wall_s for s in timed)
+    return {
+        "bench": bench,
+        "scale": scale,
+        "seed": seed,
+        "features": features,
+        "wall_s": round(wall_s, 4),
+        "cpu_s": round(sum(s.cpu_s for s in timed), 4),
+        "throughput_fps": round(features / wall_s, 1) if wall_s else None,
+        "peak_rss_mb": instr.peak_rss_mb(),
+        "rss_growth_mb": sum(s.rss_growth_mb or 0 for s in timed),
+        "db_query_s": round(sum(s.counters.db_query_s for s in timed), 4),
+        "stages": {s.stage: s.wall_s for s in rec.stages},
+    }
+
+
+def spawn_single(bench: str, scale: int, seed: int, metrics_path: Path) -> dict:
+    """Run one benchmark in a fresh Python process and parse its result line."""
+    env = dict(os.environ, GIS_METRICS_JSONL=str(metrics_path))
+    proc = subprocess.run(
+        [sys.executable, __file__, "--single", bench, "--scale", str(scale), "--seed", str(seed)],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{bench} @ {scale} failed:\n{proc.stderr[-4000:]}")
+
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{bench} @ {scale} printed no result line.")
+
+
+# ----------------------------
+# History
+# ----------------------------
+def git_commit() -> tuple[str | None, bool]:
+    """(short HEAD sha, working tree dirty?) or (None, False) outside git."""
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip())
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def load_history(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("runs", [])
+
+
+def save_history(path: Path, runs: list[dict]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"runs": runs}, f, indent=1)
+
+
+def compare(prev: dict | None, cur: dict) -> list[str]:
+    """Return regression messages for cur vs the previous run (empty list = OK)."""
+    if prev is None:
+        return []
+    problems = []
+    if prev.get("throughput_fps") and cur.get("throughput_fps"):
+        if cur["throughput_fps"] < prev["throughput_fps"] * (1 - REGRESSION_TOLERANCE):
+            problems.append(f"throughput {prev['throughput_fps']} → {cur['throughput_fps']} features/s")
+    if prev.get("peak_rss_mb") and cur.get("peak_rss_mb"):
+        if cur["peak_rss_mb"] > prev["peak_rss_mb"] * (1 + REGRESSION_TOLERANCE):
+            problems.append(f"peak RSS {prev['peak_rss_mb']} → {cur['peak_rss_mb']} MB")
+    return problems
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run pipeline benchmarks on synthetic data.")
+    parser.add_argument("--bench", nargs="+", choices=BENCHES, default=["zone_review", "clip"])
+    parser.add_argument("--scale", nargs="+", type=int, default=DEFAULT_SCALES,
+                        help="features in the main layer, e.g. 10000 100000 1000000 5000000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--no-history", action="store_true", help="do not append results to the history file")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any run regressed")
+    parser.add_argument("--single", choices=BENCHES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_single(args.single, args.scale[0], args.seed)
+        print(RESULT_MARKER + json.dumps(result))
+        return 0
+
+    history = load_history(args.history)
+    sha, dirty = git_commit()
+    host = platform.node()
+    regressions = 0
+
+    with tempfile.TemporaryDirectory(prefix="bench_metrics_") as tmp:
+        for bench in args.bench:
+            for scale in args.scale:
+                result = spawn_single(bench, scale, args.seed, Path(tmp) / f"{bench}_{scale}.jsonl")
+                result.update(
+                    timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    commit=sha,
+                    dirty=dirty,
+                    host=host,
+                    python=platform.python_version(),
+                )
+
+                prev = next(
+                    (r for r in reversed(history)
+                     if r["bench"] == bench and r["scale"] == scale and r.get("host") == host),
+                    None,
+                )
+                problems = compare(prev, result)
+                regressions += bool(problems)
+
+                print(
+                    f"{bench:<12} scale={scale:<9} wall={result['wall_s']:.2f}s "
+                    f"throughput={result['throughput_fps']} f/s peak_rss={result['peak_rss_mb']} MB"
+                )
+                for msg in problems:
+                    print(f"  REGRESSION vs {prev.get('commit')}: {msg}")
+
+                history.append(result)
+
+    if not args.no_history:
+        save_history(args.history, history)
+        print(f"History updated: {args.history}")
+
+    return 1 if (regressions and args.fail_on_regression) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,237 @@
+"""
+Synthetic data generators for the benchmarks (EPSG:7856)
+
+All layers are generated on one square extent in western Sydney (MGA zone 56), so they
+overlap the way the real inputs do:
+
+- cadastre   : lot rectangles on a regular grid (`cadid`)
+- zoning     : zone blocks on a coarser grid, offset by half a lot so many lots
+               straddle two zones (`LAY_CLASS`, `SYM_CODE`)
+- suburbs    : a 4×4 grid of suburb polygons (`suburbname`)
+- bus stops  : random points (`fid`, `suburb`)
+- paths      : random-walk polylines, 2–6 vertices (`fid`)
+- yearly     : CKAN-shaped yearly-summary records for the traffic upserts
+- stations   : CKAN-shaped station-reference records
+
+Generation is vectorised (NumPy + shapely 2), so 5M features take seconds, not minutes.
+`cached_file()` writes each (layer, n, seed) once under benchmarks/data/ and reuses it.
+"""
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+CRS = "EPSG:7856"
+
+# South-west corner of the synthetic extent (around Blacktown, MGA56 metres)
+ORIGIN_X = 300_000.0
+ORIGIN_Y = 6_255_000.0
+
+LOT_W = 20.0
+LOT_H = 35.0
+
+LAY_CLASSES = [
+    ("Low Density Residential", "R2"),
+    ("Medium Density Residential", "R3"),
+    ("High Density Residential", "R4"),
+    ("Local Centre", "E1"),
+    ("General Industrial", "E4"),
+    ("Public Recreation", "RE1"),
+    ("Infrastructure", "SP2"),
+]
+
+SUBURB_NAMES = [
+    "BLACKTOWN", "SEVEN HILLS", "DOONSIDE", "MARAYONG",
+    "QUAKERS HILL", "ROUSE HILL", "MARSDEN PARK", "SCHOFIELDS",
+    "RIVERSTONE", "KINGS LANGLEY", "LALOR PARK", "TOONGABBIE",
+    "MOUNT DRUITT", "ROOTY HILL", "EASTERN CREEK", "PROSPECT",
+]
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def grid_shape(n: int) -> tuple[int, int]:
+    """Columns × rows of a near-square lot grid holding at least n lots."""
+    cols = max(1, math.ceil(math.sqrt(n * LOT_H / LOT_W)))
+    rows = max(1, math.ceil(n / cols))
+    return cols, rows
+
+
+def extent(n_lots: int) -> tuple[float, float, float, float]:
+    """(xmin, ymin, xmax, ymax) of the extent used for a given cadastre size."""
+    cols, rows = grid_shape(n_lots)
+    return ORIGIN_X, ORIGIN_Y, ORIGIN_X + cols * LOT_W, ORIGIN_Y + rows * LOT_H
+
+
+# ----------------------------
+# Polygon layers
+# ----------------------------
+def make_cadastre(n: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """n lot rectangles (slightly jittered) with a `cadid` column."""
+    rng = np.random.default_rng(seed)
+    cols, _ = grid_shape(n)
+    idx = np.arange(n)
+    x0 = ORIGIN_X + (idx % cols) * LOT_W
+    y0 = ORIGIN_Y + (idx // cols) * LOT_H
+    # jitter the inner edge so slice areas vary; lots never overlap
+    shrink = rng.uniform(0.0, 0.5, size=n)
+    geoms = shapely.box(x0, y0, x0 + LOT_W - shrink, y0 + LOT_H - shrink)
+    return gpd.GeoDataFrame(
+        {
+            "cadid": idx + 1_000_000,
+            "lotnumber": (idx % 500).astype(str),
+            "planlabel": np.char.add("DP", (idx // 500).astype(str)),
+        },
+        geometry=geoms,
+        crs=CRS,
+    )
+
+
+def make_zoning(n_lots: int, lots_per_zone: int = 50, seed: int = 0) -> gpd.GeoDataFrame:
+    """Zone blocks covering the cadastre extent, about n_lots / lots_per_zone of them."""
+    rng = np.random.default_rng(seed + 1)
+    xmin, ymin, xmax, ymax = extent(n_lots)
+    zone_w = LOT_W * max(1, round(math.sqrt(lots_per_zone)))
+    zone_h = LOT_H * max(1, round(lots_per_zone / round(math.sqrt(lots_per_zone))))
+    # half-lot offset → lot edges do not line up with zone edges
+    xs = np.arange(xmin - LOT_W / 2, xmax, zone_w)
+    ys = np.arange(ymin - LOT_H / 2, ymax, zone_h)
+    gx, gy = np.meshgrid(xs, ys)
+    gx, gy = gx.ravel(), gy.ravel()
+    classes = rng.integers(0, len(LAY_CLASSES), size=gx.size)
+    return gpd.GeoDataFrame(
+        {
+            "LAY_CLASS": [LAY_CLASSES[c][0] for c in classes],
+            "SYM_CODE": [LAY_CLASSES[c][1] for c in classes],
+            "EPI_NAME": "Synthetic LEP 2026",
+        },
+        geometry=shapely.box(gx, gy, gx + zone_w, gy + zone_h),
+        crs=CRS,
+    )
+
+
+def make_suburbs(n_lots: int) -> gpd.GeoDataFrame:
+    """A 4×4 grid of suburbs covering the cadastre extent."""
+    xmin, ymin, xmax, ymax = extent(n_lots)
+    w = (xmax - xmin) / 4
+    h = (ymax - ymin) / 4
+    ix, iy = np.meshgrid(np.arange(4), np.arange(4))
+    ix, iy = ix.ravel(), iy.ravel()
+    geoms = shapely.box(xmin + ix * w, ymin + iy * h, xmin + (ix + 1) * w, ymin + (iy + 1) * h)
+    return gpd.GeoDataFrame({"suburbname": SUBURB_NAMES}, geometry=geoms, crs=CRS)
+
+
+# ----------------------------
+# Point / line layers
+# ----------------------------
+def make_busstops(n: int, area_lots: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """n random bus stops over the extent of an `area_lots` cadastre."""
+    rng = np.random.default_rng(seed + 2)
+    xmin, ymin, xmax, ymax = extent(area_lots)
+    x = rng.uniform(xmin, xmax, size=n)
+    y = rng.uniform(ymin, ymax, size=n)
+    col = np.minimum(((x - xmin) / (xmax - xmin) * 4).astype(int), 3)
+    row = np.minimum(((y - ymin) / (ymax - ymin) * 4).astype(int), 3)
+    return gpd.GeoDataFrame(
+        {"fid": np.arange(1, n + 1), "suburb": np.asarray(SUBURB_NAMES)[row * 4 + col]},
+        geometry=shapely.points(x, y),
+        crs=CRS,
+    )
+
+
+def make_paths(n: int, area_lots: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """n random-walk polylines (2–6 vertices, ~40 m steps) over the same extent."""
+    rng = np.random.default_rng(seed + 3)
+    xmin, ymin, xmax, ymax = extent(area_lots)
+    n_vertices = rng.integers(2, 7, size=n)
+    total = int(n_vertices.sum())
+    line_idx = np.repeat(np.arange(n), n_vertices)
+
+    starts_x = rng.uniform(xmin, xmax, size=n)
+    starts_y = rng.uniform(ymin, ymax, size=n)
+    steps = rng.normal(0.0, 40.0, size=(total, 2))
+    # first vertex of every line has no step
+    first = np.concatenate([[0], np.cumsum(n_vertices)[:-1]])
+    steps[first] = 0.0
+    # cumulative sum restarted at each line
+    cum = np.cumsum(steps, axis=0)
+    cum -= np.repeat(cum[first], n_vertices, axis=0)
+    coords = np.column_stack([starts_x[line_idx] + cum[:, 0], starts_y[line_idx] + cum[:, 1]])
+
+    return gpd.GeoDataFrame(
+        {"fid": np.arange(1, n + 1), "pathtype": rng.choice(["Footpath", "Shared path", "Cycleway"], size=n)},
+        geometry=shapely.linestrings(coords, indices=line_idx),
+        crs=CRS,
+    )
+
+
+# ----------------------------
+# CKAN-shaped records (traffic pipeline)
+# ----------------------------
+def make_station_records(n: int, seed: int = 0, lgas: tuple[str, ...] = ("Blacktown",)) -> list[dict]:
+    """n station-reference records, as CKAN returns them (strings for numbers), round-robin over `lgas`."""
+    rng = np.random.default_rng(seed + 4)
+    lat = rng.uniform(-33.80, -33.70, size=n)
+    lon = rng.uniform(150.80, 150.95, size=n)
+    return [
+        {
+            "station_key": str(100_000 + i),
+            "station_id": f"S{i:06d}",
+            "lga": lgas[i % len(lgas)],
+            "suburb": SUBURB_NAMES[i % len(SUBURB_NAMES)],
+            "road_name": f"Synthetic Rd {i % 97}",
+            "wgs84_latitude": f"{lat[i]:.6f}",
+            "wgs84_longitude": f"{lon[i]:.6f}",
+        }
+        for i in range(n)
+    ]
+
+
+def make_yearly_records(n: int, seed: int = 0) -> list[dict]:
+    """n yearly-summary records spread over stations / years / directions."""
+    rng = np.random.default_rng(seed + 5)
+    counts = rng.integers(100, 60_000, size=n)
+    records = []
+    # 12 years × 3 periods × 2 directions × 2 cardinal = 144 unique rows per station
+    for i in range(n):
+        station, k = divmod(i, 144)
+        year, k = divmod(k, 12)
+        period, k = divmod(k, 4)
+        direction, cardinal = divmod(k, 2)
+        records.append(
+            {
+                "station_key": str(100_000 + station),
+                "year": str(2012 + year),
+                "period": ["ALL DAYS", "WEEKDAYS", "WEEKENDS"][period],
+                "count_type": "AADT",
+                "classification_type": "ALL VEHICLES",
+                "traffic_direction_seq": str(direction),
+                "cardinal_direction_seq": str(cardinal + 1),
+                "traffic_count": str(int(counts[i])),
+            }
+        )
+    return records
+
+
+# ----------------------------
+# File cache
+# ----------------------------
+GENERATORS = {
+    "cadastre": lambda n, seed: make_cadastre(n, seed),
+    "zoning": lambda n, seed: make_zoning(n, seed=seed),
+    "suburbs": lambda n, seed: make_suburbs(n),
+}
+
+
+def cached_file(layer: str, n: int, seed: int = 0, ext: str = "gpkg") -> Path:
+    """Write a generated polygon layer once per (layer, n, seed) and return its path."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    path = DATA_DIR / f"{layer}_{n}_{seed}.{ext}"
+    if not path.exists():
+        GENERATORS[layer](n, seed).to_file(path)
+    return path
@@ -1,8 +1,19 @@
 import geopandas as gpd
 from pathlib import Path
 import os
-import tkinter as tk
-from tkinter import filedialog
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import cache, instrumentation as instr, spatial_order
+
+# Reuse the parsed cadastre / final clip from the GeoParquet cache (gis_common/cache.py)
+# when the input files are unchanged. Bump CACHE_VERSION when the clip logic changes.
+USE_CACHE = True
+CACHE_VERSION = "v1"
+
+# Row order of the output file (gis_common/spatial_order.py): None = clip order,
+# "hilbert" = sorted along a Hilbert curve so viewport reads touch fewer pages
+SPATIAL_ORDER = None
 
 
 def clip_cadastre_to_suburb(
@@ -17,13 +28,40 @@ def clip_cadastre_to_suburb(
     allowed_ext = {"shp", "gpkg", "geojson"}
     if ext not in allowed_ext:
         raise ValueError(f"Unsupported extension '{ext}'. Use one of: {allowed_ext}")
-    
 
+    # The clip depends only on the inputs + suburb: a rerun that only changes the output
+    # name/format reads it from the cache and skips read + clip
+    clipped_cadastre = cache.cached(
+        "clip_cadastre",
+        [CACHE_VERSION, cache.input_fingerprint(cadastre_path), cache.input_fingerprint(suburbs_path),
+         suburb_name.upper()],
+        lambda: compute_clip(cadastre_path, suburbs_path, suburb_name),
+        enabled=USE_CACHE,
+    )
+
+    #Write output:
+    out_path = out_folder / f"{out_name}.{ext}"
+    with instr.stage("write_output", "write", ext=ext):
+        spatial_order.sorted_for_write(clipped_cadastre, SPATIAL_ORDER).to_file(out_path)
+    return out_path
+
+
+def read_layer(path, name: str) -> gpd.GeoDataFrame:
+    """Read an input layer (cached as GeoParquet, much faster to re-read than shp/gdb)."""
+    def compute():
+        with instr.stage(f"read_{name}", "load"):
+            return gpd.read_file(path)
+
+    return cache.cached(name, [CACHE_VERSION, cache.input_fingerprint(path)], compute, enabled=USE_CACHE)
+
+
+def compute_clip(cadastre_path, suburbs_path, suburb_name) -> gpd.GeoDataFrame:
     #Read Cadastre:
-    cadastre = gpd.read_file(cadastre_path)
+    cadastre = read_layer(cadastre_path, "cadastre")
 
-    #Read suburbs:
-    suburbs = gpd.read_file(suburbs_path)
+    #Read suburbs (small, not worth caching):
+    with instr.stage("read_suburbs", "load"):
+        suburbs = gpd.read_file(suburbs_path)
 
     #selected_suburb = suburbs[suburbs["suburbname"] == suburb_name].copy()
     selected_suburb = suburbs[suburbs["suburbname"].str.upper() == suburb_name.upper()].copy()
@@ -35,18 +73,19 @@ def clip_cadastre_to_suburb(
         raise ValueError(f"CRS mismatch: cadastre={cadastre.crs}, suburbs={suburbs.crs}")
 
     #Clip cadastre to the suburb
-    clipped_cadastre = gpd.clip(cadastre, selected_suburb)
+    with instr.stage("clip", "derive", suburb=suburb_name):
+        clipped_cadastre = gpd.clip(cadastre, selected_suburb)
     if clipped_cadastre.empty:
         raise ValueError(f"Clip result is empty for suburb '{suburb_name}'. Check inputs.")
-
-    #Write output:
-    out_path = out_folder / f"{out_name}.{ext}"
-    clipped_cadastre.to_file(out_path)
-    return out_path
+    return clipped_cadastre
     
 
 
 if __name__ == "__main__":
+    # Tk only for the interactive run (importing the module must work without a display)
+    import tkinter as tk
+    from tkinter import filedialog
+
     # Start a hidden Tk window so we can use dialogs
     root = tk.Tk()
     root.withdraw()  # hide the empty main window
@@ -94,14 +133,15 @@ if __name__ == "__main__":
 
     ext = input("Enter output extension (e.g. shp or gpkg): ")
 
-    out_path = clip_cadastre_to_suburb(
-        cadastre_path,
-        suburbs_path,
-        suburb_name,
-        out_folder,
-        out_name,
-        ext
-    )
+    with instr.run("clip_cadastre_by_suburb"):
+        out_path = clip_cadastre_to_suburb(
+            cadastre_path,
+            suburbs_path,
+            suburb_name,
+            out_folder,
+            out_name,
+            ext
+        )
 
     print(f"Exported to: {out_path}")
     
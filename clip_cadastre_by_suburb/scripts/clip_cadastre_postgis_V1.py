@@ -1,13 +1,26 @@
+import sys
+from pathlib import Path
+
 import geopandas as gpd
 from sqlalchemy import create_engine, text
 from urllib.parse import quote_plus
 from db_config_local import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
 
-password = quote_plus(DB_PASSWORD) #make my password safe to put inside a URL string (# handles @ etc.)
-engine = create_engine(
-   f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
-#print("engine object created") 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import instrumentation as instr, spatial_order
+
+_engine = None
+
+
+def get_engine():
+    """The script's engine, created on first use (importing this module opens no connection)."""
+    global _engine
+    if _engine is None:
+        password = quote_plus(DB_PASSWORD) #make my password safe to put inside a URL string (# handles @ etc.)
+        _engine = instr.instrument_engine(create_engine(
+           f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+        ))
+    return _engine
 
 # try:
 #     with engine.connect() as conn:
@@ -17,6 +30,19 @@ engine = create_engine(
 #     print("DB connection FAILED:")
 #     print(e)
 
+SCHEMA = "clip_cadastre"
+
+# Staged load: write "<table>__staging" (no index), index + ANALYZE it once, then swap
+# it in with ALTER TABLE ... RENAME in one transaction. Readers keep the old cut until COMMIT.
+STAGED_LOAD = False
+
+# Row order of the written cut (gis_common/spatial_order.py): None = clip order,
+# "hilbert" = sorted along a Hilbert curve, "cluster" = Hilbert + CLUSTER on the GiST index
+SPATIAL_ORDER = None
+
+# <OUT_DIR>/<SUBURB>_cadastre.gpkg is written for every clipped suburb
+OUT_DIR = r"C:\Users\sabzer\Downloads\Test"
+
 def clip_cadastre_by_suburb(suburb_name: str) -> gpd.GeoDataFrame:
    
     """
@@ -28,11 +54,12 @@ def clip_cadastre_by_suburb(suburb_name: str) -> gpd.GeoDataFrame:
    
         
     # 1. Load suburbs first (lighter)
-    suburbs = gpd.read_postgis(
-    'SELECT * FROM clip_cadastre.blacktown_suburbs',
-    engine,
-    geom_col="geom"
-    )
+    with instr.stage("load_suburbs", "load"):
+        suburbs = gpd.read_postgis(
+        'SELECT * FROM clip_cadastre.blacktown_suburbs',
+        get_engine(),
+        geom_col="geom"
+        )
     chosen = suburbs[suburbs["suburbname"] == suburb_name].copy()
 
     if chosen.empty:
@@ -40,39 +67,94 @@ def clip_cadastre_by_suburb(suburb_name: str) -> gpd.GeoDataFrame:
         raise ValueError(f"Suburb '{suburb_name}' not found in Blacktown_suburbs")
     
     # 2. Only now load cadastre (heavier)
-    cadastre = gpd.read_postgis(
-        "SELECT * FROM clip_cadastre.cadastre",
-        engine,
-        geom_col="geom"
-        )
+    with instr.stage("load_cadastre", "load"):
+        cadastre = gpd.read_postgis(
+            "SELECT * FROM clip_cadastre.cadastre",
+            get_engine(),
+            geom_col="geom"
+            )
     
     # 3. Clip
-    result = gpd.overlay(cadastre, chosen, how= 'intersection')
+    with instr.stage("clip", "derive", suburb=suburb_name):
+        result = gpd.overlay(cadastre, chosen, how= 'intersection')
     return result
 
 
+def write_to_postgis(gdf: gpd.GeoDataFrame, table: str) -> None:
+    """
+    Write gdf to clip_cadastre.<table> with a GiST index on its geometry.
+
+    STAGED_LOAD=False: replace the live table (it is missing while it reloads).
+    STAGED_LOAD=True:  load "<table>__staging" (a normal logged table, so it is never
+                       rewritten), build the index once on the full data, ANALYZE, then
+                       rename-swap in one transaction.
+    """
+    engine = get_engine()
+    gdf = spatial_order.sorted_for_write(gdf, SPATIAL_ORDER)
+    geom_col = gdf.geometry.name
+    index_name = f"{table}_geom_gix"
+
+    if not STAGED_LOAD:
+        gdf.to_postgis(table, engine, schema=SCHEMA, if_exists="replace", index=False)
+        instr.record_rows(len(gdf))
+        with engine.begin() as conn:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON {SCHEMA}."{table}" USING gist ("{geom_col}");'))
+            if SPATIAL_ORDER == "cluster":
+                conn.execute(text(spatial_order.cluster_sql(SPATIAL_ORDER, f'{SCHEMA}."{table}"', f'"{index_name}"')))
+            conn.execute(text(f'ANALYZE {SCHEMA}."{table}";'))
+        return
+
+    staging = f"{table}__staging"
+    gdf.to_postgis(staging, engine, schema=SCHEMA, if_exists="replace", index=False)
+    instr.record_rows(len(gdf))
+
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX "{index_name}__staging" ON {SCHEMA}."{staging}" USING gist ("{geom_col}");'))
+        if SPATIAL_ORDER == "cluster":
+            conn.execute(text(spatial_order.cluster_sql(SPATIAL_ORDER, f'{SCHEMA}."{staging}"', f'"{index_name}__staging"')))
+        conn.execute(text(f'ANALYZE {SCHEMA}."{staging}";'))
+
+    with engine.begin() as conn:
+        live_exists = conn.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL;"),
+            {"name": f'{SCHEMA}."{table}"'},
+        ).scalar()
+        if live_exists:
+            conn.execute(text(f'ALTER TABLE {SCHEMA}."{table}" RENAME TO "{table}__old";'))
+            conn.execute(text(f'ALTER INDEX IF EXISTS {SCHEMA}."{index_name}" RENAME TO "{index_name}__old";'))
+        conn.execute(text(f'ALTER TABLE {SCHEMA}."{staging}" RENAME TO "{table}";'))
+        conn.execute(text(f'ALTER INDEX {SCHEMA}."{index_name}__staging" RENAME TO "{index_name}";'))
+        if live_exists:
+            conn.execute(text(f'DROP TABLE {SCHEMA}."{table}__old";'))
+
+
+
+def export_suburb(suburb: str, gdf: gpd.GeoDataFrame, out_dir=None, write_back: bool = True) -> Path:
+    """Write one suburb's clip to <out_dir>/<SUBURB>_cadastre.gpkg (and back to PostGIS)."""
+    print(f"{len(gdf)} parcels in {suburb}")
+    out_path = Path(out_dir or OUT_DIR) / f"{suburb}_cadastre.gpkg"
+    with instr.stage("write_file", "write"):
+        spatial_order.sorted_for_write(gdf, SPATIAL_ORDER).to_file(out_path)
+    if write_back:
+        with instr.stage("write_postgis", "load"):
+            write_to_postgis(gdf, f"{suburb}_cadastre")
+    return out_path
+
 
 if __name__ == "__main__":
     
-    while True:
-        suburb = input("Enter suburb name: ").strip().upper()
+    with instr.run("clip_cadastre_postgis"):
+        while True:
+            suburb = input("Enter suburb name: ").strip().upper()
 
-        try:
-            gdf = clip_cadastre_by_suburb(suburb)
-            break
-        except ValueError as e:
-            print(e)
-            print("Please check the spelling and try again, or press Ctrl+C to exit.\n")
+            try:
+                gdf = clip_cadastre_by_suburb(suburb)
+                break
+            except ValueError as e:
+                print(e)
+                print("Please check the spelling and try again, or press Ctrl+C to exit.\n")
 
-    print(f"{len(gdf)} parcels in {suburb}")
-    gdf.to_file(fr"C:\Users\sabzer\Downloads\Test\{suburb}_cadastre.gpkg")
-    gdf.to_postgis(
-        f"{suburb}_cadastre",
-        engine,
-        schema= "clip_cadastre",
-        if_exists='replace',
-        index=False
-    )
+        export_suburb(suburb, gdf)
     
     
 
@@ -0,0 +1,340 @@
+"""
+Cadastre clip service — load once, clip many (V1)
+
+What this script does
+---------------------
+Runs a small local HTTP server that loads the cadastre (and suburbs) ONCE, builds an
+STRtree on the lot geometries, and then answers clip requests from memory:
+
+    GET  /clip?suburb=MARSDEN PARK              lots clipped to a suburb
+    GET  /clip?bbox=minx,miny,maxx,maxy         lots clipped to a box (cadastre CRS)
+    POST /clip                                  lots clipped to a polygon; body = GeoJSON
+                                                geometry / Feature, or WKT
+    GET  /stats                                 request latency (count, p50, p95, max) per route
+    GET  /health                                lots loaded, CRS, uptime
+
+Every /clip takes `format=parquet` (GeoParquet, default) or `format=fgb` (FlatGeobuf).
+The result is returned as the response body, e.g.:
+
+    curl -o marsden.parquet "http://127.0.0.1:8765/clip?suburb=Marsden%20Park"
+    curl -o box.fgb "http://127.0.0.1:8765/clip?bbox=300000,6250000,301000,6251000&format=fgb"
+
+Clip
+----
+Same result as gpd.clip() in clip_cadastre_by_suburb_V1.py (cadastre attributes, geometry
+cut to the mask). The tree gives the candidate lots; lots lying fully inside the mask keep
+their geometry and only the lots on its boundary are intersected.
+
+Notes
+-----
+- SOURCE = "file" reads CADASTRE_PATH / SUBURBS_PATH (through the GeoParquet cache of
+  clip_cadastre_by_suburb_V1.py); SOURCE = "postgis" reads clip_cadastre.cadastre and
+  clip_cadastre.blacktown_suburbs with the credentials in db_config_local.py.
+- Suburb names match case-insensitively on the `suburbname` field.
+- Listens on 127.0.0.1 only: this is a local helper, not a public service.
+- Requests run on threads; the loaded layers and the tree are only read, never changed.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import instrumentation as instr
+
+
+# ----------------------------
+# Config
+# ----------------------------
+SOURCE = "file"  # "file" | "postgis"
+CADASTRE_PATH = Path(r"C:\Users\sabzer\Downloads\Test\cadastre.gpkg")
+SUBURBS_PATH = Path(r"C:\Users\sabzer\Downloads\Test\suburbs.gpkg")
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# latency samples kept per route for /stats percentiles
+LATENCY_WINDOW = 1000
+
+FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "fgb": "application/octet-stream",
+}
+
+
+# ----------------------------
+# Load (once)
+# ----------------------------
+def load_layers() -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    if SOURCE == "file":
+        import clip_cadastre_by_suburb_V1 as file_clip
+
+        cadastre = file_clip.read_layer(CADASTRE_PATH, "cadastre")
+        with instr.stage("read_suburbs", "load"):
+            suburbs = gpd.read_file(SUBURBS_PATH)
+
+    elif SOURCE == "postgis":
+        from urllib.parse import quote_plus
+
+        from sqlalchemy import create_engine
+        from db_config_local import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+
+        password = quote_plus(DB_PASSWORD)
+        engine = instr.instrument_engine(create_engine(
+            f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+        ))
+        with instr.stage("load_cadastre", "load"):
+            cadastre = gpd.read_postgis("SELECT * FROM clip_cadastre.cadastre", engine, geom_col="geom")
+        with instr.stage("load_suburbs", "load"):
+            suburbs = gpd.read_postgis("SELECT * FROM clip_cadastre.blacktown_suburbs", engine, geom_col="geom")
+        engine.dispose()
+
+    else:
+        raise ValueError(f"SOURCE must be 'file' or 'postgis', got {SOURCE!r}")
+
+    if cadastre.crs != suburbs.crs:
+        raise ValueError(f"CRS mismatch: cadastre={cadastre.crs}, suburbs={suburbs.crs}")
+    return cadastre, suburbs
+
+
+class ClipIndex:
+    """The cadastre in memory with an STRtree on its lots, plus the suburb polygons."""
+
+    def __init__(self, cadastre: gpd.GeoDataFrame, suburbs: gpd.GeoDataFrame):
+        self.cadastre = cadastre.reset_index(drop=True)
+        self.crs = cadastre.crs
+
+        with instr.stage("build_strtree", "derive", lots=len(self.cadastre)):
+            self.geoms = np.asarray(self.cadastre.geometry.values)
+            self.tree = shapely.STRtree(self.geoms)
+
+        # one (multi)polygon per upper-cased suburb name
+        names = suburbs["suburbname"].astype(str).str.upper()
+        self.suburbs = {
+            name: shapely.union_all(np.asarray(group.geometry.values))
+            for name, group in suburbs.groupby(names)
+        }
+        for mask in self.suburbs.values():
+            shapely.prepare(mask)
+
+    def suburb_mask(self, name: str):
+        mask = self.suburbs.get(name.strip().upper())
+        if mask is None:
+            raise ValueError(f"No features found for suburb '{name}' in 'suburbname' field.")
+        return mask
+
+    def clip(self, mask) -> gpd.GeoDataFrame:
+        """Lots intersecting `mask`, cut to it (like gpd.clip)."""
+        shapely.prepare(mask)
+        idx = np.sort(self.tree.query(mask, predicate="intersects"))
+        geoms = self.geoms[idx]
+
+        inside = shapely.contains_properly(mask, geoms)
+        clipped = geoms.copy()
+        clipped[~inside] = shapely.intersection(geoms[~inside], mask)
+
+        keep = ~shapely.is_empty(clipped)
+        out = self.cadastre.iloc[idx[keep]].copy()
+        out[out.geometry.name] = clipped[keep]
+        return out
+
+
+# ----------------------------
+# Request parsing / encoding
+# ----------------------------
+def parse_bbox(value: str):
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be 'minx,miny,maxx,maxy'.") from None
+    if minx >= maxx or miny >= maxy:
+        raise ValueError("bbox must have minx < maxx and miny < maxy.")
+    return shapely.box(minx, miny, maxx, maxy)
+
+
+def parse_polygon(body: bytes):
+    text = body.decode("utf-8").strip()
+    if not text:
+        raise ValueError("POST /clip needs a GeoJSON geometry / Feature or WKT body.")
+    try:
+        if text.startswith("{"):
+            obj = json.loads(text)
+            if obj.get("type") == "Feature":
+                obj = obj["geometry"]
+            mask = shapely.from_geojson(json.dumps(obj))
+        else:
+            mask = shapely.from_wkt(text)
+    except (ValueError, KeyError, shapely.errors.GEOSException) as e:
+        raise ValueError(f"Could not parse the polygon: {e}") from None
+
+    if mask is None or mask.geom_type not in ("Polygon", "MultiPolygon"):
+        raise ValueError("The clip geometry must be a Polygon or MultiPolygon.")
+    return mask
+
+
+def encode(gdf: gpd.GeoDataFrame, fmt: str) -> bytes:
+    if fmt == "parquet":
+        buf = io.BytesIO()
+        gdf.to_parquet(buf, index=False)
+        return buf.getvalue()
+
+    # FlatGeobuf is written through GDAL, which wants a file
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "clip.fgb"
+        gdf.to_file(path, driver="FlatGeobuf")
+        return path.read_bytes()
+
+
+# ----------------------------
+# Latency tracking
+# ----------------------------
+class LatencyStats:
+    """Thread-safe request counts and the last LATENCY_WINDOW latencies per route."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+
+    def record(self, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+            counts = self._counts.setdefault(route, {"requests": 0, "errors": 0})
+            counts["requests"] += 1
+            counts["errors"] += status >= 400
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {route: sorted(values) for route, values in self._samples.items()}
+            counts = {route: dict(c) for route, c in self._counts.items()}
+
+        out = {}
+        for route, values in samples.items():
+            ms = [v * 1000 for v in values]
+            out[route] = {
+                **counts[route],
+                "p50_ms": round(ms[int(0.50 * (len(ms) - 1))], 2),
+                "p95_ms": round(ms[int(0.95 * (len(ms) - 1))], 2),
+                "max_ms": round(ms[-1], 2),
+                "window": len(ms),
+            }
+        return out
+
+
+# ----------------------------
+# HTTP server
+# ----------------------------
+class ClipHandler(BaseHTTPRequestHandler):
+    index: ClipIndex  # set in serve()
+    stats: LatencyStats
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str) -> None:
+        t0 = time.perf_counter()
+        url = urlparse(self.path)
+        route = f"{method} {url.path}"
+        status = 500
+        try:
+            status = self._route(method, url.path, {k: v[-1] for k, v in parse_qs(url.query).items()})
+        except ValueError as e:
+            status = self._send_json(400, {"error": str(e)})
+        except Exception as e:  # keep serving; report the failure to the caller
+            status = self._send_json(500, {"error": repr(e)})
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stats.record(route, status, elapsed)
+            print(f"{route} {status} {elapsed * 1000:.1f} ms")
+
+    def _route(self, method: str, path: str, query: dict) -> int:
+        if method == "GET" and path == "/health":
+            return self._send_json(200, {
+                "lots": len(self.index.cadastre),
+                "suburbs": len(self.index.suburbs),
+                "crs": str(self.index.crs),
+                "uptime_s": round(time.time() - self.stats.started, 1),
+            })
+        if method == "GET" and path == "/stats":
+            return self._send_json(200, self.stats.snapshot())
+        if path != "/clip":
+            return self._send_json(404, {"error": f"Unknown route {method} {path}"})
+
+        fmt = query.get("format", "parquet").lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {sorted(FORMATS)}")
+
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            mask = parse_polygon(self.rfile.read(length))
+        elif "suburb" in query:
+            mask = self.index.suburb_mask(query["suburb"])
+        elif "bbox" in query:
+            mask = parse_bbox(query["bbox"])
+        else:
+            raise ValueError("GET /clip needs ?suburb=... or ?bbox=minx,miny,maxx,maxy")
+
+        result = self.index.clip(mask)
+        body = encode(result, fmt)
+
+        self.send_response(200)
+        self.send_header("Content-Type", FORMATS[fmt])
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Feature-Count", str(len(result)))
+        self.end_headers()
+        self.wfile.write(body)
+        return 200
+
+    def _send_json(self, status: int, payload: dict) -> int:
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def log_message(self, format, *args):  # one line per request is printed in _handle
+        pass
+
+
+def serve(host: str = HOST, port: int = PORT) -> None:
+    with instr.run("clip_service_load"):
+        cadastre, suburbs = load_layers()
+        ClipHandler.index = ClipIndex(cadastre, suburbs)
+    ClipHandler.stats = LatencyStats()
+
+    server = ThreadingHTTPServer((host, port), ClipHandler)
+    server.daemon_threads = True
+    print(f"{len(cadastre)} lots, {len(ClipHandler.index.suburbs)} suburbs loaded (pid {os.getpid()})")
+    print(f"Clip service on http://{host}:{port}  (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Latency:", json.dumps(ClipHandler.stats.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,9 @@
+"""
+Shared helpers for the GIS mini-projects in this repo.
+
+Scripts live in `<project>/scripts/` and import this package by putting the repo root
+on sys.path:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from gis_common import instrumentation as instr
+"""
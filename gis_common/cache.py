@@ -0,0 +1,166 @@
+"""
+Content-addressed GeoParquet cache for GeoPandas stage results (LRU size eviction)
+
+What this module does
+---------------------
+- `input_fingerprint(path)`          size + mtime of an input layer (and its sidecar files)
+- `make_key(stage, *parts)`          cache key from a stage name + inputs + parameters
+- `cached(stage, parts, compute)`    return the cached GeoDataFrame / DataFrame or compute + store it
+
+Results are stored as GeoParquet under GIS_CACHE_DIR (default <repo>/.gis_cache/). After
+every write the least recently used entries are evicted until the cache is below
+GIS_CACHE_MAX_MB (default 2048). A hit refreshes the entry's mtime (= LRU order).
+
+Notes
+-----
+- Key parts must be JSON-serialisable; put every parameter that changes the result in them
+  (and bump the stage's version string when the stage's code changes).
+- Shapefiles are fingerprinted with their .dbf/.shx/.prj/... siblings, FileGDB / other
+  folders with every file inside. GIS_CACHE_HASH_CONTENTS=1 hashes file contents instead
+  of size + mtime (slower, but survives copies that reset mtimes).
+- GeoParquet needs pyarrow. Without it (or with GIS_CACHE_DISABLE=1) `cached()` just
+  computes.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.environ.get("GIS_CACHE_DIR", REPO_ROOT / ".gis_cache"))
+MAX_BYTES = int(float(os.environ.get("GIS_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+HASH_CONTENTS = os.environ.get("GIS_CACHE_HASH_CONTENTS") == "1"
+DISABLED = os.environ.get("GIS_CACHE_DISABLE") == "1"
+
+_lock = threading.Lock()
+
+
+def available() -> bool:
+    """True if the cache can be used (enabled and pyarrow importable)."""
+    if DISABLED:
+        return False
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ----------------------------
+# Keys
+# ----------------------------
+def _layer_files(path: Path) -> list[Path]:
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file())
+    # shapefile (and friends): every file sharing the stem (.shp .dbf .shx .prj .cpg ...)
+    siblings = sorted(p for p in path.parent.glob(f"{glob.escape(path.stem)}.*") if p.is_file())
+    return siblings or [path]
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def input_fingerprint(path) -> list:
+    """Fingerprint of an input layer: [name, size, mtime_ns or sha256] per file."""
+    path = Path(path).resolve()
+    out = [str(path)]
+    for p in _layer_files(path):
+        st = p.stat()
+        out.append([p.name, st.st_size, _file_digest(p) if HASH_CONTENTS else st.st_mtime_ns])
+    return out
+
+
+def make_key(stage: str, *parts) -> str:
+    payload = json.dumps([stage, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# ----------------------------
+# Store
+# ----------------------------
+def _entry(key: str) -> Path:
+    return CACHE_DIR / f"{key}.parquet"
+
+
+def load(key: str):
+    """Cached GeoDataFrame (or plain DataFrame) for `key`, or None."""
+    import geopandas as gpd
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    path = _entry(key)
+    if not path.exists():
+        return None
+    try:
+        is_geo = b"geo" in (pq.read_schema(path).metadata or {})
+        gdf = gpd.read_parquet(path) if is_geo else pd.read_parquet(path)
+    except Exception as e:  # truncated / unreadable entry → recompute
+        print(f"[cache] unreadable entry {path.name} ({e!r}), recomputing")
+        path.unlink(missing_ok=True)
+        return None
+    os.utime(path)  # LRU: mark as recently used
+    return gdf
+
+
+def store(key: str, gdf) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _entry(key)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    evict()
+
+
+def evict(max_bytes: int | None = None) -> int:
+    """Delete least recently used entries until the cache fits. Returns entries removed."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        entries = []
+        for p in CACHE_DIR.glob("*.parquet"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, p in sorted(entries):
+            if total <= max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+    return removed
+
+
+def cached(stage: str, parts: list, compute: Callable, enabled: bool = True):
+    """
+    Return compute()'s GeoDataFrame (or DataFrame), from the cache when `stage` + `parts` were seen before:
+
+        cadastre = cache.cached("read_7856", ["v1", cache.input_fingerprint(path)], read_and_project)
+    """
+    if not (enabled and available()):
+        return compute()
+
+    key = make_key(stage, *parts)
+    gdf = load(key)
+    if gdf is not None:
+        print(f"[cache] {stage}: hit")
+        return gdf
+
+    gdf = compute()
+    store(key, gdf)
+    print(f"[cache] {stage}: stored")
+    return gdf
@@ -0,0 +1,158 @@
+"""
+CKAN datastore_search helpers (column-limited requests, bulk typed parsing)
+
+What this module does
+---------------------
+- `search_params(fields, records_format)`  the `fields` / `records_format` request keys
+- `page_rows(result, fields, fmt)`         one response page → rows (lists in `fields` order)
+- `to_columns(rows, fields, types)`        rows → {column: typed list}, converted column by column
+- `extend_columns(columns, more)`          append one page's columns to the running result
+- `column_params(columns)`                 columns → SQL param dicts (for executemany)
+- `RateLimiter(per_second)`                one request budget shared by worker threads
+                                           (per_second may be a callable read per request)
+
+records_format
+--------------
+- "objects" : CKAN default, one dict per record (largest payload)
+- "lists"   : one list per record, values in the order of result["fields"]
+- "csv"     : the page is one CSV string (no header); smallest payload, all values are text
+
+Notes
+-----
+- Empty strings (CSV nulls) and None become None. Columns in `required` must not be None.
+- A bad value raises ValueError naming the column and the row index.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import threading
+import time
+from typing import Callable
+
+RECORDS_FORMATS = ("objects", "lists", "csv")
+
+
+def search_params(fields: list[str], records_format: str = "objects") -> dict:
+    """Request keys that limit a datastore_search call to `fields` in `records_format`."""
+    if records_format not in RECORDS_FORMATS:
+        raise ValueError(f"records_format must be one of {RECORDS_FORMATS}, got {records_format!r}")
+    return {"fields": ",".join(fields), "records_format": records_format}
+
+
+def page_rows(result: dict, fields: list[str], records_format: str = "objects") -> list[list]:
+    """Rows of one datastore_search result page, values in `fields` order."""
+    records = result["records"]
+
+    if records_format == "csv":
+        if not isinstance(records, str):
+            raise ValueError("CKAN result['records'] is not a CSV string.")
+        rows = list(csv.reader(io.StringIO(records)))
+    elif not isinstance(records, list):
+        raise ValueError("CKAN result['records'] is not a list.")
+    elif records_format == "objects":
+        try:
+            return [[rec.get(f) for f in fields] for rec in records]
+        except AttributeError as e:
+            raise ValueError("CKAN records are not objects (check records_format).") from e
+    else:
+        rows = records
+
+    # lists/csv follow the order of result["fields"]; reorder if it differs from ours
+    returned = [f.get("id") for f in result.get("fields", [])]
+    if returned and returned != fields:
+        missing = [f for f in fields if f not in returned]
+        if missing:
+            raise ValueError(f"CKAN response is missing fields {missing}. Returned={returned}")
+        pos = [returned.index(f) for f in fields]
+        rows = [[row[i] for i in pos] for row in rows]
+
+    bad = next((i for i, row in enumerate(rows) if len(row) != len(fields)), None)
+    if bad is not None:
+        raise ValueError(f"CKAN row {bad} has {len(rows[bad])} values, expected {len(fields)} ({fields}).")
+    return rows
+
+
+def to_columns(
+    rows: list[list],
+    fields: list[str],
+    types: dict[str, Callable],
+    required: tuple[str, ...] = (),
+) -> dict[str, list]:
+    """
+    Transpose rows into columns and convert each column in one pass:
+
+        to_columns(rows, ["year", "period"], {"year": int, "period": str}, required=("year",))
+    """
+    columns = dict(zip(fields, map(list, zip(*rows)))) if rows else {f: [] for f in fields}
+
+    for name in fields:
+        convert = types.get(name, str)
+        values = columns[name]
+        try:
+            columns[name] = [None if v is None or v == "" else convert(v) for v in values]
+        except (TypeError, ValueError):
+            bad = next(i for i, v in enumerate(values) if not _converts(convert, v))
+            raise ValueError(f"Bad value in column '{name}' at row {bad}: {values[bad]!r}") from None
+
+        if name in required and None in columns[name]:
+            raise ValueError(f"Column '{name}' is required but row {columns[name].index(None)} is empty.")
+
+    return columns
+
+
+def _converts(convert: Callable, value) -> bool:
+    if value is None or value == "":
+        return True
+    try:
+        convert(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def extend_columns(columns: dict[str, list], more: dict[str, list]) -> dict[str, list]:
+    """Append the values of `more` to `columns` (same keys). Returns `columns`."""
+    for name, values in more.items():
+        columns.setdefault(name, []).extend(values)
+    return columns
+
+
+def column_params(columns: dict[str, list]) -> list[dict]:
+    """Columns → one param dict per row (for `conn.execute(sql, [...])`)."""
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+class RateLimiter:
+    """
+    Spaces requests at least 1 / per_second apart across all threads that share it:
+
+        limiter = RateLimiter(8)
+        limiter.wait()          # before every request
+
+    `per_second` may be a callable, read at every wait(), so a script's Config value can be
+    changed after import: RateLimiter(lambda: MAX_REQUESTS_PER_SEC). None / 0 = no limit.
+    """
+
+    def __init__(self, per_second: float | None | Callable[[], float | None]):
+        self.per_second = per_second
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def interval(self) -> float:
+        rate = self.per_second() if callable(self.per_second) else self.per_second
+        return 1.0 / rate if rate else 0.0
+
+    def wait(self) -> None:
+        interval = self.interval
+        if not interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
@@ -0,0 +1,374 @@
+"""
+One non-interactive command line for all four projects (fast start, cron-friendly)
+
+Usage
+-----
+    python -m gis_common.cli --help
+    python -m gis_common.cli traffic pipeline --lgas Blacktown "The Hills Shire"
+    python -m gis_common.cli coverage run --dag
+    python -m gis_common.cli zone-review slices --cadastre cad.gpkg --zoning zone.gpkg --out out/slices.gpkg
+    python -m gis_common.cli zone-review postgis --tabular parquet --out out/report
+    python -m gis_common.cli clip file --cadastre cad.gpkg --suburbs sub.gpkg --suburb "Marsden Park" --out out/mp.gpkg
+    python -m gis_common.cli clip postgis --suburb "MARSDEN PARK" --out-dir out/
+    python -m gis_common.cli clip serve --source postgis --port 8765
+    python -m gis_common.cli --dry-run clip file ...            # check arguments, run nothing
+
+What this module does
+---------------------
+- Parses arguments with only the standard library loaded. A script (and with it geopandas,
+  sqlalchemy, requests, ...) is imported only when its subcommand runs, and DB engines are
+  created by the scripts when they first need one. `--help`, `--dry-run` and argument
+  errors return at once.
+- Options override the script's Config constants (e.g. `--lgas` → LGAS), the same way
+  benchmarks/run_benchmarks.py does; everything else keeps the script's defaults.
+- Each command calls the script's functions directly: no input() prompts, no Tk dialogs.
+  Failures exit non-zero with the traceback.
+
+Notes
+-----
+- The DB scripts still read `db_config_local.py` from their own scripts/ folder.
+- `--dry-run` prints the script and the Config overrides, and checks that input paths
+  exist and output formats are supported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+VECTOR_EXTS = ("shp", "gpkg", "geojson")
+TABLE_EXTS = ("csv", "parquet")
+
+
+# ----------------------------
+# Script loading (lazy)
+# ----------------------------
+def load_script(project: str, filename: str) -> types.ModuleType:
+    """Import <project>/scripts/<filename> by path (its folder goes on sys.path for siblings + db_config_local)."""
+    path = REPO_ROOT / project / "scripts" / filename
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[path.stem] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def prepare(args, project: str, filename: str, overrides: dict | None = None) -> types.ModuleType | None:
+    """
+    Load a script and set its Config overrides ("step1.LGAS" sets LGAS on the script's
+    `step1` module). Returns None for --dry-run, after printing what would run.
+    """
+    overrides = {k: v for k, v in (overrides or {}).items() if v is not None}
+    print(f"{project}/scripts/{filename}" + "".join(f"\n  {k} = {v!r}" for k, v in overrides.items()))
+    if args.dry_run:
+        print("dry run: nothing executed")
+        return None
+
+    module = load_script(project, filename)
+    for name, value in overrides.items():
+        *owner_path, attr = name.split(".")
+        owner = module
+        for part in owner_path:
+            owner = getattr(owner, part)
+        if not hasattr(owner, attr):
+            raise AttributeError(f"{filename} has no setting '{name}'")
+        setattr(owner, attr, value)
+    return module
+
+
+def instr_run(name: str):
+    from gis_common import instrumentation as instr
+
+    return instr.run(name)
+
+
+# ----------------------------
+# Argument helpers
+# ----------------------------
+def existing_path(value: str) -> Path:
+    path = Path(value)
+    if not path.exists():
+        raise argparse.ArgumentTypeError(f"path does not exist: {value}")
+    return path
+
+
+def output_file(*allowed: str):
+    """argparse type: an output file whose extension is in `allowed`; the folder must exist."""
+    def parse(value: str) -> Path:
+        path = Path(value)
+        ext = path.suffix.lower().lstrip(".")
+        if ext not in allowed:
+            raise argparse.ArgumentTypeError(f"output extension must be one of {allowed}, got '{ext or value}'")
+        if not path.parent.is_dir():
+            raise argparse.ArgumentTypeError(f"output folder does not exist: {path.parent}")
+        return path
+    return parse
+
+
+def add_spatial_order(p: argparse.ArgumentParser, choices=("hilbert", "cluster")) -> None:
+    p.add_argument("--spatial-order", choices=choices,
+                   help="write rows in spatial order (see gis_common/spatial_order.py)")
+
+
+def add_tiles(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--tiles", metavar="OUT", help="also export vector tiles: <file>.mbtiles or a folder")
+
+
+def lga_list(values: list[str] | None):
+    if not values:
+        return None
+    return "all" if values == ["all"] else values
+
+
+# ----------------------------
+# Commands
+# ----------------------------
+def traffic_stations(args) -> int:
+    mod = prepare(args, "bcc-traffic-pipeline", "step_1_station_reference_V1.py", {
+        "LGAS": lga_list(args.lgas), "MAX_WORKERS": args.workers,
+    })
+    if mod is None:
+        return 0
+    with instr_run("traffic_step_1_station_reference"):
+        mod.main()
+    return 0
+
+
+def traffic_yearly(args) -> int:
+    mod = prepare(args, "bcc-traffic-pipeline", "step_2_yearly_summary_V1.py", {
+        "LGAS": lga_list(args.lgas), "MAX_WORKERS": args.workers,
+        "REFRESH_SUMMARIES": False if args.no_summaries else None,
+        "REBUILD_SUMMARIES": True if args.rebuild_summaries else None,
+    })
+    if mod is None:
+        return 0
+    with instr_run("traffic_step_2_yearly_summary"):
+        mod.main()
+    return 0
+
+
+def traffic_pipeline(args) -> int:
+    lgas = lga_list(args.lgas)
+    mod = prepare(args, "bcc-traffic-pipeline", "run_pipeline_V1.py", {
+        "step1.LGAS": lgas, "step2.LGAS": lgas, "step1.MAX_WORKERS": args.workers,
+        "FORCE": True if args.force else None,
+        "step2.REFRESH_SUMMARIES": False if args.no_summaries else None,
+    })
+    if mod is None:
+        return 0
+    with instr_run("traffic_pipeline"):
+        mod.main()
+    return 0
+
+
+def coverage_run(args) -> int:
+    mod = prepare(args, "bcc-busstops-paths-coverage", "busstops_paths_coverage_V1.py", {
+        "INCREMENTAL_DERIVE": True if args.incremental else None,
+        "KPI_SUBURBS": args.suburbs,
+        "DAG_WORKERS": args.workers,
+        "SPATIAL_ORDER": args.spatial_order,
+        "TILES_OUT": args.tiles,
+        "KPI_ENGINE": "raster" if args.raster_cell else None,
+        "RASTER_CELL_M": args.raster_cell,
+    })
+    if mod is None:
+        return 0
+    with instr_run("busstops_paths_coverage"):
+        mod.main_dag(force=args.force) if args.dag else mod.main()
+    return 0
+
+
+def zone_review_slices(args) -> int:
+    mod = prepare(args, "zone_review", "extract_slices_V1.py", {
+        "USE_CACHE": False if args.no_cache else None,
+        "INCREMENTAL": True if args.incremental else None,
+        "SPATIAL_ORDER": args.spatial_order,
+        "TILES_OUT": args.tiles,
+    })
+    if mod is None:
+        return 0
+
+    out = args.out
+    ext = out.suffix.lower().lstrip(".")
+    with instr_run("zone_review_extract_slices"):
+        if ext in TABLE_EXTS:
+            out_path = mod.get_multi_zone_report(args.cadastre, args.zoning, out.parent, out.stem, ext)
+        else:
+            out_path = mod.get_multi_zone_slices(args.cadastre, args.zoning, out.parent, out.stem, ext)
+    print(f"The output has been exported to {out_path}")
+    return 0
+
+
+def zone_review_postgis(args) -> int:
+    mod = prepare(args, "zone_review", "extract_slices_postgis_V1.py", {
+        "OUT_PATH": str(args.out),
+        "TABULAR": True if args.tabular else None,
+        "TABULAR_EXT": args.tabular,
+        "INCREMENTAL": True if args.incremental else None,
+        "SPATIAL_ORDER": args.spatial_order,
+        "TILES_OUT": args.tiles,
+    })
+    if mod is None:
+        return 0
+    with instr_run("zone_review_extract_slices_postgis"):
+        mod.main()
+    return 0
+
+
+def clip_file(args) -> int:
+    mod = prepare(args, "clip_cadastre_by_suburb", "clip_cadastre_by_suburb_V1.py", {
+        "USE_CACHE": False if args.no_cache else None,
+        "SPATIAL_ORDER": args.spatial_order,
+    })
+    if mod is None:
+        return 0
+
+    out = args.out
+    with instr_run("clip_cadastre_by_suburb"):
+        out_path = mod.clip_cadastre_to_suburb(
+            args.cadastre, args.suburbs, args.suburb, out.parent, out.stem, out.suffix.lstrip(".")
+        )
+    print(f"Exported to: {out_path}")
+    return 0
+
+
+def clip_postgis(args) -> int:
+    mod = prepare(args, "clip_cadastre_by_suburb", "clip_cadastre_postgis_V1.py", {
+        "STAGED_LOAD": True if args.staged else None,
+        "SPATIAL_ORDER": args.spatial_order,
+    })
+    if mod is None:
+        return 0
+
+    suburb = args.suburb.strip().upper()
+    with instr_run("clip_cadastre_postgis"):
+        gdf = mod.clip_cadastre_by_suburb(suburb)
+        out_path = mod.export_suburb(suburb, gdf, out_dir=args.out_dir, write_back=not args.no_write_back)
+    print(f"Exported to: {out_path}")
+    return 0
+
+
+def clip_serve(args) -> int:
+    mod = prepare(args, "clip_cadastre_by_suburb", "clip_service_V1.py", {
+        "SOURCE": args.source, "CADASTRE_PATH": args.cadastre, "SUBURBS_PATH": args.suburbs,
+    })
+    if mod is None:
+        return 0
+    mod.serve(args.host, args.port)
+    return 0
+
+
+# ----------------------------
+# Parser
+# ----------------------------
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m gis_common.cli",
+        description="Run the GIS pipelines without prompts (heavy imports load only for the chosen command).",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="check arguments and print what would run")
+    projects = parser.add_subparsers(dest="project", required=True, metavar="PROJECT")
+
+    # traffic
+    traffic = projects.add_parser("traffic", help="bcc-traffic-pipeline (CKAN → PostGIS)")
+    traffic_cmds = traffic.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    for name, func, help_text in (
+        ("stations", traffic_stations, "Step 1: station reference"),
+        ("yearly", traffic_yearly, "Step 2: yearly summary (+ summary tables)"),
+        ("pipeline", traffic_pipeline, "Steps 1 + 2 as a task graph (skips unchanged LGAs)"),
+    ):
+        p = traffic_cmds.add_parser(name, help=help_text)
+        p.add_argument("--lgas", nargs="+", metavar="LGA", help='LGA names, or "all" (default: script setting)')
+        p.add_argument("--workers", type=int, help="LGAs loaded concurrently")
+        if name != "stations":
+            p.add_argument("--no-summaries", action="store_true", help="skip the summary table refresh")
+        if name == "yearly":
+            p.add_argument("--rebuild-summaries", action="store_true", help="refresh summaries for every station")
+        if name == "pipeline":
+            p.add_argument("--force", action="store_true", help="run every task, ignoring stored keys")
+        p.set_defaults(func=func)
+
+    # coverage
+    coverage = projects.add_parser("coverage", help="bcc-busstops-paths-coverage (ArcGIS → PostGIS KPIs)")
+    coverage_cmds = coverage.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    p = coverage_cmds.add_parser("run", help="fetch, load, derive and report the KPIs")
+    p.add_argument("--dag", action="store_true", help="run as a task graph (skips unchanged layers)")
+    p.add_argument("--force", action="store_true", help="with --dag: run every task")
+    p.add_argument("--incremental", action="store_true", help="incremental derive when possible")
+    p.add_argument("--suburbs", nargs="+", metavar="SUBURB", help="only refresh these suburbs' KPI rows")
+    p.add_argument("--workers", type=int, help="with --dag: tasks run concurrently")
+    p.add_argument(
+        "--raster-cell", type=float, metavar="M",
+        help="approximate LGA KPI on an M-metre grid (with error bounds) instead of C2–C4",
+    )
+    add_spatial_order(p)
+    add_tiles(p)
+    p.set_defaults(func=coverage_run)
+
+    # zone_review
+    zone = projects.add_parser("zone-review", help="zone_review (multi-zone lot slices)")
+    zone_cmds = zone.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    p = zone_cmds.add_parser("slices", help="GeoPandas version (files in, file out)")
+    p.add_argument("--cadastre", type=existing_path, required=True)
+    p.add_argument("--zoning", type=existing_path, required=True)
+    p.add_argument("--out", type=output_file(*VECTOR_EXTS, *TABLE_EXTS), required=True,
+                   help="output file; .csv / .parquet write the report without geometry")
+    p.add_argument("--incremental", action="store_true", help="patch the previous run's result")
+    p.add_argument("--no-cache", action="store_true", help="do not use the GeoParquet cache")
+    add_spatial_order(p, ("hilbert",))
+    add_tiles(p)
+    p.set_defaults(func=zone_review_slices)
+
+    p = zone_cmds.add_parser("postgis", help="PostGIS version")
+    p.add_argument("--out", type=Path, required=True, help="output path (tabular: extension is added)")
+    p.add_argument("--tabular", choices=TABLE_EXTS, help="write the report without geometry")
+    p.add_argument("--incremental", action="store_true", help="patch zone_review.multi_zone_slices in place")
+    add_spatial_order(p)
+    add_tiles(p)
+    p.set_defaults(func=zone_review_postgis)
+
+    # clip
+    clip = projects.add_parser("clip", help="clip_cadastre_by_suburb")
+    clip_cmds = clip.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    p = clip_cmds.add_parser("file", help="GeoPandas version (files in, file out)")
+    p.add_argument("--cadastre", type=existing_path, required=True)
+    p.add_argument("--suburbs", type=existing_path, required=True)
+    p.add_argument("--suburb", required=True, help="value of the 'suburbname' field (any case)")
+    p.add_argument("--out", type=output_file(*VECTOR_EXTS), required=True)
+    p.add_argument("--no-cache", action="store_true", help="do not use the GeoParquet cache")
+    add_spatial_order(p, ("hilbert",))
+    p.set_defaults(func=clip_file)
+
+    p = clip_cmds.add_parser("postgis", help="PostGIS version (gpkg + write-back)")
+    p.add_argument("--suburb", required=True)
+    p.add_argument("--out-dir", type=existing_path, help="folder for <SUBURB>_cadastre.gpkg (default: script setting)")
+    p.add_argument("--no-write-back", action="store_true", help="only write the gpkg")
+    p.add_argument("--staged", action="store_true", help="staged load + rename swap for the write-back")
+    add_spatial_order(p)
+    p.set_defaults(func=clip_postgis)
+
+    p = clip_cmds.add_parser("serve", help="in-memory clip service (HTTP, localhost)")
+    p.add_argument("--source", choices=("file", "postgis"))
+    p.add_argument("--cadastre", type=existing_path)
+    p.add_argument("--suburbs", type=existing_path)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.set_defaults(func=clip_serve)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    sys.path.insert(0, str(REPO_ROOT))  # scripts import gis_common from the repo root
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
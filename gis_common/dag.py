@@ -0,0 +1,204 @@
+"""
+Small dependency-aware task runner (DAG) for the pipeline scripts
+
+What this module does
+---------------------
+- `Task(name, fn, deps=...)`   one pipeline stage; fn is called with its deps' results
+- `run_dag(name, tasks)`       runs every task as soon as its deps are done, on a thread pool,
+                               and skips tasks whose inputs have not changed since the last
+                               successful run
+
+Skipping unchanged inputs
+-------------------------
+Every task gets a key:
+- source task (no deps): `fingerprint()` (e.g. a layer's count + last edit date); without a
+  fingerprint the task always runs
+- other tasks: their deps' keys (+ `fingerprint()` if given, e.g. config that changes output)
+
+A task whose key equals the key stored after its last successful run is skipped, and so is
+its result (None). A task that needs its deps' in-memory results (`uses_results=True`, e.g.
+load after fetch) forces those deps to run. Keys are stored in a JSON state file
+(GIS_DAG_STATE_DIR, default <repo>/.dag_state/<name>.json).
+
+Notes
+-----
+- Each task runs inside `instrumentation.stage(name, kind)`.
+- A failed task blocks its dependents; independent branches still finish. The runner
+  raises at the end, listing failed and blocked tasks.
+- `always_run=True` (or a failing fingerprint) makes the task and all its dependents run.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from gis_common import instrumentation as instr
+
+STATE_DIR = Path(os.environ.get("GIS_DAG_STATE_DIR", Path(__file__).resolve().parents[1] / ".dag_state"))
+
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[..., Any]
+    deps: tuple[str, ...] = ()
+    kind: str = "other"
+    fingerprint: Callable[[], str] | None = None
+    uses_results: bool = False
+    always_run: bool = False
+
+
+# ----------------------------
+# Graph helpers
+# ----------------------------
+def topo_order(tasks: list[Task]) -> list[Task]:
+    """Tasks in dependency order (declaration order among independent tasks)."""
+    by_name = {t.name: t for t in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Duplicate task names in DAG.")
+    for t in tasks:
+        unknown = [d for d in t.deps if d not in by_name]
+        if unknown:
+            raise ValueError(f"Task '{t.name}' depends on unknown task(s) {unknown}")
+
+    order: list[Task] = []
+    done: set[str] = set()
+    remaining = list(tasks)
+    while remaining:
+        ready = [t for t in remaining if all(d in done for d in t.deps)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between {[t.name for t in remaining]}")
+        for t in ready:
+            order.append(t)
+            done.add(t.name)
+        remaining = [t for t in remaining if t.name not in done]
+    return order
+
+
+def task_keys(order: list[Task]) -> dict[str, str | None]:
+    """Input key per task (None = always run)."""
+    keys: dict[str, str | None] = {}
+    for t in order:
+        if t.always_run or (not t.deps and t.fingerprint is None) or any(keys[d] is None for d in t.deps):
+            keys[t.name] = None
+            continue
+        try:
+            fp = t.fingerprint() if t.fingerprint else ""
+        except Exception as e:
+            print(f"[dag] {t.name}: fingerprint failed ({e!r}), will run")
+            keys[t.name] = None
+            continue
+        parts = [t.name, str(fp)] + [keys[d] for d in t.deps]
+        keys[t.name] = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return keys
+
+
+def load_state(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(path: Path, state: dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _run_task(task: Task, inputs: list) -> Any:
+    with instr.stage(task.name, task.kind):
+        return task.fn(*inputs)
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def run_dag(
+    name: str,
+    tasks: list[Task],
+    max_workers: int = 4,
+    state_path: str | Path | None = None,
+    force: bool = False,
+) -> dict[str, Any]:
+    """
+    Run `tasks` respecting their deps, up to `max_workers` at a time.
+    force=True ignores the stored keys (runs everything). Returns {task name: result}.
+    """
+    order = topo_order(tasks)
+    by_name = {t.name: t for t in order}
+    state_path = Path(state_path) if state_path else STATE_DIR / f"{name}.json"
+    state = load_state(state_path)
+
+    keys = task_keys(order)
+    skip = {n for n, k in keys.items() if not force and k is not None and state.get(n) == k}
+    # a running task that consumes its deps' results needs them computed
+    for t in reversed(order):
+        if t.name not in skip and t.uses_results:
+            skip.difference_update(t.deps)
+
+    results: dict[str, Any] = {}
+    status: dict[str, str] = {}
+    errors: dict[str, BaseException] = {}
+    pending = [t.name for t in order]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running: dict = {}
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for n in list(pending):
+                    t = by_name[n]
+                    if any(status.get(d) in ("failed", "blocked") for d in t.deps):
+                        status[n] = "blocked"
+                    elif all(status.get(d) in ("ok", "skipped") for d in t.deps):
+                        if n in skip:
+                            status[n] = "skipped"
+                            results[n] = None
+                            print(f"[dag] {n}: inputs unchanged, skipped")
+                        else:
+                            running[pool.submit(_run_task, t, [results[d] for d in t.deps])] = n
+                            status[n] = "running"
+                    else:
+                        continue
+                    pending.remove(n)
+                    progressed = True
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n = running.pop(fut)
+                try:
+                    results[n] = fut.result()
+                except Exception as e:
+                    status[n] = "failed"
+                    errors[n] = e
+                    state.pop(n, None)
+                    print(f"[dag] {n}: FAILED ({e!r})")
+                else:
+                    status[n] = "ok"
+                    if keys[n] is None:
+                        state.pop(n, None)
+                    else:
+                        state[n] = keys[n]
+                    print(f"[dag] {n}: done")
+                save_state(state_path, state)
+
+    counts = {s: sum(1 for v in status.values() if v == s) for s in ("ok", "skipped", "failed", "blocked")}
+    print(f"[dag] {name}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+    if errors:
+        blocked = sorted(n for n, s in status.items() if s == "blocked")
+        raise RuntimeError(f"DAG '{name}': failed={sorted(errors)} blocked={blocked}") from next(iter(errors.values()))
+
+    return results
@@ -0,0 +1,274 @@
+"""
+Stage timing and resource instrumentation (shared by all scripts)
+
+What this module does
+---------------------
+- `run(name)`            wraps a whole script run (totals + output files)
+- `stage(name, kind)`    times one pipeline stage (fetch / load / derive / kpi / ...)
+- `record_http(resp)`    counts one HTTP response (requests + bytes)
+- `record_rows(n)`       counts rows written that SQLAlchemy cannot see (e.g. to_postgis COPY)
+- `instrument_engine()`  hooks a SQLAlchemy engine: query count, query seconds, rows written
+
+Per stage it records wall time, CPU time, peak RSS, HTTP requests/bytes, DB queries,
+query seconds and rows written. Every finished stage is emitted as one JSON line
+(to `jsonl_path`, or stderr when not set). With `trace_path` the run is also written
+as a Chrome trace (open in chrome://tracing or https://ui.perfetto.dev).
+
+Notes
+-----
+- Output paths default to the env vars GIS_METRICS_JSONL / GIS_METRICS_TRACE, so cron
+  jobs can switch them on without code changes.
+- Stages nest. Counters go to every open stage of the current thread/context and to
+  the run totals. Work on worker threads without an open stage only counts in run totals.
+- CPU time is process-wide (all threads); peak RSS is the process high-water mark,
+  so `rss_growth_mb` shows which stage pushed it up.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+try:
+    import resource  # Unix only
+except ImportError:  # Windows
+    resource = None
+
+
+# ----------------------------
+# Memory helper
+# ----------------------------
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    mem = psutil.Process().memory_info()
+    return round(getattr(mem, "peak_wset", mem.rss) / (1024 * 1024), 1)
+
+
+# ----------------------------
+# Records
+# ----------------------------
+@dataclass
+class Counters:
+    http_requests: int = 0
+    http_bytes: int = 0
+    db_queries: int = 0
+    db_query_s: float = 0.0
+    db_rows: int = 0
+
+
+@dataclass
+class StageRecord:
+    run: str
+    stage: str
+    kind: str
+    start: float
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: float | None = None
+    rss_growth_mb: float | None = None
+    status: str = "ok"
+    counters: Counters = field(default_factory=Counters)
+    attrs: dict = field(default_factory=dict)
+
+    def to_json(self) -> dict:
+        out = asdict(self)
+        out.update(out.pop("counters"))
+        out["db_query_s"] = round(out["db_query_s"], 4)
+        out["event"] = "stage"
+        return out
+
+
+class Recorder:
+    """Collects stage records for one run and writes JSON lines / Chrome trace."""
+
+    def __init__(self, name: str, jsonl_path: str | None = None, trace_path: str | None = None):
+        self.name = name
+        self.jsonl_path = jsonl_path
+        self.trace_path = trace_path
+        self.totals = Counters()
+        self.stages: list[StageRecord] = []
+        self.t0 = time.perf_counter()
+        self.epoch0 = time.time()
+        self.cpu0 = time.process_time()
+        self._lock = threading.Lock()
+        self._trace_events: list[dict] = []
+
+    # counters ------------------------------------------------------------
+    def add(self, **deltas) -> None:
+        """Add counter deltas to the run totals and to every open stage."""
+        targets = [self.totals] + [rec.counters for rec in _stage_stack.get()]
+        with self._lock:
+            for target in targets:
+                for k, v in deltas.items():
+                    setattr(target, k, getattr(target, k) + v)
+
+    # output --------------------------------------------------------------
+    def emit(self, record: dict) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                print(line, file=sys.stderr)
+
+    def add_trace_event(self, rec: StageRecord) -> None:
+        with self._lock:
+            self._trace_events.append(
+                {
+                    "name": rec.stage,
+                    "cat": rec.kind,
+                    "ph": "X",
+                    "ts": int((rec.start - self.epoch0) * 1e6),
+                    "dur": int(rec.wall_s * 1e6),
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": {k: v for k, v in rec.to_json().items() if k not in ("run", "stage", "kind", "event")},
+                }
+            )
+
+    def close(self, status: str = "ok") -> dict:
+        """Emit the run summary (and write the trace file). Returns the summary dict."""
+        summary = {
+            "event": "run",
+            "run": self.name,
+            "status": status,
+            "wall_s": round(time.perf_counter() - self.t0, 4),
+            "cpu_s": round(time.process_time() - self.cpu0, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            **asdict(self.totals),
+            "stages": len(self.stages),
+        }
+        summary["db_query_s"] = round(summary["db_query_s"], 4)
+        self.emit(summary)
+
+        if self.trace_path:
+            with open(self.trace_path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": self._trace_events, "otherData": summary}, f, default=str)
+
+        return summary
+
+
+# The active recorder (one per process) and the open stages, outermost first (per context)
+_recorder: Recorder | None = None
+_stage_stack: contextvars.ContextVar[tuple[StageRecord, ...]] = contextvars.ContextVar("stages", default=())
+
+
+def get_recorder() -> Recorder:
+    """Return the active recorder, creating an unnamed one on first use."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(os.path.basename(sys.argv[0]) or "run")
+    return _recorder
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+@contextmanager
+def run(name: str, jsonl_path: str | None = None, trace_path: str | None = None):
+    """
+    Instrument a whole script run:
+
+        with instr.run("busstops_paths_coverage"):
+            main()
+    """
+    global _recorder
+    rec = Recorder(
+        name,
+        jsonl_path=jsonl_path or os.environ.get("GIS_METRICS_JSONL"),
+        trace_path=trace_path or os.environ.get("GIS_METRICS_TRACE"),
+    )
+    _recorder = rec
+    status = "ok"
+    try:
+        yield rec
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        rec.close(status)
+
+
+@contextmanager
+def stage(name: str, kind: str = "other", **attrs):
+    """
+    Time one stage. `kind` groups stages (fetch / load / derive / kpi / ...); extra
+    keyword args (e.g. station_key=...) are stored with the record.
+    """
+    rec_owner = get_recorder()
+    rss_start = peak_rss_mb()
+    rec = StageRecord(run=rec_owner.name, stage=name, kind=kind, start=time.time(), attrs=attrs)
+    token = _stage_stack.set(_stage_stack.get() + (rec,))
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    try:
+        yield rec
+    except BaseException:
+        rec.status = "error"
+        raise
+    finally:
+        _stage_stack.reset(token)
+        rec.wall_s = round(time.perf_counter() - t0, 4)
+        rec.cpu_s = round(time.process_time() - cpu0, 4)
+        rec.peak_rss_mb = peak_rss_mb()
+        if rss_start is not None and rec.peak_rss_mb is not None:
+            rec.rss_growth_mb = round(rec.peak_rss_mb - rss_start, 1)
+
+        with rec_owner._lock:
+            rec_owner.stages.append(rec)
+        rec_owner.emit(rec.to_json())
+        rec_owner.add_trace_event(rec)
+
+
+def record_http(resp) -> None:
+    """Count one HTTP response (a `requests.Response`)."""
+    get_recorder().add(http_requests=1, http_bytes=len(resp.content or b""))
+
+
+def record_rows(n: int) -> None:
+    """Count rows written outside SQLAlchemy's cursor events (e.g. to_postgis / COPY)."""
+    get_recorder().add(db_rows=int(n))
+
+
+_WRITE_SQL = re.compile(r"^\s*CREATE\b|\b(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+def instrument_engine(engine):
+    """
+    Attach query timing to a SQLAlchemy engine. Every statement adds to db_queries and
+    db_query_s; INSERT / UPDATE / DELETE / CREATE ... AS statements also add their
+    rowcount to db_rows.
+    Returns the engine so it can wrap `create_engine(...)` inline.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("gis_query_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["gis_query_t0"].pop()
+        rows = 0
+        if _WRITE_SQL.search(statement) and (cursor.rowcount or 0) > 0:
+            rows = cursor.rowcount
+        get_recorder().add(db_queries=1, db_query_s=elapsed, db_rows=rows)
+
+    return engine
@@ -0,0 +1,468 @@
+"""
+Vector tile (MVT) pyramid export for pipeline outputs (PostGIS or files, parallel, incremental)
+
+What this module does
+---------------------
+- `Layer(name, source, ...)`                one MVT layer: a PostGIS table or a GIS file
+- `export_postgis(engine, layers, out)`     tiles from ST_AsMVT / ST_AsMVTGeom, tile batches
+                                            rendered on a thread pool (one connection each)
+- `export_files(layers, out)`               same pyramid in-process (mapbox_vector_tile), tile
+                                            batches rendered on a process pool
+- `out` ending in .mbtiles                  → MBTiles (SQLite, gzip tiles)
+  anything else                             → directory of {z}/{x}/{y}.pbf + metadata.json
+
+Incremental export
+------------------
+Each layer keeps a state of its rows: key → (hash of the rows, bbox in EPSG:3857).
+- PostGIS: table <schema>.<table>_tile_state; files: <out>.state/<layer>.parquet
+- On the next run only rows whose key is new, gone or changed are "dirty"; the tiles
+  their old and new bboxes touch (at every zoom, incl. the tile buffer) are rendered again,
+  tiles that came out empty are deleted, and every other tile is left as it is.
+- No state yet (or incremental=False): the whole pyramid is rebuilt.
+- A layer without a key is one unit: any change re-renders all of its tiles (fine for
+  small layers such as the dissolved coverage polygon).
+The state is replaced only after all tiles are written, so a failed run is redone in full
+on the next run.
+
+Notes
+-----
+- Tiles use the XYZ scheme in EPSG:3857 (extent 4096, buffer 64 px). A tile holds every
+  layer whose [minzoom, maxzoom] contains its zoom.
+- PostGIS needs >= 3.1 (ST_TileEnvelope with margin).
+- export_files needs `mapbox_vector_tile` (and pyarrow for the incremental state). Every
+  worker process reads the layers once.
+- A directory pyramid is only cleared for a full rebuild when it has our metadata.json.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+from gis_common import instrumentation as instr
+
+EXTENT = 4096
+BUFFER = 64
+BATCH_SIZE = 64
+ORIGIN = 20037508.342789244  # half the EPSG:3857 world width (m)
+
+
+@dataclass
+class Layer:
+    name: str                      # MVT layer name
+    source: str                    # PostGIS "schema.table", or a file path (export_files)
+    columns: tuple[str, ...] = ()  # attributes written into the tiles
+    key: str | None = None         # row identity for incremental diffs (None = whole layer)
+    geom: str = "geom"             # PostGIS geometry column
+    minzoom: int = 10
+    maxzoom: int = 16
+
+
+# ----------------------------
+# Tile math (XYZ, EPSG:3857)
+# ----------------------------
+def tile_size(z: int) -> float:
+    return 2 * ORIGIN / (1 << z)
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(minx, miny, maxx, maxy) of a tile in EPSG:3857."""
+    size = tile_size(z)
+    return (-ORIGIN + x * size, ORIGIN - (y + 1) * size, -ORIGIN + (x + 1) * size, ORIGIN - y * size)
+
+
+def tiles_for_box(box, z: int) -> list[tuple[int, int, int]]:
+    """Tiles at zoom z whose buffered extent touches `box` (EPSG:3857 minx, miny, maxx, maxy)."""
+    size = tile_size(z)
+    pad = size * BUFFER / EXTENT
+    last = (1 << z) - 1
+    minx, miny, maxx, maxy = box
+    x0 = max(0, math.floor((minx - pad + ORIGIN) / size))
+    x1 = min(last, math.floor((maxx + pad + ORIGIN) / size))
+    y0 = max(0, math.floor((ORIGIN - maxy - pad) / size))
+    y1 = min(last, math.floor((ORIGIN - miny + pad) / size))
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def tiles_for_boxes(boxes_by_layer: dict[str, list], layers: list[Layer]) -> list[tuple[int, int, int]]:
+    """Sorted union of the tiles touched by each layer's boxes, within the layer's zooms."""
+    tiles: set[tuple[int, int, int]] = set()
+    for layer in layers:
+        for box in boxes_by_layer.get(layer.name, ()):
+            if box is None or any(v is None or (isinstance(v, float) and math.isnan(v)) for v in box):
+                continue
+            for z in range(layer.minzoom, layer.maxzoom + 1):
+                tiles.update(tiles_for_box(box, z))
+    return sorted(tiles)
+
+
+def batches(tiles: list, size: int = BATCH_SIZE) -> list[list]:
+    return [tiles[i:i + size] for i in range(0, len(tiles), size)]
+
+
+# ----------------------------
+# Sinks
+# ----------------------------
+class DirectorySink:
+    """{z}/{x}/{y}.pbf files (uncompressed) + metadata.json."""
+
+    def __init__(self, path: Path, full: bool, zooms: range):
+        self.path = path
+        self.meta = path / "metadata.json"
+        if full and self.meta.exists():
+            for z in zooms:
+                shutil.rmtree(path / str(z), ignore_errors=True)
+        path.mkdir(parents=True, exist_ok=True)
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        tile = self.path / str(z) / str(x) / f"{y}.pbf"
+        tile.parent.mkdir(parents=True, exist_ok=True)
+        tile.write_bytes(data)
+
+    def delete(self, z: int, x: int, y: int) -> None:
+        (self.path / str(z) / str(x) / f"{y}.pbf").unlink(missing_ok=True)
+
+    def close(self, metadata: dict) -> None:
+        self.meta.write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+
+
+class MBTilesSink:
+    """MBTiles 1.3 (TMS rows, gzip-compressed pbf tiles). Written from one thread only."""
+
+    def __init__(self, path: Path, full: bool, zooms: range):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS tiles (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                PRIMARY KEY (zoom_level, tile_column, tile_row)
+            );
+            """
+        )
+        if full:
+            self.db.execute("DELETE FROM tiles WHERE zoom_level BETWEEN ? AND ?", (zooms.start, zooms.stop - 1))
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, gzip.compress(data))
+        )
+
+    def delete(self, z: int, x: int, y: int) -> None:
+        self.db.execute(
+            "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", (z, x, (1 << z) - 1 - y)
+        )
+
+    def close(self, metadata: dict) -> None:
+        rows = [(k, v if isinstance(v, str) else json.dumps(v)) for k, v in metadata.items()]
+        self.db.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", rows)
+        self.db.commit()
+        self.db.close()
+
+
+def open_sink(out, full: bool, layers: list[Layer]):
+    out = Path(out)
+    zooms = range(min(l.minzoom for l in layers), max(l.maxzoom for l in layers) + 1)
+    if out.suffix.lower() == ".mbtiles":
+        return MBTilesSink(out, full, zooms)
+    return DirectorySink(out, full, zooms)
+
+
+def metadata(name: str, layers: list[Layer]) -> dict:
+    return {
+        "name": name,
+        "format": "pbf",
+        "minzoom": str(min(l.minzoom for l in layers)),
+        "maxzoom": str(max(l.maxzoom for l in layers)),
+        "json": json.dumps({"vector_layers": [
+            {"id": l.name, "fields": {c: "String" for c in l.columns},
+             "minzoom": l.minzoom, "maxzoom": l.maxzoom}
+            for l in layers
+        ]}),
+    }
+
+
+def write_tiles(sink, results) -> dict:
+    """Put non-empty tiles, delete empty ones. `results` yields lists of ((z, x, y), bytes)."""
+    stats = {"tiles_written": 0, "tiles_empty": 0, "bytes": 0}
+    for batch in results:
+        for (z, x, y), data in batch:
+            if data:
+                sink.put(z, x, y, data)
+                stats["tiles_written"] += 1
+                stats["bytes"] += len(data)
+            else:
+                sink.delete(z, x, y)
+                stats["tiles_empty"] += 1
+    return stats
+
+
+# ----------------------------
+# PostGIS
+# ----------------------------
+def _split(source: str) -> tuple[str, str]:
+    schema, _, table = source.rpartition(".")
+    return schema or "public", table
+
+
+def _state_table(layer: Layer) -> str:
+    schema, table = _split(layer.source)
+    return f"{schema}.{table}_tile_state"
+
+
+def tile_sql(layer: Layer, srid: int) -> str:
+    cols = "".join(f't."{c}", ' for c in layer.columns)
+    return f"""
+        SELECT ST_AsMVT(q, '{layer.name}', {EXTENT}, 'geom')
+        FROM (
+            SELECT {cols}ST_AsMVTGeom(
+                ST_Transform(t.{layer.geom}, 3857), ST_TileEnvelope(:z, :x, :y), {EXTENT}, {BUFFER}, true
+            ) AS geom
+            FROM {layer.source} AS t
+            WHERE t.{layer.geom} && ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => {BUFFER / EXTENT}), {srid})
+        ) AS q
+        WHERE q.geom IS NOT NULL;
+    """
+
+
+def postgis_state(engine, layer: Layer, full: bool) -> list[tuple]:
+    """
+    Write the layer's current row state to <state>__next and return the dirty bboxes
+    (every bbox when `full`). The state is swapped in by commit_postgis_state().
+    """
+    from sqlalchemy import text
+
+    state = _state_table(layer)
+    key = f"t.{layer.key}::text" if layer.key else "''::text"
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {state} (
+                k text, row_hash text, minx float8, miny float8, maxx float8, maxy float8
+            );
+            DROP TABLE IF EXISTS {state}__next;
+            CREATE TABLE {state}__next AS
+            SELECT k, row_hash, ST_XMin(ext) AS minx, ST_YMin(ext) AS miny, ST_XMax(ext) AS maxx, ST_YMax(ext) AS maxy
+            FROM (
+                SELECT
+                    {key} AS k,
+                    md5(string_agg(md5(t::text), ',' ORDER BY md5(t::text))) AS row_hash,
+                    ST_Extent(ST_Transform(ST_Envelope(t.{layer.geom}), 3857)) AS ext
+                FROM {layer.source} AS t
+                GROUP BY 1
+            ) AS s;
+        """))
+
+        if full:
+            sql = f"SELECT minx, miny, maxx, maxy FROM {state}__next;"
+        else:
+            sql = f"""
+                SELECT n.minx, n.miny, n.maxx, n.maxy
+                FROM {state}__next AS n
+                WHERE NOT EXISTS (SELECT 1 FROM {state} AS s WHERE s.k = n.k AND s.row_hash = n.row_hash)
+                UNION ALL
+                SELECT s.minx, s.miny, s.maxx, s.maxy
+                FROM {state} AS s
+                WHERE NOT EXISTS (SELECT 1 FROM {state}__next AS n WHERE n.k = s.k AND n.row_hash = s.row_hash);
+            """
+        return [tuple(r) for r in conn.execute(text(sql)).all()]
+
+
+def commit_postgis_state(engine, layer: Layer) -> None:
+    from sqlalchemy import text
+
+    state = _state_table(layer)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {state}; ALTER TABLE {state}__next RENAME TO {_split(state)[1]};"))
+
+
+def _postgis_has_state(engine, layer: Layer) -> bool:
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        return bool(conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": _state_table(layer)}).scalar())
+
+
+def _render_postgis(engine, layers: list[Layer], srids: dict[str, int], tiles: list) -> list:
+    from sqlalchemy import text
+
+    statements = {l.name: text(tile_sql(l, srids[l.name])) for l in layers}
+    out = []
+    with engine.connect() as conn:
+        for z, x, y in tiles:
+            data = b""
+            for layer in layers:
+                if layer.minzoom <= z <= layer.maxzoom:
+                    mvt = conn.execute(statements[layer.name], {"z": z, "x": x, "y": y}).scalar()
+                    data += bytes(mvt or b"")  # layers concatenate into one tile
+            out.append(((z, x, y), data))
+    return out
+
+
+def export_postgis(engine, layers: list[Layer], out, workers: int = 4, incremental: bool = True,
+                   name: str = "tiles") -> dict:
+    """Build (or patch) the tile pyramid `out` from PostGIS tables. Returns counts."""
+    from sqlalchemy import text
+
+    full = not incremental or not all(_postgis_has_state(engine, l) for l in layers)
+    with instr.stage("tiles_diff", "derive", full=full):
+        boxes = {l.name: postgis_state(engine, l, full) for l in layers}
+        tiles = tiles_for_boxes(boxes, layers)
+        srids = {}
+        with engine.connect() as conn:
+            for l in layers:
+                srids[l.name] = conn.execute(
+                    text(f"SELECT ST_SRID({l.geom}) FROM {l.source} WHERE {l.geom} IS NOT NULL LIMIT 1;")
+                ).scalar() or 3857
+    print(f"[tiles] {'full build' if full else 'incremental'}: {len(tiles)} tiles to render")
+
+    sink = open_sink(out, full, layers)
+    with instr.stage("tiles_render", "write", tiles=len(tiles), workers=workers):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render_postgis, engine, layers, srids, b) for b in batches(tiles)]
+            stats = write_tiles(sink, (f.result() for f in as_completed(futures)))
+        sink.close(metadata(name, layers))
+
+    for l in layers:
+        commit_postgis_state(engine, l)
+    print(f"[tiles] {stats}")
+    return {"full": full, "tiles": len(tiles), **stats}
+
+
+# ----------------------------
+# Files (in-process)
+# ----------------------------
+_worker_layers: dict = {}
+
+
+def _read_3857(layer: Layer):
+    import geopandas as gpd
+
+    path = Path(layer.source)
+    gdf = gpd.read_parquet(path) if path.suffix.lower() == ".parquet" else gpd.read_file(path)
+    keep = list(dict.fromkeys([*layer.columns, *([layer.key] if layer.key else [])]))
+    gdf = gdf[keep + [gdf.geometry.name]]
+    if gdf.crs is None:
+        raise ValueError(f"Layer '{layer.name}' ({path}) has no CRS defined.")
+    return gdf.to_crs(epsg=3857)
+
+
+def _init_worker(layers: list[Layer]) -> None:
+    import numpy as np
+    import shapely
+
+    for layer in layers:
+        gdf = _read_3857(layer)
+        geoms = np.asarray(gdf.geometry.values)
+        props = gdf[list(layer.columns)].astype(object).where(gdf[list(layer.columns)].notna(), None)
+        _worker_layers[layer.name] = (layer, geoms, shapely.STRtree(geoms), props.to_dict("records"))
+
+
+def _encode(name: str, features: list[dict], bounds) -> bytes:
+    import mapbox_vector_tile
+
+    layer = [{"name": name, "features": features}]
+    try:
+        return mapbox_vector_tile.encode(layer, default_options={"quantize_bounds": bounds, "extents": EXTENT})
+    except TypeError:  # mapbox-vector-tile < 2
+        return mapbox_vector_tile.encode(layer, quantize_bounds=bounds, extents=EXTENT)
+
+
+def _render_files(tiles: list) -> list:
+    import shapely
+
+    out = []
+    for z, x, y in tiles:
+        bounds = tile_bounds(z, x, y)
+        pad = tile_size(z) * BUFFER / EXTENT
+        clip_box = (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+        data = b""
+        for layer, geoms, tree, props in _worker_layers.values():
+            if not layer.minzoom <= z <= layer.maxzoom:
+                continue
+            idx = tree.query(shapely.box(*clip_box), predicate="intersects")
+            clipped = shapely.clip_by_rect(geoms[idx], *clip_box)
+            features = [
+                {"geometry": g, "properties": {k: v for k, v in props[i].items() if v is not None}}
+                for i, g in zip(idx, clipped) if not g.is_empty
+            ]
+            if features:
+                data += _encode(layer.name, features, bounds)
+        out.append(((z, x, y), data))
+    return out
+
+
+def file_state(layer: Layer):
+    """DataFrame k, row_hash, minx, miny, maxx, maxy of a file layer (one row per key)."""
+    import numpy as np
+    import pandas as pd
+    import shapely
+
+    gdf = _read_3857(layer)
+    frame = pd.DataFrame({c: gdf[c].astype(object).to_numpy() for c in layer.columns})
+    frame["wkb"] = shapely.to_wkb(np.asarray(gdf.geometry.values))
+    rows = pd.DataFrame({
+        "k": gdf[layer.key].astype(str).to_numpy() if layer.key else "",
+        "h": pd.util.hash_pandas_object(frame, index=False).to_numpy(),
+    })
+    b = gdf.geometry.bounds.to_numpy()
+    rows[["minx", "miny", "maxx", "maxy"]] = b
+
+    rows = rows.sort_values(["k", "h"])
+    grouped = rows.groupby("k", sort=False)
+    state = grouped.agg(minx=("minx", "min"), miny=("miny", "min"), maxx=("maxx", "max"), maxy=("maxy", "max"))
+    state["row_hash"] = grouped["h"].agg(lambda h: hashlib.md5(h.to_numpy().tobytes()).hexdigest())
+    return state.reset_index()
+
+
+def export_files(layers: list[Layer], out, workers: int = 4, incremental: bool = True,
+                 name: str = "tiles") -> dict:
+    """Build (or patch) the tile pyramid `out` from GIS files, in-process. Returns counts."""
+    import pandas as pd
+
+    state_dir = Path(f"{out}.state")
+    paths = {l.name: state_dir / f"{l.name}.parquet" for l in layers}
+    full = not incremental or not all(p.exists() for p in paths.values())
+
+    box_cols = ["minx", "miny", "maxx", "maxy"]
+    with instr.stage("tiles_diff", "derive", full=full):
+        states, boxes = {}, {}
+        for l in layers:
+            now = states[l.name] = file_state(l)
+            if full:
+                dirty = now
+            else:
+                prev = pd.read_parquet(paths[l.name])
+                diff = prev.merge(now, how="outer", on=["k", "row_hash"], suffixes=("_old", "_new"), indicator=True)
+                gone = diff.loc[diff["_merge"] == "left_only", [f"{c}_old" for c in box_cols]]
+                new = diff.loc[diff["_merge"] == "right_only", [f"{c}_new" for c in box_cols]]
+                dirty = pd.DataFrame(list(gone.to_numpy()) + list(new.to_numpy()), columns=box_cols)
+            boxes[l.name] = [tuple(b) for b in dirty[box_cols].to_numpy()]
+        tiles = tiles_for_boxes(boxes, layers)
+    print(f"[tiles] {'full build' if full else 'incremental'}: {len(tiles)} tiles to render")
+
+    sink = open_sink(out, full, layers)
+    with instr.stage("tiles_render", "write", tiles=len(tiles), workers=workers):
+        if tiles:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(layers,)) as pool:
+                futures = [pool.submit(_render_files, b) for b in batches(tiles)]
+                stats = write_tiles(sink, (f.result() for f in as_completed(futures)))
+        else:
+            stats = write_tiles(sink, [])
+        sink.close(metadata(name, layers))
+
+    state_dir.mkdir(parents=True, exist_ok=True)
+    for l in layers:
+        tmp = paths[l.name].with_suffix(".tmp")
+        states[l.name].to_parquet(tmp, index=False)
+        os.replace(tmp, paths[l.name])
+    print(f"[tiles] {stats}")
+    return {"full": full, "tiles": len(tiles), **stats}
@@ -1,14 +1,60 @@
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
 from pathlib import Path
+import os
+import sys
 import time
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import cache, instrumentation as instr, mvt, spatial_order
+
+# Reproject both layers to a common target CRS (EPSG:7856)
+TARGET_EPSG = 7856
+
+# Reuse reprojected inputs / final slices from the GeoParquet cache (gis_common/cache.py)
+# when the input files are unchanged. Bump CACHE_VERSION when the logic below changes.
+USE_CACHE = True
+CACHE_VERSION = "v2"
+
+# Only these attributes are read (and carried through the overlay); zoning classes are
+# stored as categoricals. Everything else in the inputs is never loaded.
+CADASTRE_COLUMNS = ["cadid"]
+ZONE_COLUMNS = ["LAY_CLASS", "SYM_CODE"]
+CATEGORICAL_COLUMNS = ["LAY_CLASS", "SYM_CODE"]
+
+# Row order of the slices file (gis_common/spatial_order.py): None = overlay order,
+# "hilbert" = sorted along a Hilbert curve so viewport reads touch fewer pages
+SPATIAL_ORDER = None
+
+# Vector tiles of the written slices (gis_common/mvt.py): None = off, "<file>.mbtiles" or a
+# folder (→ {z}/{x}/{y}.pbf). With TILES_INCREMENTAL only tiles touched by changed lots are
+# rendered again; rendering runs on TILES_WORKERS processes.
+TILES_OUT = None
+TILES_WORKERS = 4
+TILES_INCREMENTAL = True
+TILE_COLUMNS = ("cadid", "LAY_CLASS", "SYM_CODE", "coverage")
+
+# Tabular report (csv / parquet): slice areas only, no slice geometry is kept or written
+TABULAR_EXTS = {"csv", "parquet"}
+
+# Incremental mode: keep the last run's input hashes + slices under STATE_DIR and on the
+# next run re-evaluate only lots that changed or intersect a changed zoning feature. The
+# lots added / removed / updated are written next to the output as <out_name>_changes.csv.
+INCREMENTAL = False
+STATE_DIR = cache.CACHE_DIR / "zone_review_state" / CACHE_VERSION
+
 def main():
     cadastre_path = Path(input("Please enter the cadastre path: ").strip())
     zone_path = Path(input("Please enter the zoning path: ").strip())
     out_folder = Path(input("Please enter the output folder: "))
     out_name = input("Please enter the output name: ")
-    ext = input("Please enter the file extension from {shp, gpkg,geojson}: ")
-    out_path = get_multi_zone_slices(cadastre_path, zone_path,out_folder, out_name, ext)
+    ext = input("Please enter the file extension from {shp, gpkg, geojson} (or {csv, parquet} for a table without geometry): ")
+    if ext.lower().strip().lstrip(".") in TABULAR_EXTS:
+        out_path = get_multi_zone_report(cadastre_path, zone_path, out_folder, out_name, ext)
+    else:
+        out_path = get_multi_zone_slices(cadastre_path, zone_path,out_folder, out_name, ext)
     print(f"The output has been exported to {out_path}")
 
 
@@ -25,62 +71,293 @@ def get_multi_zone_slices (
     if ext not in allowed:
         raise ValueError(f"Unsupported extension '{ext}'. Use one of: {allowed}")
 
-    cadastre = gpd.read_file(cadastre_path)
-    
-    zone = gpd.read_file(zone_path)
+    out_path = out_folder / f"{out_name}.{ext}"
+
+    if INCREMENTAL:
+        multi_zone_slices, changes = update_multi_zone_slices(cadastre_path, zone_path)
+        changes.to_csv(out_folder / f"{out_name}_changes.csv", index=False)
+    else:
+        # Final slices depend only on the two inputs: a rerun with unchanged inputs (e.g. only
+        # a different output format) reads them from the cache and skips read/reproject/overlay
+        multi_zone_slices = cache.cached(
+            "multi_zone_slices",
+            [CACHE_VERSION, cache.input_fingerprint(cadastre_path), cache.input_fingerprint(zone_path)],
+            lambda: compute_multi_zone_slices(cadastre_path, zone_path),
+            enabled=USE_CACHE,
+        )
+
+    with instr.stage("write_output", "write", ext=ext):
+        spatial_order.sorted_for_write(multi_zone_slices, SPATIAL_ORDER).to_file(out_path)
+
+    if TILES_OUT:
+        layer = mvt.Layer("multi_zone_slices", str(out_path), columns=TILE_COLUMNS, key="cadid")
+        with instr.stage("export_tiles", "write"):
+            mvt.export_files([layer], TILES_OUT, workers=TILES_WORKERS, incremental=TILES_INCREMENTAL,
+                             name="multi_zone_slices")
+
+    return out_path
+
+
+def get_multi_zone_report(
+        cadastre_path,
+        zone_path,
+        out_folder,
+        out_name,
+        ext
+) -> Path:
+    """
+    Same rows as get_multi_zone_slices() without geometry (cadid, LAY_CLASS, SYM_CODE,
+    cad_area, slice_area, coverage), written as CSV or Parquet.
+    """
+    ext = ext.lower().strip().lstrip(".")
+    if ext not in TABULAR_EXTS:
+        raise ValueError(f"Unsupported extension '{ext}'. Use one of: {TABULAR_EXTS}")
+
+    report = cache.cached(
+        "multi_zone_report",
+        [CACHE_VERSION, cache.input_fingerprint(cadastre_path), cache.input_fingerprint(zone_path)],
+        lambda: compute_multi_zone_report(cadastre_path, zone_path),
+        enabled=USE_CACHE,
+    )
+
+    out_path = out_folder / f"{out_name}.{ext}"
+
+    with instr.stage("write_output", "write", ext=ext):
+        if ext == "csv":
+            report.to_csv(out_path, index=False)
+        else:
+            report.to_parquet(out_path, index=False)
+
+    return out_path
+
+
+def read_7856(path, name: str, columns: list[str]) -> gpd.GeoDataFrame:
+    """Read only `columns` of a layer and reproject it to EPSG:7856 (cached as GeoParquet)."""
+    def compute():
+        with instr.stage(f"read_{name}", "load"):
+            gdf = gpd.read_file(path, columns=columns)
+
+        missing = [c for c in columns if c not in gdf.columns]
+        if missing:
+            raise ValueError(f"{name.capitalize()} layer is missing column(s) {missing}.")
+        for col in CATEGORICAL_COLUMNS:
+            if col in gdf.columns:
+                gdf[col] = gdf[col].astype("category")
 
-    # Reproject both layers to a common target CRS (EPSG:7856)
-    target_epsg = 7856
+        if gdf.crs is None:
+            raise ValueError(f"{name.capitalize()} layer has no CRS defined.")
 
-    if cadastre.crs is None:
-        raise ValueError("Cadastre layer has no CRS defined.")
+        with instr.stage("reproject", "derive", layer=name):
+            if gdf.crs.to_epsg() != TARGET_EPSG:
+                gdf = gdf.to_crs(epsg=TARGET_EPSG)
+                print(f"{name.capitalize()} reprojected to EPSG:{TARGET_EPSG}")
+        return gdf
 
-    if zone.crs is None:
-        raise ValueError("Zoning layer has no CRS defined.")
+    return cache.cached(
+        f"{name}_7856", [CACHE_VERSION, cache.input_fingerprint(path), TARGET_EPSG, columns], compute,
+        enabled=USE_CACHE,
+    )
 
-    if cadastre.crs.to_epsg() != target_epsg:
-        cadastre = cadastre.to_crs(epsg=target_epsg)
-        print("Cadastre reprojected to EPSG:7856")
 
-    if zone.crs.to_epsg() != target_epsg:
-        zone = zone.to_crs(epsg=target_epsg)
-        print("Zoning reprojected to EPSG:7856")
+def zone_counts(cadid: pd.Series, zone_class: pd.Series) -> np.ndarray:
+    """
+    Number of distinct zone classes of each row's lot (same as
+    groupby("cadid")[zone_class].nunique(), broadcast back to the rows), from integer codes.
+    Rows without a cadid get 0 (groupby drops them).
+    """
+    lot_idx, lots = pd.factorize(cadid)
+    class_codes = zone_class.cat.codes.to_numpy().astype(np.int64)
+    n_classes = max(len(zone_class.cat.categories), 1)
 
+    has_lot = lot_idx >= 0  # factorize gives -1 for a null cadid
+    known = has_lot & (class_codes >= 0)  # NaN classes do not count (like nunique)
+    pairs = np.unique(lot_idx[known].astype(np.int64) * n_classes + class_codes[known])
+    per_lot = np.bincount(pairs // n_classes, minlength=len(lots))
+    counts = np.zeros(len(lot_idx), dtype=np.int64)
+    counts[has_lot] = per_lot[lot_idx[has_lot]]
+    return counts
+
+
+def compute_multi_zone_slices(cadastre_path, zone_path) -> gpd.GeoDataFrame:
+    cadastre = read_7856(cadastre_path, "cadastre", CADASTRE_COLUMNS)
+    zone = read_7856(zone_path, "zoning", ZONE_COLUMNS)
+    return slices_from(cadastre, zone)
+
+
+def slices_from(cadastre: gpd.GeoDataFrame, zone: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Multi-zone slices of `cadastre` lots against `zone` (both EPSG:7856)."""
+    cadastre = cadastre.copy()
 
     #Add cad_area column to cadastre:
     cadastre["cad_area"] = cadastre.geometry.area
 
     #Create intersection:
-    intersected = gpd.overlay(cadastre,zone, how="intersection")
+    with instr.stage("overlay", "derive"):
+        intersected = gpd.overlay(cadastre,zone, how="intersection")
 
     # Filter cadids with more than one zone:
 
-    #create zone_count table for each cadid showing the number of zones for each cadid
-    zone_count = intersected.groupby("cadid")["LAY_CLASS"].nunique().reset_index(name = "n_zones")
-    
-    multi_zone = zone_count[zone_count["n_zones"] > 1].copy()
-
-    # Create a list of above to be able to filter intersected gdf
-    multi_zone_list = multi_zone["cadid"]
+    # number of distinct zone classes of each slice's lot (vectorised on category codes)
+    if not isinstance(intersected["LAY_CLASS"].dtype, pd.CategoricalDtype):
+        intersected["LAY_CLASS"] = intersected["LAY_CLASS"].astype("category")
+    n_zones = zone_counts(intersected["cadid"], intersected["LAY_CLASS"])
 
-    # Get the rows in intersected which cadids are in the above list
-    slices = intersected[intersected["cadid"].isin(multi_zone_list)].copy()
+    # Get the rows in intersected whose lot has more than one zone
+    slices = intersected[n_zones > 1].copy()
 
     # Calculate area and coverage for each slice
     slices["slice_area"] = slices.geometry.area
     slices["coverage"] = slices["slice_area"] / slices["cad_area"] * 100
 
     #Filter only the rows we need
-    multi_zone_slices = slices[["cadid", "LAY_CLASS", "SYM_CODE", "cad_area", "slice_area", "coverage", "geometry"]]
+    multi_zone_slices = slices[["cadid", "LAY_CLASS", "SYM_CODE", "cad_area", "slice_area", "coverage", "geometry"]].copy()
 
-    out_path = out_folder / f"{out_name}.{ext}"
+    # plain strings again for the GIS writers
+    for col in CATEGORICAL_COLUMNS:
+        multi_zone_slices[col] = multi_zone_slices[col].astype(object)
+    return multi_zone_slices
 
-    multi_zone_slices.to_file(out_path)
 
-    return out_path
+def row_hashes(gdf: gpd.GeoDataFrame, columns: list[str]) -> np.ndarray:
+    """uint64 hash of each row's `columns` + geometry (WKB), to spot changed features between runs."""
+    frame = pd.DataFrame({c: gdf[c].astype(object).to_numpy() for c in columns})
+    frame["wkb"] = shapely.to_wkb(np.asarray(gdf.geometry.values))
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def write_state(gdf, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def update_multi_zone_slices(cadastre_path, zone_path, state_dir: Path = STATE_DIR):
+    """
+    Multi-zone slices patched from the previous run's result (full build when there is none).
+
+    Re-evaluated lots:
+    - lots whose cadid is new or gone, or whose geometry changed (cadid + geometry hash)
+    - lots intersecting a zoning feature that was added, removed or edited (attributes +
+      geometry hash; removed features are taken from the previous zoning snapshot)
+    The slices of every other lot are kept as they are.
+
+    Returns (slices, changes); changes has one row per re-evaluated lot that is or was
+    multi-zoned: cadid + change ("added", "removed" or "updated").
+    """
+    cadastre = read_7856(cadastre_path, "cadastre", CADASTRE_COLUMNS)
+    zone = read_7856(zone_path, "zoning", ZONE_COLUMNS)
+
+    with instr.stage("hash_inputs", "derive"):
+        cad_hashes = pd.DataFrame({"cadid": cadastre["cadid"].to_numpy(), "row_hash": row_hashes(cadastre, [])})
+        zone_snapshot = gpd.GeoDataFrame(
+            {"row_hash": row_hashes(zone, ZONE_COLUMNS)}, geometry=zone.geometry.values, crs=zone.crs
+        )
+
+    paths = {n: state_dir / f"{n}.parquet" for n in ("cadastre_hashes", "zone_snapshot", "multi_zone_slices")}
+    if not all(p.exists() for p in paths.values()):
+        print("[incremental] no previous state, full build")
+        prev = None
+        affected = set(cad_hashes["cadid"])
+        fresh = slices_from(cadastre, zone)
+    else:
+        prev = gpd.read_parquet(paths["multi_zone_slices"])
+        prev_cad = pd.read_parquet(paths["cadastre_hashes"])
+        prev_zone = gpd.read_parquet(paths["zone_snapshot"])
+
+        with instr.stage("diff_inputs", "derive"):
+            # a cadid whose set of (cadid, geometry hash) rows differs is new, gone or reshaped
+            diff = prev_cad.merge(cad_hashes, how="outer", on=["cadid", "row_hash"], indicator=True)
+            affected = set(diff.loc[diff["_merge"] != "both", "cadid"])
+            n_changed_lots = len(affected)
+
+            added = ~np.isin(zone_snapshot["row_hash"].to_numpy(), prev_zone["row_hash"].to_numpy())
+            removed = ~np.isin(prev_zone["row_hash"].to_numpy(), zone_snapshot["row_hash"].to_numpy())
+            dirty = np.concatenate([
+                np.asarray(zone_snapshot.geometry.values)[added],
+                np.asarray(prev_zone.geometry.values)[removed],
+            ])
+            if len(dirty):
+                lot_i = cadastre.sindex.query(dirty, predicate="intersects")[1]
+                affected |= set(cadastre["cadid"].to_numpy()[lot_i])
+
+        print(
+            f"[incremental] lots new/gone/reshaped: {n_changed_lots}, "
+            f"zoning features new: {int(added.sum())}, gone: {int(removed.sum())} (an edit counts in both), "
+            f"lots to re-evaluate: {len(affected)}"
+        )
+
+        sub_cad = cadastre[cadastre["cadid"].isin(affected)]
+        if len(sub_cad):
+            zone_i = np.unique(zone.sindex.query(sub_cad.geometry, predicate="intersects")[1])
+            fresh = slices_from(sub_cad, zone.iloc[zone_i])
+        else:
+            fresh = prev.iloc[:0]
+
+    before = set() if prev is None else set(prev.loc[prev["cadid"].isin(affected), "cadid"])
+    after = set(fresh["cadid"])
+    changes = pd.DataFrame(
+        [(c, "added") for c in after - before]
+        + [(c, "removed") for c in before - after]
+        + [(c, "updated") for c in after & before],
+        columns=["cadid", "change"],
+    )
+    print(f"[incremental] multi-zone lots: {changes['change'].value_counts().to_dict()}")
+
+    if prev is None:
+        multi_zone_slices = fresh
+    else:
+        kept = prev[~prev["cadid"].isin(affected)]
+        multi_zone_slices = gpd.GeoDataFrame(pd.concat([kept, fresh], ignore_index=True), crs=prev.crs)
+
+    # result first, snapshots after: an interrupted write only makes the next run re-evaluate more lots
+    with instr.stage("write_state", "write"):
+        write_state(multi_zone_slices, paths["multi_zone_slices"])
+        write_state(zone_snapshot, paths["zone_snapshot"])
+        write_state(cad_hashes, paths["cadastre_hashes"])
+
+    return multi_zone_slices, changes
+
+
+def compute_multi_zone_report(cadastre_path, zone_path) -> pd.DataFrame:
+    """
+    Slice areas from (lot, zone) pairs of the spatial index: a lot lying fully inside a zone
+    takes its own area, only the other pairs are intersected, and no slice geometry is kept.
+    Zero-area pairs (lot and zone only touching) are dropped, as in the overlay.
+    """
+    cadastre = read_7856(cadastre_path, "cadastre", CADASTRE_COLUMNS)
+    zone = read_7856(zone_path, "zoning", ZONE_COLUMNS)
+
+    with instr.stage("slice_areas", "derive"):
+        lot_i, zone_i = zone.sindex.query(cadastre.geometry, predicate="intersects")
+
+        lot_geoms = np.asarray(cadastre.geometry.values)[lot_i]
+        zone_geoms = np.asarray(zone.geometry.values)[zone_i]
+        cad_area = shapely.area(lot_geoms)
+
+        slice_area = cad_area.copy()
+        partial = ~shapely.contains_properly(zone_geoms, lot_geoms)
+        slice_area[partial] = shapely.area(shapely.intersection(lot_geoms[partial], zone_geoms[partial]))
+
+    report = pd.DataFrame({
+        "cadid": cadastre["cadid"].to_numpy()[lot_i],
+        "LAY_CLASS": zone["LAY_CLASS"].take(zone_i).to_numpy(),
+        "SYM_CODE": zone["SYM_CODE"].take(zone_i).to_numpy(),
+        "cad_area": cad_area,
+        "slice_area": slice_area,
+    })
+    report = report[report["slice_area"] > 0].reset_index(drop=True)
+
+    report["LAY_CLASS"] = report["LAY_CLASS"].astype("category")
+    n_zones = zone_counts(report["cadid"], report["LAY_CLASS"])
+    report = report[n_zones > 1].copy()
+    report["coverage"] = report["slice_area"] / report["cad_area"] * 100
+    return report.reset_index(drop=True)
+
 
 if __name__ == "__main__":
     start = time.time()
-    main()
+    with instr.run("zone_review_extract_slices"):
+        main()
     end = time.time()
     print(f"Runtime: {end - start:.2f} seconds")
\ No newline at end of file
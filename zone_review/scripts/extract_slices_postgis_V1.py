@@ -1,15 +1,87 @@
 import geopandas as gpd
+import pandas as pd
 from sqlalchemy import create_engine, text
 from urllib.parse import quote_plus
 from db_config_local import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+import sys
 import time
-import antigravity
+from pathlib import Path
 
-def main():
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # repo root → gis_common
+from gis_common import instrumentation as instr, mvt, spatial_order
+
+OUT_PATH = r"C:\Users\sabzer\Downloads\Test\test-postgis-v1"
+
+# Tabular mode: the query returns only scalars (no slice geometry crosses the wire) and
+# the result is written as OUT_PATH.csv / OUT_PATH.parquet
+TABULAR = False
+TABULAR_EXT = "parquet"
+
+# Incremental mode: patch zone_review.multi_zone_slices in place with
+# sql/extract_slices_incremental_V1.sql (only lots that changed or intersect a changed
+# zoning feature are re-evaluated), print what was added / removed, then export the table.
+INCREMENTAL = False
+# Row order (gis_common/spatial_order.py): None = join order; "hilbert" = the exported
+# file is written in Hilbert order (ORDER BY geom); "cluster" = the same, and the patched
+# zone_review.multi_zone_slices table is also CLUSTERed on its GiST index (INCREMENTAL)
+SPATIAL_ORDER = None
+
+# Vector tiles (gis_common/mvt.py): None = off, "<file>.mbtiles" or a folder. In INCREMENTAL
+# mode they are cut from zone_review.multi_zone_slices with ST_AsMVT (only tiles touched by
+# changed lots are rendered again); otherwise from the exported OUT_PATH file.
+TILES_OUT = None
+TILES_WORKERS = 4
+TILE_COLUMNS = ("cadid", "LAY_CLASS", "SYM_CODE", "coverage")
+
+INCREMENTAL_SQL = Path(__file__).resolve().parents[1] / "sql" / "extract_slices_incremental_V1.sql"
+
+# Slice areas without keeping ST_Intersection geometries. A lot fully inside a zone takes
+# its own area; zero-area pairs (lot and zone only touching) are dropped.
+TABULAR_SQL = """
+    WITH pairs AS (
+        SELECT
+            c.cadid,
+            ST_Area(c.geom) AS cad_area,
+            z."LAY_CLASS",
+            z."SYM_CODE",
+            CASE
+                WHEN ST_ContainsProperly(z.geom, c.geom) THEN ST_Area(c.geom)
+                ELSE ST_Area(ST_Intersection(c.geom, z.geom))
+            END AS slice_area
+        FROM zone_review.state_cadastre AS c
+        JOIN zone_review.state_zone AS z
+            ON ST_Intersects(c.geom, z.geom)
+    ),
+    nonzero AS (
+        SELECT * FROM pairs WHERE slice_area > 0
+    ),
+    multi_zones AS (
+        SELECT cadid
+        FROM nonzero
+        GROUP BY cadid
+        HAVING COUNT(DISTINCT "LAY_CLASS") > 1
+    )
+    SELECT
+        n.cadid,
+        n.cad_area,
+        n."LAY_CLASS",
+        n."SYM_CODE",
+        n.slice_area,
+        n.slice_area / n.cad_area * 100 AS coverage
+    FROM nonzero AS n
+    JOIN multi_zones AS m
+        ON (n.cadid = m.cadid);
+"""
+
+def make_engine():
     password = quote_plus(DB_PASSWORD) #make my password safe to put inside a URL string (# handles @ etc.)
-    engine = create_engine(
+    return instr.instrument_engine(create_engine(
     f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    )
+    ))
+
+
+def main():
+    engine = make_engine()
 
     sql = """
         CREATE INDEX IF NOT EXISTS cadastre_geom_gix
@@ -21,9 +93,57 @@ def main():
         USING gist(geom);
 
     """
-    with engine.begin() as conn:
+    with instr.stage("ensure_indexes", "load"), engine.begin() as conn:
         conn.execute(text(sql))
 
+    if TABULAR:
+        with instr.stage("multi_zone_report_query", "derive"):
+            report = pd.read_sql(text(TABULAR_SQL), engine)
+        out_path = f"{OUT_PATH}.{TABULAR_EXT}"
+        with instr.stage("write_output", "write", ext=TABULAR_EXT):
+            if TABULAR_EXT == "csv":
+                report.to_csv(out_path, index=False)
+            else:
+                report.to_parquet(out_path, index=False)
+        print(f"{len(report)} slice rows written to {out_path}")
+        return
+
+    spatial_order.check_mode(SPATIAL_ORDER)
+    export_order = "" if SPATIAL_ORDER is None else spatial_order.order_by("hilbert")
+
+    if INCREMENTAL:
+        with instr.stage("incremental_update", "derive"), engine.begin() as conn:
+            # psycopg2 runs the whole file as one transaction (no bind parameters in it)
+            conn.exec_driver_sql(INCREMENTAL_SQL.read_text(encoding="utf-8"))
+            changes = conn.execute(text("""
+                SELECT change, COUNT(*) AS n
+                FROM zone_review.multi_zone_changes
+                WHERE changed_at = now()
+                GROUP BY change
+                ORDER BY change
+            """)).all()
+        print("multi-zone lots:", {change: n for change, n in changes} or "no change")
+
+        if SPATIAL_ORDER == "cluster":
+            with instr.stage("cluster_multi_zone_slices", "derive"), engine.begin() as conn:
+                conn.execute(text(spatial_order.cluster_sql(
+                    SPATIAL_ORDER, "zone_review.multi_zone_slices", "multi_zone_slices_geom_gix"
+                )))
+                conn.execute(text("ANALYZE zone_review.multi_zone_slices;"))
+
+        with instr.stage("multi_zone_export_query", "derive"):
+            multi_zone_slices = gpd.read_postgis(
+                f"SELECT * FROM zone_review.multi_zone_slices {export_order}", engine, "geom"
+            )
+        with instr.stage("write_output", "write"):
+            multi_zone_slices.to_file(OUT_PATH)
+
+        if TILES_OUT:
+            layer = mvt.Layer("multi_zone_slices", "zone_review.multi_zone_slices", columns=TILE_COLUMNS, key="cadid")
+            with instr.stage("export_tiles", "write"):
+                mvt.export_postgis(engine, [layer], TILES_OUT, workers=TILES_WORKERS, name="multi_zone_slices")
+        return
+
     multi_zone_sql =         """
         WITH intersected AS (
             -- Intersect lots and zones → one row per (lot, zone) slice
@@ -78,21 +198,30 @@ def main():
         slice_area,
         slice_area / cad_area * 100 AS coverage,
         geom
-    FROM slice_area; 
+    FROM slice_area
+    """ + export_order + """;
         """
     
 
-    multi_zone_slices = gpd.read_postgis(
-        multi_zone_sql,
-        engine,
-        "geom"
-    )
-    multi_zone_slices.to_file(r"C:\Users\sabzer\Downloads\Test\test-postgis-v1")
+    with instr.stage("multi_zone_query", "derive"):
+        multi_zone_slices = gpd.read_postgis(
+            multi_zone_sql,
+            engine,
+            "geom"
+        )
+    with instr.stage("write_output", "write"):
+        multi_zone_slices.to_file(OUT_PATH)
+
+    if TILES_OUT:
+        layer = mvt.Layer("multi_zone_slices", OUT_PATH, columns=TILE_COLUMNS, key="cadid")
+        with instr.stage("export_tiles", "write"):
+            mvt.export_files([layer], TILES_OUT, workers=TILES_WORKERS, name="multi_zone_slices")
 
 
 if __name__ == "__main__":
     start = time.time()
-    main()
+    with instr.run("zone_review_extract_slices_postgis"):
+        main()
     end = time.time()
     print(f"Runtime: {end - start:.2f} seconds")
 
@@ -75,4 +75,7 @@ CREATE INDEX multi_zone_slices_geom_gix
   ON zone_review.multi_zone_slices
   USING gist (geom);
 
-	
\ No newline at end of file
+-- 4. Optional: store the rows in spatial (GiST index) order so bbox / viewport
+--    queries read far fewer pages. Rewrites the table under an exclusive lock.
+-- CLUSTER zone_review.multi_zone_slices USING multi_zone_slices_geom_gix;
+-- ANALYZE zone_review.multi_zone_slices;
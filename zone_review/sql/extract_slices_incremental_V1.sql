@@ -0,0 +1,215 @@
+-- Multi-zone lots analysis — incremental update
+-- Input:
+--   zone_review.state_cadastre  : lot polygons (geom)
+--   zone_review.state_zone      : zoning polygons (geom)
+-- Output (patched in place, created on the first run):
+--   zone_review.multi_zone_slices  : same table as extract_slices_V1.sql
+--   zone_review.multi_zone_changes : one row per re-evaluated lot that is or was
+--                                    multi-zoned: changed_at, cadid, change
+--                                    ('added' | 'removed' | 'updated')
+-- State (what the inputs looked like at the last run):
+--   zone_review.cadastre_snapshot  : cadid + md5 of its geometry
+--   zone_review.zone_snapshot      : md5 of LAY_CLASS, SYM_CODE + geometry, and the geometry
+--
+-- Only lots that are new, gone or reshaped, or that intersect a zoning feature that was
+-- added, removed or edited, are re-evaluated. On the first run (empty snapshots) every
+-- lot counts as new, i.e. a full build.
+--
+-- Run the whole file as ONE transaction (temp tables are dropped on commit). A
+-- multi-statement pgAdmin query and extract_slices_postgis_V1.py (INCREMENTAL = True)
+-- both do.
+
+-- 1. Spatial indexes + tables (first run)
+CREATE INDEX IF NOT EXISTS cadastre_geom_gix
+	ON zone_review.state_cadastre
+	USING gist (geom);
+
+CREATE INDEX IF NOT EXISTS zone_geom_gix
+	ON zone_review.state_zone
+	USING gist (geom);
+
+CREATE TABLE IF NOT EXISTS zone_review.multi_zone_slices AS
+SELECT
+	c.cadid,
+	ST_Area(c.geom) AS cad_area,
+	z."LAY_CLASS",
+	z."SYM_CODE",
+	0::double precision AS slice_area,
+	0::double precision AS coverage,
+	ST_Intersection(c.geom, z.geom) AS geom
+FROM zone_review.state_cadastre AS c
+CROSS JOIN zone_review.state_zone AS z
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS multi_zone_slices_geom_gix
+	ON zone_review.multi_zone_slices
+	USING gist (geom);
+
+CREATE INDEX IF NOT EXISTS multi_zone_slices_cadid_idx
+	ON zone_review.multi_zone_slices (cadid);
+
+CREATE TABLE IF NOT EXISTS zone_review.multi_zone_changes AS
+SELECT now() AS changed_at, cadid, ''::text AS change
+FROM zone_review.state_cadastre
+WITH NO DATA;
+
+CREATE TABLE IF NOT EXISTS zone_review.cadastre_snapshot AS
+SELECT cadid, ''::text AS geom_hash
+FROM zone_review.state_cadastre
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS cadastre_snapshot_cadid_idx
+	ON zone_review.cadastre_snapshot (cadid);
+
+CREATE TABLE IF NOT EXISTS zone_review.zone_snapshot AS
+SELECT ''::text AS row_hash, geom
+FROM zone_review.state_zone
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS zone_snapshot_hash_idx
+	ON zone_review.zone_snapshot (row_hash);
+
+-- 2. Current hashes
+CREATE TEMP TABLE cadastre_now ON COMMIT DROP AS
+SELECT cadid, md5(ST_AsBinary(geom)) AS geom_hash
+FROM zone_review.state_cadastre;
+
+CREATE TEMP TABLE zone_now ON COMMIT DROP AS
+SELECT
+	md5(
+		convert_to(coalesce("LAY_CLASS"::text, '') || '|' || coalesce("SYM_CODE"::text, '') || '|', 'UTF8')
+		|| ST_AsBinary(geom)
+	) AS row_hash,
+	geom
+FROM zone_review.state_zone;
+
+CREATE INDEX ON cadastre_now (cadid);
+CREATE INDEX ON zone_now (row_hash);
+ANALYZE cadastre_now;
+ANALYZE zone_now;
+
+-- 3. Lots to re-evaluate
+CREATE TEMP TABLE changed_zones ON COMMIT DROP AS
+	-- added or edited (new version)
+	SELECT n.geom
+	FROM zone_now AS n
+	WHERE NOT EXISTS (SELECT 1 FROM zone_review.zone_snapshot AS s WHERE s.row_hash = n.row_hash)
+UNION ALL
+	-- removed or edited (old version)
+	SELECT s.geom
+	FROM zone_review.zone_snapshot AS s
+	WHERE NOT EXISTS (SELECT 1 FROM zone_now AS n WHERE n.row_hash = s.row_hash);
+
+CREATE TEMP TABLE affected_lots ON COMMIT DROP AS
+	-- new, gone or reshaped lots
+	SELECT COALESCE(n.cadid, s.cadid) AS cadid
+	FROM cadastre_now AS n
+	FULL JOIN zone_review.cadastre_snapshot AS s
+		ON (s.cadid = n.cadid AND s.geom_hash = n.geom_hash)
+	WHERE n.cadid IS NULL OR s.cadid IS NULL
+UNION
+	-- lots under a changed zoning feature
+	SELECT c.cadid
+	FROM zone_review.state_cadastre AS c
+	JOIN changed_zones AS z
+		ON ST_Intersects(c.geom, z.geom);
+
+CREATE INDEX ON affected_lots (cadid);
+ANALYZE affected_lots;
+
+-- 4. Patch multi_zone_slices
+CREATE TEMP TABLE lots_before ON COMMIT DROP AS
+SELECT DISTINCT m.cadid
+FROM zone_review.multi_zone_slices AS m
+JOIN affected_lots AS a
+	ON (a.cadid = m.cadid);
+
+DELETE FROM zone_review.multi_zone_slices AS m
+USING affected_lots AS a
+WHERE m.cadid = a.cadid;
+
+INSERT INTO zone_review.multi_zone_slices
+	(cadid, cad_area, "LAY_CLASS", "SYM_CODE", slice_area, coverage, geom)
+WITH intersected AS (
+		-- Same query as extract_slices_V1.sql, for the affected lots only
+		SELECT
+			c.cadid,
+			ST_Area(c.geom) AS cad_area,
+			z."LAY_CLASS",
+			z."SYM_CODE",
+			ST_Intersection(c.geom, z.geom) AS geom
+		FROM zone_review.state_cadastre AS c
+		JOIN affected_lots AS a
+			ON (a.cadid = c.cadid)
+		JOIN zone_review.state_zone AS z
+			ON ST_Intersects(c.geom, z.geom)
+	),
+	multi_zones AS (
+		SELECT cadid
+		FROM intersected
+		GROUP BY cadid
+		HAVING COUNT(DISTINCT "LAY_CLASS") > 1
+	),
+	slice_area AS (
+		SELECT
+			i.cadid,
+			i.cad_area,
+			i."LAY_CLASS",
+			i."SYM_CODE",
+			ST_Area(i.geom) AS slice_area,
+			i.geom
+		FROM intersected AS i
+		JOIN multi_zones AS m
+			ON (i.cadid = m.cadid)
+	)
+SELECT
+	cadid,
+	cad_area,
+	"LAY_CLASS",
+	"SYM_CODE",
+	slice_area,
+	slice_area / cad_area * 100 AS coverage,
+	geom
+FROM slice_area;
+
+-- 5. Report: what changed among the affected lots
+INSERT INTO zone_review.multi_zone_changes (changed_at, cadid, change)
+SELECT
+	now(),
+	COALESCE(a.cadid, b.cadid),
+	CASE
+		WHEN b.cadid IS NULL THEN 'added'
+		WHEN a.cadid IS NULL THEN 'removed'
+		ELSE 'updated'
+	END
+FROM (
+	SELECT DISTINCT m.cadid
+	FROM zone_review.multi_zone_slices AS m
+	JOIN affected_lots AS l
+		ON (l.cadid = m.cadid)
+) AS a
+FULL JOIN lots_before AS b
+	ON (a.cadid = b.cadid);
+
+-- 6. Snapshots = current inputs (apply only the differences)
+DELETE FROM zone_review.cadastre_snapshot AS s
+WHERE NOT EXISTS (
+	SELECT 1 FROM cadastre_now AS n
+	WHERE n.cadid = s.cadid AND n.geom_hash = s.geom_hash
+);
+
+INSERT INTO zone_review.cadastre_snapshot (cadid, geom_hash)
+SELECT n.cadid, n.geom_hash
+FROM cadastre_now AS n
+WHERE NOT EXISTS (
+	SELECT 1 FROM zone_review.cadastre_snapshot AS s
+	WHERE s.cadid = n.cadid AND s.geom_hash = n.geom_hash
+);
+
+DELETE FROM zone_review.zone_snapshot AS s
+WHERE NOT EXISTS (SELECT 1 FROM zone_now AS n WHERE n.row_hash = s.row_hash);
+
+INSERT INTO zone_review.zone_snapshot (row_hash, geom)
+SELECT n.row_hash, n.geom
+FROM zone_now AS n
+WHERE NOT EXISTS (SELECT 1 FROM zone_review.zone_snapshot AS s WHERE s.row_hash = n.row_hash);
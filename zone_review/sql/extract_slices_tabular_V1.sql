@@ -0,0 +1,63 @@
+-- Multi-zone lots analysis — tabular report (no slice geometry)
+-- Input:
+--   zone_review.state_cadastre  : lot polygons (geom)
+--   zone_review.state_zone      : zoning polygons (geom)
+-- Output:
+--   zone_review.multi_zone_report : cadid, zone class, slice area and % coverage
+--   for multi-zoned lots (same rows as multi_zone_slices, without geom)
+-- Notes:
+--   a lot fully inside a zone takes its own area (no ST_Intersection);
+--   zero-area pairs (lot and zone only touching) are dropped
+
+-- 1. Spatial indexes to speed up ST_Intersects / ST_Intersection
+CREATE INDEX IF NOT EXISTS cadastre_geom_gix
+	ON zone_review.state_cadastre
+	USING gist (geom);
+
+CREATE INDEX IF NOT EXISTS zone_geom_gix
+	ON zone_review.state_zone
+	USING gist(geom);
+
+-- 2. Build report table
+DROP TABLE IF EXISTS zone_review.multi_zone_report;
+
+CREATE TABLE zone_review.multi_zone_report AS
+WITH pairs AS (
+		-- One row per (lot, zone) pair, area only
+		SELECT
+			c.cadid,
+			ST_Area(c.geom) AS cad_area,
+			z."LAY_CLASS",
+			z."SYM_CODE",
+			CASE
+				WHEN ST_ContainsProperly(z.geom, c.geom) THEN ST_Area(c.geom)
+				ELSE ST_Area(ST_Intersection(c.geom, z.geom))
+			END AS slice_area
+		FROM zone_review.state_cadastre AS c
+		JOIN zone_review.state_zone AS z
+			ON ST_Intersects(c.geom, z.geom)
+	),
+	nonzero AS (
+		SELECT * FROM pairs WHERE slice_area > 0
+	),
+	multi_zones AS (
+		-- Keep only lots that have more than 1 distinct zoning class
+		SELECT cadid
+		FROM nonzero
+		GROUP BY cadid
+		HAVING COUNT(DISTINCT "LAY_CLASS") > 1
+	)
+SELECT
+	n.cadid,
+	n.cad_area,
+	n."LAY_CLASS",
+	n."SYM_CODE",
+	n.slice_area,
+	n.slice_area / n.cad_area * 100 AS coverage
+FROM nonzero AS n
+JOIN multi_zones AS m
+	ON (n.cadid = m.cadid);
+
+-- 3. Index for lookups by lot
+CREATE INDEX multi_zone_report_cadid_idx
+  ON zone_review.multi_zone_report (cadid);